@@ -1,11 +1,13 @@
 import pickle
+from functools import lru_cache
 import pandas as pd
 from rank_bm25 import BM25Okapi
 from typing import List, Dict, Any
 import nltk
 from nltk.tokenize import word_tokenize
 from pathlib import Path
-from data_service import Hit
+import numpy as np
+from data_service import Hit, top_k_indices
 
 try:
     nltk.data.find("tokenizers/punkt_tab")
@@ -19,6 +21,8 @@ class BM25Cache:
         self.bm25 = None
         self.documents = []
         self.metadata = []
+        # Repeated queries (eval re-runs, hybrid search) skip word_tokenize
+        self._query_tokens = lru_cache(maxsize=4096)(lambda q: tuple(self.tokenize(q)))
 
     def tokenize(self, text: str) -> List[str]:
         if pd.isna(text) or not text:
@@ -116,29 +120,24 @@ class BM25Cache:
                 "BM25 index not built. Call build_from_csv() or load() first."
             )
 
-        query_tokens = self.tokenize(query)
+        query_tokens = list(self._query_tokens(query))
 
         if not query_tokens:
             return []
-        scores = self.bm25.get_scores(query_tokens)
-
-        top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[
-            :top_k
-        ]
-
-        results = []
-        for idx in top_indices:
-            if scores[idx] > 0:  # Only include results with positive scores
-                metadata = self.metadata[idx]
-                hit = Hit(
-                    score=float(scores[idx]),
-                    citation_id=metadata.get(
-                        "citation_id", metadata.get("citation_id", str(idx))
-                    ),
-                    chunk_id=idx,
-                    text=self.documents[idx],
-                    title=metadata.get("title", ""),
-                )
-                results.append(hit)
-            
-        return results
+        scores = np.asarray(self.bm25.get_scores(query_tokens))
+
+        # Partition-based top-k over the corpus scores instead of a full Python sort
+        top = top_k_indices(scores, top_k)
+        top = top[scores[top] > 0]  # Only include results with positive scores
+
+        hits = []
+        for idx, score in zip(top.tolist(), scores[top].tolist()):
+            meta = self.metadata[idx]
+            hits.append(Hit(
+                score=score,
+                citation_id=meta.get("citation_id", str(idx)),
+                chunk_id=idx,
+                text=self.documents[idx],
+                title=meta.get("title", ""),
+            ))
+        return hits
@@ -6,34 +6,74 @@ from citation.cache_helper import (
 from dataclasses import dataclass
 from typing import List
 from citation.embedding import encode_texts
+import os
+import threading
 import faiss
+import torch
 from sentence_transformers import SentenceTransformer
 
 
+# model name -> loaded SentenceTransformer, shared by every retriever (and any
+# other caller) in the process so each model is loaded exactly once
+_EMBEDDING_MODELS = {}
+_EMBEDDING_MODELS_LOCK = threading.Lock()
+
+# On CPU, opt in (EMBEDDING_CPU_INT8=1) to int8 dynamic quantization of the
+# encoders' Linear layers. Query vectors shift slightly against the fp32
+# corpus index, so check recall@10 on held-out questions before enabling
+EMBEDDING_CPU_INT8 = os.getenv("EMBEDDING_CPU_INT8", "") == "1"
+
+
+def get_embedding_model(model_name: str) -> SentenceTransformer:
+    """Load `model_name` once per process: on the GPU in fp16 when one is available."""
+    with _EMBEDDING_MODELS_LOCK:
+        model = _EMBEDDING_MODELS.get(model_name)
+        if model is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            model = SentenceTransformer(model_name, device=device)
+            if device == "cuda":
+                model.half()
+            elif EMBEDDING_CPU_INT8:
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            _EMBEDDING_MODELS[model_name] = model
+        return model
+
+
 @dataclass
 class Retriever:
     model: SentenceTransformer
     index: faiss.IndexFlatIP
     chunks: List[Chunk]
+    name: str = ""
 
     def search(self, query: str, top_k: int) -> List[Hit]:
-        qvec = encode_texts(self.model, [query], batch_size=1)
-        D, I = self.index.search(qvec, top_k)
-        hits: List[Hit] = []
-        for score, idx in zip(D[0].tolist(), I[0].tolist()):
-            if idx < 0:
-                continue
-            ch = self.chunks[idx]
-            # print(ch)
-            hits.append(Hit(
-                score=float(score), 
-                citation_id=ch['citation_id'], 
-                chunk_id=ch['chunk_id'], 
-                text=ch['text'], 
-                title=ch['title']
-            ))
-
-        return hits
+        return self.search_batch([query], top_k)[0]
+
+    def search_batch(self, queries: List[str], top_k: int) -> List[List[Hit]]:
+        # One padded encoder pass and one FAISS search for the whole batch
+        return self.search_vectors(encode_texts(self.model, queries, batch_size=len(queries)), top_k)
+
+    def search_vectors(self, qvecs, top_k: int) -> List[List[Hit]]:
+        """search_batch for queries already encoded with this retriever's model."""
+        D, I = self.index.search(qvecs, top_k)
+        results: List[List[Hit]] = []
+        for scores, idxs in zip(D.tolist(), I.tolist()):
+            hits: List[Hit] = []
+            for score, idx in zip(scores, idxs):
+                if idx < 0:
+                    continue
+                ch = self.chunks[idx]
+                # print(ch)
+                hits.append(Hit(
+                    score=float(score), 
+                    citation_id=ch['citation_id'], 
+                    chunk_id=ch['chunk_id'], 
+                    text=ch['text'], 
+                    title=ch['title']
+                ))
+            results.append(hits)
+
+        return results
 
 
 def build_retriever(
@@ -68,9 +108,10 @@ def build_hybrid_retriever(
             continue
 
         retriever = Retriever(
-            model=SentenceTransformer(model_name),
+            model=get_embedding_model(model_name),
             index=index,
             chunks=chunk_list,
+            name=model_name,
         )
         hybrid_retrievers.append(retriever)
 
@@ -3,10 +3,14 @@ from typing import Dict, Any, Optional, Tuple, List
 import json, hashlib, re
 import faiss
 from data_service import Chunk
+from citation.index import CITATION_ANN, load_ann_index
+
+
+_RE_UNSAFE_NAME_CHARS = re.compile(r"[^a-zA-Z0-9_.-]+")
 
 
 def _safe_name(s: str) -> str:
-    return re.sub(r"[^a-zA-Z0-9_.-]+", "_", s)
+    return _RE_UNSAFE_NAME_CHARS.sub("_", s)
 
 
 def _file_sha256(p: Path) -> str:
@@ -131,6 +135,8 @@ def load_all_caches(
 
             # ---- load index
             index = faiss.read_index(str(index_path))
+            if CITATION_ANN == "hnsw":
+                index = load_ann_index(index, index_path)
 
             # ---- load chunks
             chunks: List[Chunk] = []
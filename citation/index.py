@@ -1,8 +1,45 @@
+import os
+from pathlib import Path
 import faiss
 import numpy as np
 
+# Approximate search over the same vectors; off unless CITATION_ANN=hnsw. HNSW
+# keeps full-precision vectors, so the scores it returns are exact inner
+# products (only recall is approximate) and no rerank pass is needed
+CITATION_ANN = os.getenv("CITATION_ANN", "").lower()
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = int(os.getenv("CITATION_HNSW_EF_SEARCH", "64"))
+
 
 def build_index(embeddings: np.ndarray) -> faiss.IndexFlatIP:
     index = faiss.IndexFlatIP(embeddings.shape[1])
     index.add(embeddings)
     return index
+
+
+def build_hnsw_index(embeddings: np.ndarray, m: int = HNSW_M) -> faiss.IndexHNSWFlat:
+    index = faiss.IndexHNSWFlat(embeddings.shape[1], m, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    index.add(embeddings)
+    return index
+
+
+def load_ann_index(flat: faiss.Index, flat_path: Path) -> faiss.Index:
+    """
+    HNSW counterpart of the flat index at `flat_path`: read from the sibling
+    .hnsw.faiss file, or built from the flat vectors and saved there when that
+    file is missing or older than the flat index.
+    """
+    path = flat_path.with_suffix(".hnsw.faiss")
+    if path.exists() and path.stat().st_mtime >= flat_path.stat().st_mtime:
+        index = faiss.read_index(str(path))
+    else:
+        index = build_hnsw_index(flat.reconstruct_n(0, flat.ntotal))
+        try:
+            faiss.write_index(index, str(path))
+        except RuntimeError as e:
+            # Read-only cache dir: keep the in-memory index, rebuild next start
+            print(f"[Citation] could not save {path}: {e}")
+    index.hnsw.efSearch = HNSW_EF_SEARCH
+    return index
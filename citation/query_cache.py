@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from data_service import Hit
+
+
+class QueryCache:
+    """
+    Fused citation hits per search: an LRU with a TTL keyed on the normalized
+    query plus the search parameters, and optionally a "near" tier that reuses
+    the hits of an earlier query whose embedding is within `near_threshold`
+    cosine of the new one (same parameters only). Thread-safe.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl_seconds: float = 300,
+        near_threshold: Optional[float] = None,
+        near_size: int = 256,
+    ):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.near_threshold = near_threshold
+        self.near_size = near_size
+        self.stats = Counter()  # hit / near_hit / miss
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, List[Hit]]]" = OrderedDict()  # key -> (stored_at, hits)
+        # params -> ring buffer: (unit query vectors [near_size, dim], hits, stored_at)
+        self._near: Dict[Hashable, Tuple[np.ndarray, List[Optional[List[Hit]]], np.ndarray]] = {}
+        self._near_next: Dict[Hashable, int] = {}
+
+    def get(self, key: Hashable) -> Optional[List[Hit]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, hits = entry
+                if time.monotonic() - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.stats["hit"] += 1
+                    return list(hits)
+                del self._entries[key]
+            return None
+
+    def get_near(self, params: Hashable, vec: np.ndarray) -> Optional[List[Hit]]:
+        """Hits of the closest fresh cached query with these params, if close enough."""
+        if self.near_threshold is None:
+            return None
+        with self._lock:
+            ring = self._near.get(params)
+            if ring is None:
+                return None
+            vecs, hits, stored_at = ring
+            sims = vecs @ vec  # rows and vec are unit length: cosine
+            sims[time.monotonic() - stored_at > self.ttl_seconds] = -1.0
+            best = int(np.argmax(sims))
+            if sims[best] < self.near_threshold or hits[best] is None:
+                return None
+            self.stats["near_hit"] += 1
+            return list(hits[best])
+
+    def put(self, key: Hashable, hits: List[Hit], params: Hashable = None, vec: Optional[np.ndarray] = None) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (now, list(hits))
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+            if self.near_threshold is None or vec is None:
+                return
+            ring = self._near.get(params)
+            if ring is None:
+                ring = self._near[params] = (
+                    np.zeros((self.near_size, vec.shape[0]), dtype=vec.dtype),
+                    [None] * self.near_size,
+                    np.full(self.near_size, -np.inf),
+                )
+            slot = self._near_next.get(params, 0)
+            ring[0][slot] = vec
+            ring[1][slot] = list(hits)
+            ring[2][slot] = now
+            self._near_next[params] = (slot + 1) % self.near_size
+
+    def miss(self) -> None:
+        with self._lock:
+            self.stats["miss"] += 1
+
+    def clear(self) -> None:
+        """Drop every entry, e.g. after the citation index is rebuilt."""
+        with self._lock:
+            self._entries.clear()
+            self._near.clear()
+            self._near_next.clear()
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            total = sum(self.stats.values())
+            served = self.stats["hit"] + self.stats["near_hit"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "hit_rate": served / total if total else 0.0,
+            }
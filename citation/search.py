@@ -1,5 +1,8 @@
+import os
 import torch
 import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple, Dict
 
 
@@ -18,6 +21,8 @@ from citation.built_retriever import build_hybrid_retriever
 from data_service import Hit
 from config import DEFAULT_EMBEDDING_MODEL, CITATION_DIR, BM25_CACHE   
 from citation.bm25_cache import BM25Cache
+from citation.embedding import encode_texts
+from citation.query_cache import QueryCache
 
 # ==========================================
 # 🚀 Global Cache
@@ -36,11 +41,36 @@ def get_cached_retrievers(model_names):
     key = tuple(sorted(names_to_load))
     
     if key not in _CACHED_RETRIEVERS:
-        print(f"\n   [System] Loading AI Models into GPU memory (One-time only)...")
-        _CACHED_RETRIEVERS[key] = build_hybrid_retriever(list(names_to_load), CITATION_DIR)
+        # A subset of already-loaded models reuses those retrievers (models,
+        # FAISS indexes and chunks) instead of loading them all again
+        loaded = {r.name: r for retrievers in _CACHED_RETRIEVERS.values() for r in retrievers}
+        if all(name in loaded for name in names_to_load):
+            _CACHED_RETRIEVERS[key] = [loaded[name] for name in names_to_load]
+        else:
+            print(f"\n   [System] Loading AI Models into GPU memory (One-time only)...")
+            _CACHED_RETRIEVERS[key] = build_hybrid_retriever(list(names_to_load), CITATION_DIR)
     
     return _CACHED_RETRIEVERS[key]
 
+# Fused hits per (normalized query, search parameters). The near tier, which
+# reuses hits for paraphrases, is off unless SEARCH_CACHE_NEAR_THRESHOLD is set
+# (e.g. 0.95): queries that differ in one entity name can embed that close
+_near = os.getenv("SEARCH_CACHE_NEAR_THRESHOLD")
+SEARCH_CACHE = QueryCache(
+    ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL", "300")),
+    near_threshold=float(_near) if _near else None,
+)
+
+# Request-path searches run here rather than in the default executor, which
+# the entity extractor, template routing and startup loaders share: a burst
+# of searches can't starve those, nor they the searches. Threads suffice, as
+# the encoders, FAISS and numpy release the GIL
+SEARCH_POOL_SIZE = int(os.getenv("SEARCH_POOL", str(os.cpu_count() or 8)))
+SEARCH_POOL = ThreadPoolExecutor(max_workers=SEARCH_POOL_SIZE, thread_name_prefix="search")
+
+# Runs the BM25 half of a search beside the dense half, one per search thread
+_BM25_POOL = ThreadPoolExecutor(max_workers=SEARCH_POOL_SIZE, thread_name_prefix="bm25")
+
 def get_cached_bm25():
     global _CACHED_BM25
     if _CACHED_BM25 is None:
@@ -48,6 +78,15 @@ def get_cached_bm25():
         _CACHED_BM25.load(BM25_CACHE)
     return _CACHED_BM25
 
+def warm_search() -> None:
+    """
+    One throwaway search over every default retriever and BM25: the first real
+    query otherwise pays for CUDA kernel setup / allocator growth in each
+    encoder and for faulting in the FAISS and BM25 pages. Bypasses SEARCH_CACHE.
+    """
+    search_batch(["warmup"], top_k_per_model=1)
+
+
 def search(
     query: str,
     model_names: List[str] = None,
@@ -60,18 +99,90 @@ def search(
     assert fuse in {"rrf", "vote", "max"}
     assert per in {"chunk", "citation_id"}
 
-    hybrid_retrievers = get_cached_retrievers(model_names)
+    params = (tuple(model_names or DEFAULT_EMBEDDING_MODEL), top_k_per_model, fuse, per, rrf_k, add_bm25)
+    key = (" ".join(query.lower().split()), params)
+    hits = SEARCH_CACHE.get(key)
+    if hits is not None:
+        return hits
 
-    # Independent search by each model
-    per_model_results: List[List[Hit]] = []
-    for retriever in hybrid_retrievers:
-        per_model_results.append(retriever.search(query, top_k=top_k_per_model))
+    hybrid_retrievers = get_cached_retrievers(model_names)
+    vec = None
+    if SEARCH_CACHE.near_threshold is not None and hybrid_retrievers:
+        # The first model's query vector doubles as the near-tier key and is
+        # reused for that model's search below
+        vec = encode_texts(hybrid_retrievers[0].model, [query], batch_size=1)
+        hits = SEARCH_CACHE.get_near(params, vec[0])
+        if hits is not None:
+            return hits
+
+    SEARCH_CACHE.miss()
+    hits = _search_batch([query], hybrid_retrievers, top_k_per_model, fuse, per, rrf_k, add_bm25, vec)[0]
+    SEARCH_CACHE.put(key, hits, params, None if vec is None else vec[0])
+    return hits
+
+
+def search_batch(
+    queries: List[str],
+    model_names: List[str] = None,
+    top_k_per_model: int = 5,
+    fuse: str = "rrf",  # "rrf" | "vote" | "max"
+    per: str = "chunk",  # "chunk" | "citation_id" 
+    rrf_k: int = 60,
+    add_bm25: bool = True
+) -> List[List[Hit]]:
+    """Same as search() for many queries: each dense model encodes the whole batch at once."""
+    assert fuse in {"rrf", "vote", "max"}
+    assert per in {"chunk", "citation_id"}
 
-    # 2. BM25
+    hybrid_retrievers = get_cached_retrievers(model_names)
+    return _search_batch(queries, hybrid_retrievers, top_k_per_model, fuse, per, rrf_k, add_bm25)
+
+
+def _search_batch(
+    queries: List[str],
+    hybrid_retrievers,
+    top_k_per_model: int,
+    fuse: str,
+    per: str,
+    rrf_k: int,
+    add_bm25: bool,
+    first_vecs=None,
+) -> List[List[Hit]]:
+    # BM25 is CPU work over the corpus while the dense encoders and FAISS run
+    # with the GIL released: start it first so the two overlap
+    bm25_future = None
     if add_bm25:
         bm25_cache = get_cached_bm25()
-        per_model_results.append(bm25_cache.search(query, top_k=top_k_per_model))
+        bm25_future = _BM25_POOL.submit(
+            lambda: [bm25_cache.search(query, top_k=top_k_per_model) for query in queries]
+        )
 
+    # Independent search by each model, one batched call per model; inference
+    # mode skips autograd's version-counter bookkeeping in every forward pass
+    with torch.inference_mode():
+        per_model_batches: List[List[List[Hit]]] = [
+            retriever.search_vectors(first_vecs, top_k=top_k_per_model)
+            if i == 0 and first_vecs is not None
+            else retriever.search_batch(queries, top_k=top_k_per_model)
+            for i, retriever in enumerate(hybrid_retrievers)
+        ]
+
+    if bm25_future is not None:
+        per_model_batches.append(bm25_future.result())
+
+    return [
+        _fuse([batch[i] for batch in per_model_batches], top_k_per_model, fuse, per, rrf_k)
+        for i in range(len(queries))
+    ]
+
+
+def _fuse(
+    per_model_results: List[List[Hit]],
+    top_k: int,
+    fuse: str,
+    per: str,
+    rrf_k: int,
+) -> List[Hit]:
     # Fusion Logic
     def key_of(h: Hit):
         return (h.citation_id, h.chunk_id) if per == "chunk" else (h.citation_id,)
@@ -79,7 +190,6 @@ def search(
     agg_payload: Dict[Tuple, Hit] = {}
     best_score: Dict[Tuple, float] = {}
     best_rank: Dict[Tuple, int] = {}
-    votes: Dict[Tuple, int] = {}
     scores: Dict[Tuple, float] = {}
 
     for model_hits in per_model_results:
@@ -93,11 +203,15 @@ def search(
             if fuse == "rrf":
                 scores[k] = scores.get(k, 0.0) + 1.0 / (rrf_k + rank)
                 best_rank[k] = min(best_rank.get(k, 1_000_000), rank)
-            elif fuse == "vote":
-                votes[k] = votes.get(k, 0) + 1
             elif fuse == "max":
                 scores[k] = max(scores.get(k, -1e9), h.score)
 
+    if fuse == "vote":
+        # Count key occurrences in one C-level pass instead of a dict update per hit
+        votes: Dict[Tuple, int] = Counter(
+            key_of(h) for model_hits in per_model_results for h in model_hits
+        )
+
     # 3) Sorting
     items = list(agg_payload.items())
     if fuse == "vote":
@@ -115,7 +229,7 @@ def search(
 
     # 4) Assemble output
     out: List[Hit] = []
-    for _, h in items[:top_k_per_model]:
+    for _, h in items[:top_k]:
         out.append(
             Hit(
                 score=float(
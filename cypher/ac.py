@@ -1,36 +1,45 @@
 # pip install pyahocorasick rapidfuzz
 import os, re, pickle, glob
 import ahocorasick
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, List, Optional, Tuple
 import pandas as pd
 from config import AC_KEGG_PKL
 
 # ---------- 规范化 ----------
+_RE_SQUARE_BRACKETS = re.compile(r"\[[^\[\]]*\]")
+_RE_NON_STRUCTURAL_PARENS = re.compile(r"\([^()\dRrSs]+\)")
+_RE_PUNCT_SEP = re.compile(r"\s*[,;:]\s*")
+
 def norm(s: str) -> str:
     """Normalize text for matching"""
     s = s.lower().strip()
     
-    # Greek letters
-    s = (s.replace("α", "alpha")
-           .replace("β", "beta")
-           .replace("γ", "gamma")
-           .replace("δ", "delta")
-           .replace("ε", "epsilon")
-           .replace("μ", "mu")
-           .replace("ω", "omega"))
-    
-    # Remove non-structural brackets (keep those with digits or R/S chirality)
-    s = re.sub(r"\[[^\[\]]*\]", "", s)
-    s = re.sub(r"\([^()\dRrSs]+\)", "", s)
+    # Greek letters (ASCII text, i.e. almost every query, has none: skip the passes)
+    if not s.isascii():
+        s = (s.replace("α", "alpha")
+               .replace("β", "beta")
+               .replace("γ", "gamma")
+               .replace("δ", "delta")
+               .replace("ε", "epsilon")
+               .replace("μ", "mu")
+               .replace("ω", "omega"))
+    
+    # Remove non-structural brackets (keep those with digits or R/S chirality);
+    # most names and queries have none, so skip the regex when it can't match
+    if "[" in s:
+        s = _RE_SQUARE_BRACKETS.sub("", s)
+    if "(" in s:
+        s = _RE_NON_STRUCTURAL_PARENS.sub("", s)
     
     # Symbol replacements
     s = s.replace("&", " and ")
     s = s.replace("-", " ")
-    s = s.replace("→", "to").replace("->", "to")
+    s = s.replace("→", "to")  # "->" is already gone: "-" was mapped to " " above
     
-    # Clean up whitespace and punctuation
-    s = re.sub(r"\s+", " ", s)
-    s = re.sub(r"\s*[,;:]\s*", " ", s)
+    # Clean up whitespace and punctuation (split/join collapses whitespace in C;
+    # dropping the ends early is fine, the final strip removes them anyway)
+    s = _RE_PUNCT_SEP.sub(" ", " ".join(s.split()))
     s = s.strip(" ,;:")
     
     return s
@@ -67,21 +76,41 @@ def load_alias_entries(csv_files: List[str]) -> pd.DataFrame:
     return all_df
 
 # ---------- 构建 AC（改进版：存储长度） ----------
-def build_ac(entries: pd.DataFrame, min_length: int = 2):
+PARALLEL_NORM_MIN = 50_000  # below this, process start-up costs more than it saves
+
+def norm_all(names: List[str], workers: Optional[int] = None) -> List[str]:
+    """norm() over many names; large lists are split across worker processes"""
+    # The same name recurs across species/ID files: normalize each distinct one once
+    unique = list(dict.fromkeys(names))
+    if workers == 1 or len(unique) < PARALLEL_NORM_MIN:
+        normalized = dict(zip(unique, map(norm, unique)))
+    else:
+        n_workers = workers or os.cpu_count() or 1
+        chunksize = max(1, len(unique) // (n_workers * 4))
+        with ProcessPoolExecutor(max_workers=n_workers) as ex:
+            normalized = dict(zip(unique, ex.map(norm, unique, chunksize=chunksize)))
+    
+    return [normalized[n] for n in names]
+
+def build_ac(entries: pd.DataFrame, min_length: int = 2, workers: Optional[int] = None):
     """Build Aho-Corasick automaton with length information"""
     alias_map: Dict[str, List[Dict]] = {}
     
-    for _, row in entries.iterrows():
-        al = norm(row["name"])
+    # Normalize the whole name column once, then walk plain column tuples
+    # (iterrows builds a Series per row)
+    normalized = norm_all(entries["name"].tolist(), workers)
+    for al, entity_id, species, db, name in zip(
+        normalized, entries["id"], entries["species"], entries["db"], entries["name"]
+    ):
         # Skip empty or very short normalized names
         if not al or len(al) < min_length:
             continue
             
         alias_map.setdefault(al, []).append({
-            "id": row["id"],
-            "species": row["species"],
-            "db": row["db"],
-            "alias_raw": row["name"],
+            "id": entity_id,
+            "species": species,
+            "db": db,
+            "alias_raw": name,
             "length": len(al)  # Store normalized length
         })
     
@@ -180,7 +209,7 @@ def query_text(
     return results
 
 # ---------- 一键构建 ----------
-def build_from_dir(csv_dir: str, cache_path: str = "ac_kegg.pkl"):
+def build_from_dir(csv_dir: str, cache_path: str = "ac_kegg.pkl", workers: Optional[int] = None):
     """Build automaton from directory of CSV files"""
     csv_files = sorted(glob.glob(os.path.join(csv_dir, "ID_map_*.csv")))
     
@@ -191,7 +220,7 @@ def build_from_dir(csv_dir: str, cache_path: str = "ac_kegg.pkl"):
     entries = load_alias_entries(csv_files)
     print(f"Loaded {len(entries)} total entries")
     
-    A, alias_map = build_ac(entries)
+    A, alias_map = build_ac(entries, workers=workers)
     print(f"Built automaton with {len(alias_map)} unique normalized aliases")
     
     save_cache(A, alias_map, cache_path)
@@ -1,6 +1,33 @@
 from typing import Any, List, Dict, Optional, Tuple
 import re
 
+# _extract_query: fence / leading-label cleanup and template-ID sniffing
+_RE_FENCE = re.compile(r'```\w*\s*')
+_RE_LEAD_LABEL = re.compile(r'^(?:cypher|neo4j|query|here is|answer):\s*', re.IGNORECASE)
+_RE_TEMPLATE_ID = re.compile(r'\b(T\d{3}[a-z]?)\b')
+
+# _extract_query: leftmost Cypher head, first RETURN after it, then the first blank
+# line not followed by a Cypher continuation. Three forward scans, so the cost stays
+# linear even on long LLM replies where one lazy DOTALL pattern would rescan the
+# tail from every candidate start.
+_RE_CYPHER_HEAD = re.compile(r'(?:MATCH|CALL|WITH)\s', re.IGNORECASE)
+_RE_CYPHER_RETURN = re.compile(r'RETURN\s+', re.IGNORECASE)
+_RE_CYPHER_TRAILER = re.compile(
+    r'\n\n(?!MATCH|CALL|WITH|WHERE|OPTIONAL|ORDER|LIMIT|RETURN|UNION)', re.IGNORECASE
+)
+
+# _fix_prefixes: unprefixed EC number or pathway ID in an id: literal
+_RE_BARE_ID = re.compile(r"id:\s*['\"](?:(?P<ec>\d+\.\d+\.\d+\.\d+)|(?P<path>[a-z]{2,3}\d{5}))['\"]")
+
+
+# _format_entities: fixed head of the per-question entities block
+_ENTITIES_HEADER = "\n[DETECTED ENTITIES]\nUse these confirmed IDs when filling template placeholders:\n"
+
+
+def _prefix_bare_id(m: re.Match) -> str:
+    ec = m.group('ec')
+    return f"id: 'EC:{ec}'" if ec else f"id: 'path:{m.group('path')}'"
+
 class Config:
     DEFAULT_LIMIT = 20
     MAX_RESULTS = 20
@@ -35,16 +62,16 @@ class SimpleCypherGenerator:
 
     CYPHER_TEMPLATES = {
         # --- [T001-T010] Direct Entity Lookup ---
-        "T001": {"description": "Find gene node", "cypher": "MATCH (n:Gene {id: '{GENE_ID}'}) RETURN n"},
-        "T002": {"description": "Find pathway node", "cypher": "MATCH (n:Pathway {id: '{PATHWAY_ID}'}) RETURN n"},
-        "T003": {"description": "Find compound node", "cypher": "MATCH (n:Compound {id: '{COMPOUND_ID}'}) RETURN n"},
-        "T004": {"description": "Find enzyme node", "cypher": "MATCH (n:EC {id: '{EC_ID}'}) RETURN n"},
-        "T005": {"description": "Find reaction node", "cypher": "MATCH (n:Reaction {id: '{REACTION_ID}'}) RETURN n"},
-        "T006": {"description": "Get gene properties", "cypher": "MATCH (n:Gene {id: '{GENE_ID}'}) RETURN properties(n)"},
-        "T007": {"description": "Get pathway properties", "cypher": "MATCH (n:Pathway {id: '{PATHWAY_ID}'}) RETURN properties(n)"},
-        "T008": {"description": "Get compound properties", "cypher": "MATCH (n:Compound {id: '{COMPOUND_ID}'}) RETURN properties(n)"},
-        "T009": {"description": "Get enzyme properties", "cypher": "MATCH (n:EC {id: '{EC_ID}'}) RETURN properties(n)"},
-        "T010": {"description": "Get reaction properties", "cypher": "MATCH (n:Reaction {id: '{REACTION_ID}'}) RETURN properties(n)"},
+        "T001": {"description": "Find gene node", "cypher": "MATCH (n:Gene {id: '{GENE_ID}'}) RETURN n LIMIT 1"},
+        "T002": {"description": "Find pathway node", "cypher": "MATCH (n:Pathway {id: '{PATHWAY_ID}'}) RETURN n LIMIT 1"},
+        "T003": {"description": "Find compound node", "cypher": "MATCH (n:Compound {id: '{COMPOUND_ID}'}) RETURN n LIMIT 1"},
+        "T004": {"description": "Find enzyme node", "cypher": "MATCH (n:EC {id: '{EC_ID}'}) RETURN n LIMIT 1"},
+        "T005": {"description": "Find reaction node", "cypher": "MATCH (n:Reaction {id: '{REACTION_ID}'}) RETURN n LIMIT 1"},
+        "T006": {"description": "Get gene properties (id, name, species)", "cypher": "MATCH (n:Gene {id: '{GENE_ID}'}) RETURN n {.id, .name, .species} AS n LIMIT 1"},
+        "T007": {"description": "Get pathway properties (id, title, species)", "cypher": "MATCH (n:Pathway {id: '{PATHWAY_ID}'}) RETURN n {.id, .title, .species} AS n LIMIT 1"},
+        "T008": {"description": "Get compound properties (id, name, names, formula)", "cypher": "MATCH (n:Compound {id: '{COMPOUND_ID}'}) RETURN n {.id, .name, .names, .formula} AS n LIMIT 1"},
+        "T009": {"description": "Get enzyme properties (id, name, sysname)", "cypher": "MATCH (n:EC {id: '{EC_ID}'}) RETURN n {.id, .name, .sysname} AS n LIMIT 1"},
+        "T010": {"description": "Get reaction properties (id, name, definition, equation)", "cypher": "MATCH (n:Reaction {id: '{REACTION_ID}'}) RETURN n {.id, .name, .definition, .equation} AS n LIMIT 1"},
 
         # --- [T011-T025] 1-Hop Relationships ---
         "T011": {"description": "Find enzymes by Gene", "cypher": "MATCH (g:Gene {id: '{GENE_ID}'})-[:ENCODES]->(e:EC) RETURN e"},
@@ -139,61 +166,91 @@ class SimpleCypherGenerator:
         "T083": {"description": "Find gene family members associated with a pathway or reaction by name keyword (e.g. FAD2 in desaturation)", "cypher": "MATCH (g:Gene)-[:BELONGS_TO]->(o:Ortholog)-[:CATALYZES]->(r:Reaction) WHERE toLower(o.name) CONTAINS toLower('{ORTHOLOG_NAME}') OR toLower(o.symbol) CONTAINS toLower('{ORTHOLOG_NAME}') OPTIONAL MATCH (p:Pathway)-[:CONTAINS]->(r) RETURN DISTINCT g.id AS gene_id, g.name AS gene_name, g.species AS species, o.id AS ortholog_id, o.name AS ortholog_name, r.name AS reaction_name, p.title AS pathway LIMIT 20"},
     }
 
+    _PROMPT_PREFIXES: Dict[Tuple[type, str], str] = {}  # (class, schema) -> prompt prefix
+
     def __init__(self, llm: Any, schema: Optional[str] = None):
         self.llm = llm
         self.schema = schema or self.DETAILED_SCHEMA
-
-    def generate_query(self, question: str, entities: Optional[List[Dict]] = None) -> Tuple[str, Dict]:
+        # Everything but the question is fixed per schema: build it once per
+        # process (a generator is created per request), and keep it first so
+        # the provider can reuse the cached prompt prefix
+        key = (type(self), self.schema)
+        self._prompt_prefix = self._PROMPT_PREFIXES.get(key)
+        if self._prompt_prefix is None:
+            self._prompt_prefix = self._PROMPT_PREFIXES[key] = self._build_prompt_prefix(self._build_template_catalog())
+
+    def generate_query(self, question: str, entities: Optional[List[Dict]] = None, template_hint: Optional[str] = None) -> Tuple[str, Dict]:
         try:
-            # Step 1: Build template catalog for LLM
-            template_catalog = self._build_template_catalog()
-
-            # Step 2: Ask LLM to select and fill template
-            prompt = self._build_prompt(question, template_catalog, entities)
+            # Steps 1-2: Build template catalog and prompt for LLM
+            prompt = self._build_prompt(question, entities, template_hint)
 
             # Step 3: Get LLM response
             response = self.llm.generate(prompt)
+
+            return self._finish_query(response)
             
-            # Step 4: Extract and clean query
-            cypher_query, template_id  = self._extract_query(response)
-            
-            # Step 5: Post-process (fix prefixes)
-            cypher_query = self._fix_prefixes(cypher_query)
-            
-            metadata = {
-                "success": True,
-                "template_id": template_id,
-                "raw_response": response[:200]  # First 200 chars for debugging
-            }
-            
-            return cypher_query, metadata
-            
         except Exception as e:
             return "", {"success": False, "error": str(e)}
 
+    async def agenerate_query(self, question: str, entities: Optional[List[Dict]] = None, template_hint: Optional[str] = None) -> Tuple[str, Dict]:
+        """Async generate_query, so callers can keep several LLM requests in flight."""
+        try:
+            prompt = self._build_prompt(question, entities, template_hint)
+            response = await self.llm.agenerate(prompt)
+            return self._finish_query(response)
+
+        except Exception as e:
+            return "", {"success": False, "error": str(e)}
+
+    def _finish_query(self, response: str) -> Tuple[str, Dict]:
+        # Step 4: Extract and clean query
+        cypher_query, template_id  = self._extract_query(response)
+        
+        # Step 5: Post-process (fix prefixes)
+        cypher_query = self._fix_prefixes(cypher_query)
+        
+        metadata = {
+            "success": True,
+            "template_id": template_id,
+            "raw_response": response[:200]  # First 200 chars for debugging
+        }
+        
+        return cypher_query, metadata
+
     def _build_template_catalog(self) -> str:
         """Build a formatted catalog of all templates"""
-        catalog_lines = []
-        for tid, data in self.CYPHER_TEMPLATES.items():
-            catalog_lines.append(f"{tid}: {data['description']}")
-            catalog_lines.append(f"   Template: {data['cypher']}")
-        return "\n".join(catalog_lines)
+        return "\n".join(
+            f"{tid}: {data['description']}\n   Template: {data['cypher']}"
+            for tid, data in self.CYPHER_TEMPLATES.items()
+        )
 
     def _format_entities(self, entities: Optional[List[Dict]]) -> str:
         """Format extracted entities into a readable block for the prompt."""
         if not entities:
             return ""
-        lines = []
-        for e in entities:
-            lines.append(
-                f'  "{e.get("text", "")}" → ID: {e.get("id", "?")}, '
-                f'DB: {e.get("db", "?")}, Species: {e.get("species", "-")}'
-            )
-        return "\n[DETECTED ENTITIES]\nUse these confirmed IDs when filling template placeholders:\n" + "\n".join(lines) + "\n"
-
-    def _build_prompt(self, question: str, template_catalog: str, entities: Optional[List[Dict]] = None) -> str:
-        """Build the LLM prompt"""
-        entities_block = self._format_entities(entities)
+        # One line per entity, each ending in a newline, so the block is a single join
+        return _ENTITIES_HEADER + "".join(
+            f'  "{e.get("text", "")}" → ID: {e.get("id", "?")}, '
+            f'DB: {e.get("db", "?")}, Species: {e.get("species", "-")}\n'
+            for e in entities
+        )
+
+    def _format_template_hint(self, template_hint: Optional[str]) -> str:
+        """Router suggestion (e.g. from the fused front-door call) as a prompt block."""
+        if not template_hint or template_hint not in self.CYPHER_TEMPLATES:
+            return ""
+        return f"\n[SUGGESTED TEMPLATE]\n{template_hint} was pre-selected for this question; use it unless it clearly does not fit.\n"
+
+    def _build_prompt(self, question: str, entities: Optional[List[Dict]] = None, template_hint: Optional[str] = None) -> str:
+        """Build the LLM prompt: the static prefix, then the per-question block"""
+        return (
+            f"{self._prompt_prefix}\n[QUESTION]\n{question}\n"
+            f"{self._format_entities(entities)}{self._format_template_hint(template_hint)}"
+            "\nAnswer in the OUTPUT FORMAT above.\n"
+        )
+
+    def _build_prompt_prefix(self, template_catalog: str) -> str:
+        """Schema, template catalog and instructions; the same for every question"""
         return f"""You are a Neo4j Cypher query generator. Your task is to:
 1. First, select the most appropriate response template based on the user's question
 2. If a suitable template exists, fill in the placeholders with the correct values
@@ -206,9 +263,6 @@ class SimpleCypherGenerator:
 [AVAILABLE TEMPLATES]
 {template_catalog}
 
-[QUESTION]
-{question}
-{entities_block}
 [INSTRUCTIONS]
 
 STEP 1: DETERMINE ID TYPE
@@ -330,13 +384,12 @@ MATCH (r:Reaction)-[:PRODUCES]->(c:Compound) WHERE toLower(c.name) CONTAINS toLo
             # Remove the template line
             response = '\n'.join(lines[1:])
         
-        # Remove markdown code blocks
-        response = re.sub(r'```\w*\s*', '', response)
-        response = response.replace('```', '')
+        # Remove markdown code blocks (no-op, so skipped, when there is no fence)
+        if '```' in response:
+            response = _RE_FENCE.sub('', response).replace('```', '')
         
         # Remove common prefixes
-        response = re.sub(r'^(?:cypher|neo4j|query|here is|answer):\s*', '', 
-                         response, flags=re.IGNORECASE)
+        response = _RE_LEAD_LABEL.sub('', response)
         
         # Remove lines that look like explanations
         lines = []
@@ -348,7 +401,7 @@ MATCH (r:Reaction)-[:PRODUCES]->(c:Compound) WHERE toLower(c.name) CONTAINS toLo
                 continue
             # Also try to extract template ID if it's in a comment or note
             if not template_id:
-                tid_match = re.search(r'\b(T\d{3}[a-z]?)\b', line)
+                tid_match = _RE_TEMPLATE_ID.search(line)
                 if tid_match:
                     template_id = tid_match.group(1)
             lines.append(line)
@@ -358,12 +411,11 @@ MATCH (r:Reaction)-[:PRODUCES]->(c:Compound) WHERE toLower(c.name) CONTAINS toLo
         # Try to extract just the MATCH...RETURN part.
         # Stop only at a blank line followed by non-Cypher text or end-of-string.
         # Do NOT stop at LIMIT/ORDER/WHERE/WITH/RETURN/OPTIONAL which are valid Cypher continuations.
-        match = re.search(
-            r'(MATCH|CALL|WITH)\s+.*?RETURN\s+.*?(?=\n\n(?!MATCH|CALL|WITH|WHERE|OPTIONAL|ORDER|LIMIT|RETURN|UNION)|\Z)',
-            response, re.IGNORECASE | re.DOTALL
-        )
-        if match:
-            response = match.group(0)
+        head = _RE_CYPHER_HEAD.search(response)
+        ret = _RE_CYPHER_RETURN.search(response, head.end()) if head else None
+        if ret:
+            trailer = _RE_CYPHER_TRAILER.search(response, ret.end())
+            response = response[head.start():trailer.start() if trailer else len(response)]
 
         return response.strip(), template_id
     
@@ -373,16 +425,9 @@ MATCH (r:Reaction)-[:PRODUCES]->(c:Compound) WHERE toLower(c.name) CONTAINS toLo
         if not query:
             return query
         
-        # Fix EC numbers - add EC: prefix if missing
-        query = re.sub(r"id:\s*['\"](?<!EC:)(\d+\.\d+\.\d+\.\d+)['\"]", 
-                      r"id: 'EC:\1'", query)
-        
-        # Fix pathway IDs - add path: prefix if missing
-        # Match pathway IDs like eco00010, hsa00010, etc.
-        query = re.sub(r"id:\s*['\"](?<!path:)([a-z]{2,3}\d{5})['\"]", 
-                      r"id: 'path:\1'", query)
-        
-        return query
+        # Add EC: to bare EC numbers and path: to bare pathway IDs (eco00010,
+        # hsa00010, ...) in a single scan
+        return _RE_BARE_ID.sub(_prefix_bare_id, query)
 
 
 # # Example usage and testing
@@ -12,22 +12,27 @@ from llm_factory import BaseLLM
 from cypher.db_enginer import Neo4jClient
 from cypher.cypher_generator import SimpleCypherGenerator
 
-async def cypher_query(question: str, llm:BaseLLM, neo4j_client: Neo4jClient):
+async def cypher_query(question: str, llm:BaseLLM, neo4j_client: Neo4jClient, llm_mentions: Optional[List[Dict]] = None, template_hint: Optional[str] = None):
+    # llm_mentions / template_hint come from the fused front-door call when it
+    # succeeded; they replace the entity-extraction LLM call and steer template choice
 
     entity_extractor = BioEntityExtractor(llm=llm)
    
     cypher_generator = SimpleCypherGenerator(llm=llm)
 
-    entities = entity_extractor.extract_mentions(question) 
+    # Awaited, not called: the sync versions would block the event loop (and the
+    # token stream running beside this task) for the length of each LLM call
+    entities = await entity_extractor.aextract_mentions(question, llm_mentions=llm_mentions)
     # print(entities)
     # llm_query_engine = LLMCypherQueryGenerator(llm=llm)
-    # cypher, source = llm_query_engine.generate_query(
+    # cypher, source, params = llm_query_engine.generate_query(
     #             question=question,
     #             entities=entities
     # )
+    # result = await neo4j_client.run_query(cypher=cypher, params=params)
 
     try:
-        cypher_query, metadata = cypher_generator.generate_query(question=question, entities=entities)
+        cypher_query, metadata = await cypher_generator.agenerate_query(question=question, entities=entities, template_hint=template_hint)
         # print(cypher_query)
         result = await neo4j_client.run_query(cypher=cypher_query)
 
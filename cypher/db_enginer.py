@@ -1,4 +1,15 @@
+import asyncio
+import os
 from neo4j import AsyncGraphDatabase
+from neo4j.exceptions import Neo4jError
+
+# Node labels looked up by `id`; the template index hints depend on these indexes
+INDEXED_LABELS = ("Gene", "Pathway", "Compound", "EC", "Reaction", "Ortholog", "FunctionalUnit")
+
+# Bolt connections opened at startup, so the first concurrent requests don't
+# each pay the TCP + handshake + auth round trips
+NEO4J_WARM_CONNECTIONS = int(os.getenv("NEO4J_WARM_CONNECTIONS", "8"))
+NEO4J_POOL_SIZE = int(os.getenv("NEO4J_POOL_SIZE", "100"))  # driver default
 
 class Neo4jClient:
     def __init__(self, uri: str, user: str, password: str):
@@ -8,9 +19,34 @@ class Neo4jClient:
 
     async def connect(self):
         # This creates the actual driver instance asynchronously
-        self.driver = AsyncGraphDatabase.driver(self.uri, auth=self.auth)
+        self.driver = AsyncGraphDatabase.driver(
+            self.uri, auth=self.auth, max_connection_pool_size=NEO4J_POOL_SIZE
+        )
         await self.driver.verify_connectivity()
 
+    async def warm_pool(self, n: int = NEO4J_WARM_CONNECTIONS):
+        # Concurrent sessions each check out (and so open) their own connection;
+        # they go back to the pool idle when the session closes
+        async def ping():
+            async with self.driver.session() as session:
+                await (await session.run("RETURN 1")).consume()
+
+        await asyncio.gather(*(ping() for _ in range(n)))
+
+    async def ensure_indexes(self):
+        # Idempotent; needed by the USING INDEX hints in the Cypher templates.
+        # Best effort: a read-only user lacks schema privileges, and a
+        # uniqueness constraint may already back :Label(id). Either way the
+        # service still starts, with lookups on whatever index exists
+        async with self.driver.session() as session:
+            for label in INDEXED_LABELS:
+                try:
+                    await (await session.run(
+                        f"CREATE INDEX {label.lower()}_id IF NOT EXISTS FOR (n:{label}) ON (n.id)"
+                    )).consume()
+                except Neo4jError as e:
+                    print(f"[Neo4j] could not ensure index on :{label}(id): {e.code}")
+
     async def close(self):
         if self.driver:
             await self.driver.close()
@@ -1,4 +1,6 @@
+import asyncio
 import re
+import ahocorasick
 from typing import List, Dict, Optional, Tuple, Set
 from rapidfuzz import process, fuzz
 from cypher.ac import load_cache, norm
@@ -6,9 +8,27 @@ from config import AC_KEGG_PKL
 from cypher.llm_entity_extractor import LLMBioEntityExtractor
 from llm_factory import BaseLLM
 
+def _build_keyword_automaton(keywords: Dict[str, str]) -> "ahocorasick.Automaton":
+    """AC automaton over `keywords`; each hit carries (dict order rank, value)."""
+    automaton = ahocorasick.Automaton()
+    for rank, (keyword, value) in enumerate(keywords.items()):
+        automaton.add_word(keyword, (rank, value))
+    automaton.make_automaton()
+    return automaton
+
+
 class BioEntityExtractor:
 
     DB_PRIORITY = ["gene", "ortholog", "compound", "ec", "reaction", "pathway", "-"]
+    # db -> priority index, so sort keys are one dict lookup instead of `in` + list.index()
+    DB_RANK = {db: rank for rank, db in enumerate(DB_PRIORITY)}
+    SRC_RANK = {
+        "ac": 0,
+        "regex-exact": 1,
+        "regex-fuzzy": 2,
+        "llm-exact": 3,
+        "llm-fuzzy": 4
+    }
     
     ENZYME_PATTERN = re.compile(
         r"""\b
@@ -23,13 +43,15 @@ class BioEntityExtractor:
         """, re.I | re.X
     )
     
-    # Explicit ID patterns (with relaxed EC: allows x.x.x.- / x.x.x.n / optional EC prefix with space/colon)
-    ID_PATTERNS = [
-        re.compile(r'\bC\d{5}\b'),                 # Compound
-        re.compile(r'\bK\d{5}\b'),                 # Ortholog
-        re.compile(r'\bR\d{5}\b'),                 # Reaction
-        re.compile(r'\b(?:EC[:\s])?\d+\.\d+\.\d+\.(?:\d+|-|x|n)\b', re.I),  # EC
-    ]
+    # Explicit ID patterns, combined into one alternation so a question is scanned once:
+    # Compound / Ortholog / Reaction (C/K/R + 5 digits), and EC with relaxed form
+    # (allows x.x.x.- / x.x.x.n / optional EC prefix with space/colon)
+    ID_PATTERN = re.compile(
+        r'\b[CKR]\d{5}\b'
+        r'|\b(?:(?i:EC)[:\s])?\d+\.\d+\.\d+\.(?:\d+|-|(?i:x|n))\b'
+    )
+    
+    EC_PREFIX_PATTERN = re.compile(r'^(?i:EC)[:\s]*')
     
     SPECIES_HINTS = {
         "arabidopsis": "ath",
@@ -43,6 +65,8 @@ class BioEntityExtractor:
         "aegilops tauschii": "ats",
         "ats": "ats",
     }
+    # One pass over the query finds every hint keyword; earliest dict entry wins
+    SPECIES_AUTOMATON = _build_keyword_automaton(SPECIES_HINTS)
     
     def __init__(self, llm: BaseLLM, default_fuzzy_threshold: int = 95):
         if llm is None:
@@ -69,12 +93,55 @@ class BioEntityExtractor:
         species_hint = species_hint or self._guess_species_hint(question)
         
         # Extract from different sources
-        ac_hits = self._extract_ac(qn, species_hint)
-        regex_hits = self._extract_regex(question, species_hint, fuzzy_threshold) if use_regex else []
+        ac_hits, regex_hits = self._extract_local(question, qn, species_hint, use_regex, fuzzy_threshold)
         llm_hits = self._extract_llm(question, qn, species_hint, fuzzy_threshold) if use_llm else []
         
-        # Combine and deduplicate
-        all_hits = ac_hits + regex_hits + llm_hits
+        return self._merge_hits(ac_hits + regex_hits + llm_hits)
+    
+    async def aextract_mentions(
+        self,
+        question: str,
+        species_hint: Optional[str] = None,
+        use_regex: bool = True,
+        use_llm: bool = True,
+        fuzzy_threshold: Optional[int] = None,
+        llm_mentions: Optional[List[Dict]] = None
+    ) -> List[Dict]:
+        """
+        Async `extract_mentions`: the LLM call runs while AC/regex matching runs in a worker thread.
+        `llm_mentions` ({text, start, end} dicts already produced upstream, e.g. by
+        the fused front-door call) are mapped directly instead of asking the LLM again.
+        """
+
+        if fuzzy_threshold is None:
+            fuzzy_threshold = self.default_fuzzy_threshold
+        
+        qn = norm(question)
+        species_hint = species_hint or self._guess_species_hint(question)
+        
+        local = asyncio.to_thread(self._extract_local, question, qn, species_hint, use_regex, fuzzy_threshold)
+        if llm_mentions is not None:
+            ac_hits, regex_hits = await local
+            llm_hits = self._map_llm_output({"mentions": llm_mentions}, species_hint, fuzzy_threshold)
+        elif use_llm:
+            (ac_hits, regex_hits), llm_hits = await asyncio.gather(
+                local, self._aextract_llm(question, qn, species_hint, fuzzy_threshold)
+            )
+        else:
+            (ac_hits, regex_hits), llm_hits = await local, []
+        
+        return self._merge_hits(ac_hits + regex_hits + llm_hits)
+    
+    def _extract_local(
+        self, question: str, qn: str, species_hint: Optional[str], use_regex: bool, fuzzy_threshold: int
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """AC and regex hits (no LLM)."""
+        ac_hits = self._extract_ac(qn, species_hint)
+        regex_hits = self._extract_regex(question, species_hint, fuzzy_threshold) if use_regex else []
+        return ac_hits, regex_hits
+    
+    def _merge_hits(self, all_hits: List[Dict]) -> List[Dict]:
+        """Combine and deduplicate hits from all sources, in source order (AC, regex, LLM)."""
         print(all_hits)
         # Remove hits without position information
         all_hits = [h for h in all_hits if "start" in h and "end" in h]
@@ -85,7 +152,7 @@ class BioEntityExtractor:
         # Final sort: left to right, then by DB priority
         deduplicated.sort(key=lambda h: (
             h["start"],
-            self.DB_PRIORITY.index(h.get("db", "-")) if h.get("db", "-") in self.DB_PRIORITY else 999
+            self.DB_RANK.get(h.get("db", "-"), 999)
         ))
         
         return deduplicated
@@ -124,7 +191,7 @@ class BioEntityExtractor:
         ac_hits.sort(key=lambda h: (
             -(h["end"] - h["start"]),
             h["start"],
-            self.DB_PRIORITY.index(h["db"]) if h["db"] in self.DB_PRIORITY else 999
+            self.DB_RANK.get(h["db"], 999)
         ))
         
         # Remove overlapping hits (keep longer/higher priority ones)
@@ -133,9 +200,11 @@ class BioEntityExtractor:
     def _extract_regex(self, question: str, species_hint: Optional[str], fuzzy_threshold: int) -> List[Dict]:
         """Extract entities using regex patterns for IDs and enzyme names."""
         regex_hits = []
+        # Scan for IDs once; both the direct hits and the fuzzy mapping below reuse the matches
+        id_matches = list(self.ID_PATTERN.finditer(question))
         
         # Extract explicit IDs directly
-        regex_hits.extend(self._extract_explicit_ids(question))
+        regex_hits.extend(self._extract_explicit_ids(question, id_matches))
         
         # Extract enzyme name phrases
         for match in self.ENZYME_PATTERN.finditer(question):
@@ -150,27 +219,20 @@ class BioEntityExtractor:
             )
         
         # Extract and map explicit IDs with fuzzy matching
-        seen_spans = set()
-        for pattern in self.ID_PATTERNS:
-            for match in pattern.finditer(question):
-                span = (match.start(), match.end())
-                if span in seen_spans:
-                    continue
-                seen_spans.add(span)
-                
-                text = match.group(0)
-                allowed_dbs = self._get_allowed_dbs_for_id(text)
-                
-                regex_hits.extend(
-                    self._map_span_to_ids(
-                        text,
-                        start=match.start(),
-                        end=match.end(),
-                        top_k=3,
-                        cutoff=fuzzy_threshold,
-                        allowed_dbs=allowed_dbs
-                    )
+        for match in id_matches:
+            text = match.group(0)
+            allowed_dbs = self._get_allowed_dbs_for_id(text)
+            
+            regex_hits.extend(
+                self._map_span_to_ids(
+                    text,
+                    start=match.start(),
+                    end=match.end(),
+                    top_k=3,
+                    cutoff=fuzzy_threshold,
+                    allowed_dbs=allowed_dbs
                 )
+            )
         
         # Filter by species if specified
         if species_hint:
@@ -193,6 +255,20 @@ class BioEntityExtractor:
     ) -> List[Dict]:
         """Extract entities using LLM-based extraction."""
         llm_output = self.llm_entity_extractor.extract(question)
+        return self._map_llm_output(llm_output, species_hint, fuzzy_threshold)
+    
+    async def _aextract_llm(
+        self,
+        question: str,
+        normalized_question: str,
+        species_hint: Optional[str],
+        fuzzy_threshold: int
+    ) -> List[Dict]:
+        llm_output = await self.llm_entity_extractor.aextract(question)
+        return self._map_llm_output(llm_output, species_hint, fuzzy_threshold)
+    
+    def _map_llm_output(self, llm_output, species_hint: Optional[str], fuzzy_threshold: int) -> List[Dict]:
+        """Map LLM-extracted mentions to IDs (exact alias match, else fuzzy)."""
         if not llm_output or "mentions" not in llm_output:
             return []
         
@@ -269,7 +345,7 @@ class BioEntityExtractor:
         # Sort by length (descending), DB priority, then score
         hits.sort(key=lambda h: (
             -(h["end"] - h["start"]),
-            self.DB_PRIORITY.index(h.get("db", "-")) if h.get("db", "-") in self.DB_PRIORITY else 999,
+            self.DB_RANK.get(h.get("db", "-"), 999),
             -h.get("score", 100)
         ))
         
@@ -334,41 +410,36 @@ class BioEntityExtractor:
         
         return results
     
-    def _extract_explicit_ids(self, question: str) -> List[Dict]:
+    def _extract_explicit_ids(self, question: str, id_matches: Optional[List[re.Match]] = None) -> List[Dict]:
         """Extract explicit IDs (K, C, R, EC numbers) and create direct hits."""
+        if id_matches is None:
+            id_matches = self.ID_PATTERN.finditer(question)
         hits = []
-        seen_spans = set()
-        
-        for pattern in self.ID_PATTERNS:
-            for match in pattern.finditer(question):
-                span = (match.start(), match.end())
-                if span in seen_spans:
-                    continue
-                seen_spans.add(span)
-                
-                raw_id = match.group(0)
-                start, end = match.start(), match.end()
-                
-                if raw_id[0] in ("K", "k"):
-                    db, entity_id = "ortholog", raw_id.upper()
-                elif raw_id[0] in ("C", "c"):
-                    db, entity_id = "compound", raw_id.upper()
-                elif raw_id[0] in ("R", "r"):
-                    db, entity_id = "reaction", raw_id.upper()
-                else:
-                    # EC number: allow EC: / EC space / direct digits; preserve -, x, n in 4th position
-                    db, entity_id = "ec", self._normalize_ec(raw_id)
-                
-                hits.append({
-                    "text": raw_id,
-                    "id": entity_id,
-                    "db": db,
-                    "species": "-",
-                    "start": start,
-                    "end": end,
-                    "src": "regex-id",
-                    "confidence": 1.0
-                })
+        
+        for match in id_matches:
+            raw_id = match.group(0)
+            start, end = match.start(), match.end()
+            
+            if raw_id[0] in ("K", "k"):
+                db, entity_id = "ortholog", raw_id.upper()
+            elif raw_id[0] in ("C", "c"):
+                db, entity_id = "compound", raw_id.upper()
+            elif raw_id[0] in ("R", "r"):
+                db, entity_id = "reaction", raw_id.upper()
+            else:
+                # EC number: allow EC: / EC space / direct digits; preserve -, x, n in 4th position
+                db, entity_id = "ec", self._normalize_ec(raw_id)
+            
+            hits.append({
+                "text": raw_id,
+                "id": entity_id,
+                "db": db,
+                "species": "-",
+                "start": start,
+                "end": end,
+                "src": "regex-id",
+                "confidence": 1.0
+            })
         
         return hits
     
@@ -380,16 +451,8 @@ class BioEntityExtractor:
         """
         # Priority function
         def priority(hit: Dict) -> Tuple:
-            src_rank = {
-                "ac": 0,
-                "regex-exact": 1,
-                "regex-fuzzy": 2,
-                "llm-exact": 3,
-                "llm-fuzzy": 4
-            }.get(hit.get("src", ""), 9)
-            
-            db = hit.get("db", "-")
-            db_rank = self.DB_PRIORITY.index(db) if db in self.DB_PRIORITY else 999
+            src_rank = self.SRC_RANK.get(hit.get("src", ""), 9)
+            db_rank = self.DB_RANK.get(hit.get("db", "-"), 999)
             
             return (
                 src_rank,
@@ -435,11 +498,13 @@ class BioEntityExtractor:
     @staticmethod
     def _guess_species_hint(query: str) -> Optional[str]:
         """Guess species from query text."""
-        query_lower = query.lower()
-        for keyword, species_code in BioEntityExtractor.SPECIES_HINTS.items():
-            if keyword in query_lower:
-                return species_code
-        return None
+        best = None
+        for _, (rank, species_code) in BioEntityExtractor.SPECIES_AUTOMATON.iter(query.lower()):
+            if best is None or rank < best[0]:
+                best = (rank, species_code)
+                if rank == 0:
+                    break
+        return best[1] if best else None
     
     @staticmethod
     def _allowed_dbs_for_text(text: str) -> Optional[Set[str]]:
@@ -464,7 +529,7 @@ class BioEntityExtractor:
     def _normalize_ec(text: str) -> str:
         """Normalize EC number by removing EC prefix and cleaning up."""
         normalized = text.strip()
-        normalized = re.sub(r'^(?i:EC)[:\s]*', '', normalized)
+        normalized = BioEntityExtractor.EC_PREFIX_PATTERN.sub('', normalized)
         return normalized
     
     @staticmethod
@@ -1,6 +1,267 @@
 from typing import Any, List, Dict, Optional, Tuple
+import asyncio
 import re
 import random
+import threading
+from collections import OrderedDict
+import ahocorasick
+from llm_factory import LLM_ERRORS
+
+_RE_TEMPLATE_ID = re.compile(r'T\d{3}')
+_RE_NUMBERED_TEMPLATE_ID = re.compile(r'^\s*(\d+)\s*[).:\-]\s*\W*(T\d{3})', re.MULTILINE)
+
+NEGATION_TEMPLATE_IDS = ["T052", "T053", "T054", "T055"]
+
+# Template parameter grammar: <type>_id or <type>_id_N, plus $prefix
+_RE_PARAM_ID = re.compile(r'([a-z]+)_id(?:_(\d+))?$')
+_RE_STARTS_WITH = re.compile(r'(?:starting|starts) with ([A-Za-z0-9:]+)', re.IGNORECASE)  # $prefix value
+
+# Every ID type in one alternation: a single finditer pass types each match by
+# group name. KEGG's typed prefixes (cpd:C00022, rn:R00200, ko:K00001,
+# ec:2.3.1.199, md:M00001, path:...) are not genes: GENE skips them, and the
+# lookbehind keeps it from restarting inside the prefix ("pd:C00022"), so the
+# typed branch takes the ID after the colon
+_RE_FIND_ID = re.compile(
+    r'(?P<GENE>(?<![a-z])(?!(?:cpd|rn|ko|ec|md|path):)[a-z]{2,4}:[A-Z0-9_]+)'
+    r'|(?P<PATHWAY>path:[a-z]+\d+|[a-z]{2,3}\d{5})'
+    r'|(?P<REACTION>R\d{5})'
+    r'|(?P<COMPOUND>C\d{5})'
+    r'|(?P<EC>\d+\.\d+\.\d+\.\d+|EC:?[\d\.]+)'
+    r'|(?P<ORTHOLOG>K\d{5})'
+    r'|(?P<FUNCTIONALUNIT>M\d{5})'
+)
+
+# LLM output cleanup (_clean_query) and ID prefix repair (_post_process_prefixes)
+_RE_FENCE = re.compile(r'```\w*\s*')
+_RE_LEAD_LABEL = re.compile(r'^(?:neo4j|cypher|sql|here is|answer:)\s+', re.IGNORECASE)
+_RE_QUERY_START = re.compile(r'(?:MATCH|CALL|WITH|RETURN)\s', re.IGNORECASE)  # slice from here; no DOTALL walk
+_RE_QUERY_START_EOL = re.compile(r'(?:MATCH|CALL|WITH|RETURN)$', re.IGNORECASE)  # head split by a newline
+# Echoed prompt lines dropped by _clean_query; only a fixed-width head of each line is lowered
+_SKIP_PREFIXES = ('template:', 'question:', 'entities:', 'fill placeholders')
+_SKIP_PREFIX_LEN = max(map(len, _SKIP_PREFIXES))
+# Unprefixed EC number or pathway ID in an id: literal; one scan fixes both
+_RE_BARE_ID = re.compile(r"id:\s*['\"](?:(?P<ec>\d+\.\d+\.\d+\.\d+)|(?P<path>[a-z]{2,3}\d{5}))['\"]")
+
+
+def _prefix_bare_id(m: re.Match) -> str:
+    ec = m.group('ec')
+    return f"id: 'EC:{ec}'" if ec else f"id: 'path:{m.group('path')}'"
+
+# _detect_strict_id_type: the four single-letter KEGG-style IDs share one scan
+# (word-bounded, so matches never hide each other); the rest keep priority order
+_RE_STRICT_KRCM_ID = re.compile(r'\b([MKRC])\d{5}\b')
+_RE_STRICT_NS_ID = re.compile(r'\b[a-z]{2,4}:[A-Z0-9_]+\b')
+_RE_STRICT_EC_ID = re.compile(r'\b(?:\d+\.){3}\d+\b')
+_RE_STRICT_PATHWAY_ID = re.compile(r'\b[a-z]{2,3}\d{5}\b')
+
+# Placeholder type -> rewrite of a raw match into the form the graph stores (None keeps the raw match)
+_ID_NORMALIZERS = {
+    "PATHWAY": lambda x: x if x.startswith("path:") else f"path:{x}",
+    "GENE": None,
+    "COMPOUND": None,
+    "REACTION": None,
+    "EC": lambda x: x if x.startswith("EC:") else f"EC:{x}",
+    "ORTHOLOG": None,
+    "FUNCTIONALUNIT": None,
+}
+
+
+def _scan_ids(question: str) -> Dict[str, List[str]]:
+    """IDs in the question by placeholder type, in order of appearance."""
+    found: Dict[str, List[str]] = {t: [] for t in _ID_NORMALIZERS}
+    for m in _RE_FIND_ID.finditer(question):
+        kind, value = m.lastgroup, m.group()
+        normalize = _ID_NORMALIZERS[kind]
+        found[kind].append(value if normalize is None else normalize(value))
+    return found
+
+
+# Deterministic router for well-formed questions: (pattern, template ID). A
+# unique full-question match skips the LLM router; anything else falls through.
+_FQ_HEAD = r'^(?:(?:what|which|list|show|find|get|give me)\s+)?(?:(?:are|is)\s+)?(?:(?:all|the)\s+)*'
+_FQ_TAIL = r'\s*[?.]?\s*$'
+_FQ_IDS = {
+    "C": r'C\d{5}', "R": r'R\d{5}', "K": r'K\d{5}',
+    "EC": r'(?:EC:?\s?)?\d+\.\d+\.\d+\.\d+',
+    "GENE": r'(?!path:)[a-z]{2,4}:[A-Za-z0-9_]+',
+    "PATH": r'(?:path:)?[a-z]{2,4}\d{5}',
+}
+_FQ_NOUN_TIDS = {
+    "count": {"gene": "T041", "pathway": "T042", "compound": "T043", "enzyme": "T044", "reaction": "T045"},
+    "list": {"gene": "T046", "pathway": "T047", "compound": "T048", "enzyme": "T049", "reaction": "T050", "ortholog": "T051"},
+}
+
+
+def _fast_route_table() -> List[Tuple["re.Pattern", Any]]:
+    def rx(body: str) -> "re.Pattern":
+        return re.compile(_FQ_HEAD + body.format(**_FQ_IDS) + _FQ_TAIL, re.IGNORECASE)
+
+    return [
+        # Global count / list families (T041-T051); the noun picks the template
+        (re.compile(r'^(?:how many|count(?:\s+all)?|(?:what is\s+)?the\s+(?:total\s+)?number of|number of)\s+(?:the\s+)?'
+                    r'(gene|pathway|compound|enzyme|reaction)s?(?:\s+are\s+there)?(?:\s+in\s+the\s+(?:graph|database|kg))?' + _FQ_TAIL,
+                    re.IGNORECASE), "count"),
+        (re.compile(r'^(?:list|show|get|give me|return)\s+(?:me\s+)?(?:all\s+)?(?:the\s+)?'
+                    r'(gene|pathway|compound|enzyme|reaction|ortholog)s?' + _FQ_TAIL, re.IGNORECASE), "list"),
+        # Single-entity 1-hop templates keyed by an explicit ID
+        (rx(r'reactions?\s+(?:that\s+)?(?:us(?:e|es|ing)|consum(?:e|es|ing))\s+(?:compound\s+)?{C}'), "T014"),
+        (rx(r'reactions?\s+(?:that\s+)?(?:produc(?:e|es|ing)|generat(?:e|es|ing))\s+(?:compound\s+)?{C}'), "T015"),
+        (rx(r'reactions?\s+(?:are\s+)?(?:catalyzed\s+by|of)\s+(?:enzyme\s+)?{EC}'), "T016"),
+        (rx(r'reactions?\s+(?:are\s+)?(?:catalyzed\s+by|of)\s+(?:ortholog\s+)?{K}'), "T017"),
+        (rx(r'genes?\s+(?:that\s+)?encod(?:e|es|ing)\s+(?:enzyme\s+)?{EC}'), "T019"),
+        (rx(r'genes?\s+(?:in|of)\s+(?:ortholog\s+)?{K}'), "T020"),
+        (rx(r'substrates?\s+of\s+(?:reaction\s+)?{R}'), "T021"),
+        (rx(r'products?\s+of\s+(?:reaction\s+)?{R}'), "T022"),
+        (rx(r'enzymes?\s+(?:that\s+)?(?:catalyz(?:e|es|ing)|of|for)\s+(?:reaction\s+)?{R}'), "T023"),
+        (rx(r'reactions?\s+(?:in|of)\s+(?:pathway\s+)?{PATH}'), "T024"),
+        (rx(r'enzymes?\s+(?:are\s+)?(?:encoded\s+by|of)\s+(?:gene\s+)?{GENE}'), "T011"),
+        (rx(r'pathways?\s+(?:that\s+)?contain(?:s|ing)?\s+(?:reaction\s+)?{R}'), "T026"),
+    ]
+
+
+_FAST_ROUTES = _fast_route_table()
+
+# The whole table folded into one alternation, one named group per route: the
+# usual no-match question costs a single regex call instead of one per route
+_FAST_ROUTE_ANY = re.compile(
+    "|".join(f"(?P<r{i}>{pattern.pattern})" for i, (pattern, _) in enumerate(_FAST_ROUTES)), re.IGNORECASE
+)
+
+
+def _fast_route(question: str) -> Optional[str]:
+    """Template ID for a question matching exactly one deterministic route, else None."""
+    q = question.strip()
+    first = _FAST_ROUTE_ANY.match(q)
+    if first is None: return None
+    # Alternation picks the first matching route; only later routes can add another
+    found = set()
+    for pattern, tid in _FAST_ROUTES[int(first.lastgroup[1:]):]:
+        m = pattern.match(q)
+        if m:
+            found.add(_FQ_NOUN_TIDS[tid][m.group(1).lower()] if tid in _FQ_NOUN_TIDS else tid)
+    return found.pop() if len(found) == 1 else None
+
+
+# Routing keywords -> bit. One Aho-Corasick pass over the lowercased question
+# ORs together the bits of every keyword occurring as a substring (same
+# semantics as `kw in q_lower`, so "genes" and "inter-pathway" still hit).
+_ROUTING_KEYWORDS = [
+    "gene", "pathway", "compound", "enzyme", "ortholog", "reaction", "substrate",
+    "product", "produce", "unit", "functional unit", "shortest", "route", "path from",
+    "share", "common", "both", "exchange", "inter-pathway", "start", "begin", "more than",
+]
+_KW = {kw: 1 << i for i, kw in enumerate(_ROUTING_KEYWORDS)}
+
+
+def _build_keyword_automaton():
+    A = ahocorasick.Automaton()
+    for kw, bit in _KW.items():
+        A.add_word(kw, bit)
+    A.make_automaton()
+    return A
+
+
+_KEYWORD_AUTOMATON = _build_keyword_automaton()
+
+_MASK_PATHFINDING = _KW["shortest"] | _KW["route"] | _KW["path from"]
+_MASK_SHARED = _KW["share"] | _KW["common"] | _KW["both"]
+_MASK_PRODUCE = _KW["produce"] | _KW["product"]
+_MASK_EXCHANGE = _KW["exchange"] | _KW["inter-pathway"]
+_MASK_STARTS_WITH = _KW["start"] | _KW["begin"]
+
+
+def _keyword_bits(q_lower: str) -> int:
+    hits = 0
+    for _, bit in _KEYWORD_AUTOMATON.iter(q_lower):
+        hits |= bit
+    return hits
+
+
+def _compile_template_filler(params: List[str]):
+    """
+    Specialize the regex fill for one template's parameter list.
+
+    Each `<type>_id[_N]` parameter is resolved to (type, index) once; filling
+    is one typed ID scan of the question plus lookups. Returns a function
+    question -> {param: value} or None.
+    """
+    slots = {}
+    for name in params:
+        m = _RE_PARAM_ID.match(name)
+        if not m or m.group(1).upper() not in _ID_NORMALIZERS:
+            return lambda question: None
+        slots[name] = (m.group(1).upper(), int(m.group(2)) - 1 if m.group(2) else 0)
+
+    def fill(question: str) -> Optional[Dict[str, str]]:
+        found = _scan_ids(question)
+        values = {}
+        for name, (t, i) in slots.items():
+            ids = found[t]
+            if i >= len(ids): return None
+            values[name] = ids[i]
+        return values
+
+    return fill
+
+
+def _build_candidate_groups(templates: Dict[str, Dict]) -> Dict[str, Tuple[Tuple[str, ...], str]]:
+    """Router candidate groups and their "<id>: <description>" prompt listings."""
+    is_count = {tid: "count" in data['description'].lower() for tid, data in templates.items()}
+    groups = {
+        "negation": tuple(NEGATION_TEMPLATE_IDS),
+        "count": tuple(tid for tid in templates if is_count[tid]),
+        "default": tuple(tid for tid in templates if not is_count[tid] and tid not in NEGATION_TEMPLATE_IDS),
+    }
+    return {
+        group: (tids, "\n".join(f"{tid}: {templates[tid]['description']}" for tid in tids))
+        for group, tids in groups.items()
+    }
+
+
+def _build_router_schemas(candidates: Dict[str, Tuple[Tuple[str, ...], str]]) -> Dict[str, Tuple[Dict, Dict]]:
+    """Router candidate group -> (single, batch) response schemas. The enum
+    limits decoding to that group's template IDs."""
+    schemas = {}
+    for group, (tids, _) in candidates.items():
+        tid = {"type": "string", "enum": list(tids)}
+        schemas[group] = (
+            {"type": "object", "properties": {"template_id": tid}, "required": ["template_id"]},
+            {"type": "object", "properties": {"template_ids": {"type": "array", "items": tid}}, "required": ["template_ids"]},
+        )
+    return schemas
+
+
+def _build_path_index(metadata: Dict[str, Dict]) -> Dict[Tuple[str, str], List[str]]:
+    """(source, target) -> template IDs with that path, in table order."""
+    index: Dict[Tuple[str, str], List[str]] = {}
+    for tid, meta in metadata.items():
+        index.setdefault((meta["source"], meta["target"]), []).append(tid)
+    return index
+
+
+# Count / list-all templates -> the target entity they ask about (routing steps 9-10)
+_COUNT_TARGETS = {"T041": "GENE", "T042": "PATHWAY", "T043": "COMPOUND", "T044": "EC", "T045": "REACTION"}
+_LIST_TARGETS = {"T046": "GENE", "T047": "PATHWAY", "T048": "COMPOUND", "T049": "GENE", "T050": "REACTION", "T051": "GENE"}
+
+
+def _template_tables():
+    from cypher import llm_cypher_templates
+    return llm_cypher_templates
+
+
+class _LazyClassAttr:
+    """Class attribute computed by `factory(cls)` on first access, then stored on the class."""
+
+    def __init__(self, factory):
+        self.factory = factory
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner):
+        value = self.factory(owner)
+        setattr(owner, self.name, value)
+        return value
 
 class LLMCypherQueryGenerator:
     """
@@ -34,136 +295,50 @@ class LLMCypherQueryGenerator:
     - (:Pathway)-[:CONTAINS]->(:FunctionalUnit)
     """
 
-    CYPHER_TEMPLATES = {
-        # --- [T001-T010] Direct Entity Lookup ---
-        "T001": { "description": "Find gene node", "cypher": "MATCH (n:Gene {id: '{GENE_ID}'}) RETURN n" },
-        "T002": { "description": "Find pathway node", "cypher": "MATCH (n:Pathway {id: '{PATHWAY_ID}'}) RETURN n" },
-        "T003": { "description": "Find compound node", "cypher": "MATCH (n:Compound {id: '{COMPOUND_ID}'}) RETURN n" },
-        "T004": { "description": "Find enzyme node", "cypher": "MATCH (n:EC {id: '{EC_ID}'}) RETURN n" },
-        "T005": { "description": "Find reaction node", "cypher": "MATCH (n:Reaction {id: '{REACTION_ID}'}) RETURN n" },
-        "T006": { "description": "Get gene properties", "cypher": "MATCH (n:Gene {id: '{GENE_ID}'}) RETURN properties(n)" },
-        "T007": { "description": "Get pathway properties", "cypher": "MATCH (n:Pathway {id: '{PATHWAY_ID}'}) RETURN properties(n)" },
-        "T008": { "description": "Get compound properties", "cypher": "MATCH (n:Compound {id: '{COMPOUND_ID}'}) RETURN properties(n)" },
-        "T009": { "description": "Get enzyme properties", "cypher": "MATCH (n:EC {id: '{EC_ID}'}) RETURN properties(n)" },
-        "T010": { "description": "Get reaction properties", "cypher": "MATCH (n:Reaction {id: '{REACTION_ID}'}) RETURN properties(n)" },
-
-        # --- [T011-T025] 1-Hop Relationships ---
-        "T011": { "description": "Find enzymes by Gene", "cypher": "MATCH (g:Gene {id: '{GENE_ID}'})-[:ENCODES]-(e:EC) RETURN e" },
-        "T012": { "description": "Find Ortholog by Gene", "cypher": "MATCH (g:Gene {id: '{GENE_ID}'})-[:BELONGS_TO]-(o:Ortholog) RETURN o" },
-        "T013": { "description": "Find Functional Units by Gene", "cypher": "MATCH (g:Gene {id: '{GENE_ID}'})-[:MEMBER_OF]-(f:FunctionalUnit) RETURN f" },
-        "T014": { "description": "Reactions using Compound", "cypher": "MATCH (c:Compound {id: '{COMPOUND_ID}'})-[:SUBSTRATE_OF]-(r:Reaction) RETURN r" },
-        "T015": { "description": "Reactions producing Compound", "cypher": "MATCH (r:Reaction)-[:PRODUCES]-(c:Compound {id: '{COMPOUND_ID}'}) RETURN r" },
-        "T016": { "description": "Reactions by Enzyme", "cypher": "MATCH (e:EC {id: '{EC_ID}'})-[:CATALYZES]-(r:Reaction) RETURN r" },
-        "T017": { "description": "Reactions by Ortholog", "cypher": "MATCH (o:Ortholog {id: '{ORTHOLOG_ID}'})-[:CATALYZES]-(r:Reaction) RETURN r" },
-        "T018": { "description": "Enzymes of Ortholog", "cypher": "MATCH (o:Ortholog {id: '{ORTHOLOG_ID}'})-[:HAS_ENZYME_FUNCTION]-(e:EC) RETURN e" },
-        "T019": { "description": "Genes encoding Enzyme", "cypher": "MATCH (g:Gene)-[:ENCODES]-(e:EC {id: '{EC_ID}'}) RETURN g" },
-        "T020": { "description": "Genes of Ortholog", "cypher": "MATCH (g:Gene)-[:BELONGS_TO]-(o:Ortholog {id: '{ORTHOLOG_ID}'}) RETURN g" },
-        "T021": { "description": "Substrates of Reaction", "cypher": "MATCH (c:Compound)-[:SUBSTRATE_OF]-(r:Reaction {id: '{REACTION_ID}'}) RETURN c" },
-        "T022": { "description": "Products of Reaction", "cypher": "MATCH (r:Reaction {id: '{REACTION_ID}'})-[:PRODUCES]-(c:Compound) RETURN c" },
-        "T023": { "description": "Enzymes of Reaction", "cypher": "MATCH (e:EC)-[:CATALYZES]-(r:Reaction {id: '{REACTION_ID}'}) RETURN e" },
-        "T024": { "description": "Reactions in Pathway", "cypher": "MATCH (p:Pathway {id: '{PATHWAY_ID}'})-[:CONTAINS]-(r:Reaction) RETURN r" },
-        "T025": { "description": "Functional Units in Pathway", "cypher": "MATCH (p:Pathway {id: '{PATHWAY_ID}'})-[:CONTAINS]-(f:FunctionalUnit) RETURN f" },
-
-        # --- [T026-T035] Multi-Hop Relationships ---
-        "T026": { "description": "Pathways containing Reaction", "cypher": "MATCH (p:Pathway)-[:CONTAINS]-(r:Reaction {id: '{REACTION_ID}'}) RETURN p" },
-        "T027": { "description": "Reactions via Ortholog", "cypher": "MATCH (g:Gene {id: '{GENE_ID}'})-[:BELONGS_TO]-(o:Ortholog)-[:CATALYZES]-(r:Reaction) RETURN r" },
-        "T028": { "description": "Reactions via Enzyme", "cypher": "MATCH (g:Gene {id: '{GENE_ID}'})-[:ENCODES]-(e:EC)-[:CATALYZES]-(r:Reaction) RETURN r" },
-        "T029": { "description": "Compounds via Enzyme", "cypher": "MATCH (g:Gene {id: '{GENE_ID}'})-[:ENCODES]-(e:EC)-[:CATALYZES]-(r:Reaction)-[:PRODUCES]-(c:Compound) RETURN c" },
-        "T030": { "description": "Next Step Compounds", "cypher": "MATCH (c1:Compound {id: '{COMPOUND_ID}'})-[:SUBSTRATE_OF]-(r:Reaction)-[:PRODUCES]-(c2:Compound) RETURN c2" },
-        "T031": { "description": "Previous Step Compounds", "cypher": "MATCH (c1:Compound)-[:SUBSTRATE_OF]-(r:Reaction)-[:PRODUCES]-(c2:Compound {id: '{COMPOUND_ID}'}) RETURN c1" },
-        "T032": { "description": "Downstream Reactions", "cypher": "MATCH (r1:Reaction {id: '{REACTION_ID}'})-[:PRODUCES]-(c:Compound)-[:SUBSTRATE_OF]-(r2:Reaction) RETURN r2" },
-        "T033": { "description": "Compounds produced in Pathway", "cypher": "MATCH (p:Pathway {id: '{PATHWAY_ID}'})-[:CONTAINS]-(r:Reaction)-[:PRODUCES]-(c:Compound) RETURN DISTINCT c" },
-        "T034": { "description": "Compounds consumed in Pathway", "cypher": "MATCH (p:Pathway {id: '{PATHWAY_ID}'})-[:CONTAINS]-(r:Reaction)-[:SUBSTRATE_OF]-(c:Compound) RETURN DISTINCT c" },
-        "T035": { "description": "Enzymes in Functional Unit", "cypher": "MATCH (f:FunctionalUnit {id: '{FUNCTIONALUNIT_ID}'})-[:MEMBER_OF]-(n)-[:ENCODES|HAS_ENZYME_FUNCTION]-(e:EC) RETURN DISTINCT e" },
-        
-        # --- [T036-T045] Stats & Counts ---
-        "T036": { "description": "Count enzymes of Gene", "cypher": "MATCH (g:Gene {id: '{GENE_ID}'})-[r:ENCODES]-(e:EC) RETURN count(r)" },
-        "T037": { "description": "Count reactions in Pathway", "cypher": "MATCH (p:Pathway {id: '{PATHWAY_ID}'})-[r:CONTAINS]-(rxn:Reaction) RETURN count(r)" },
-        "T038": { "description": "Count genes of Ortholog", "cypher": "MATCH (o:Ortholog {id: '{ORTHOLOG_ID}'})-[r:BELONGS_TO]-(g:Gene) RETURN count(r)" },
-        "T039": { "description": "Top Pathways by size", "cypher": "MATCH (p:Pathway)-[r:CONTAINS]-(rxn:Reaction) RETURN p.id, count(r) AS cnt ORDER BY cnt DESC LIMIT 10" }, 
-        "T040": { "description": "Shared Reactions", "cypher": "MATCH (p1:Pathway {id: '{PATHWAY_ID_1}'})-[:CONTAINS]-(r:Reaction)-[:CONTAINS]-(p2:Pathway {id: '{PATHWAY_ID_2}'}) RETURN r" },
-        "T041": { "description": "Count all genes", "cypher": "MATCH (n:Gene) RETURN count(n)" },
-        "T042": { "description": "Count all pathways", "cypher": "MATCH (n:Pathway) RETURN count(n)" },
-        "T043": { "description": "Count all compounds", "cypher": "MATCH (n:Compound) RETURN count(n)" },
-        "T044": { "description": "Count all enzymes", "cypher": "MATCH (n:EC) RETURN count(n)" },
-        "T045": { "description": "Count all reactions", "cypher": "MATCH (n:Reaction) RETURN count(n)" },
-
-        # --- [T046-T051] Global Lists ---
-        "T046": { "description": "List all genes", "cypher": "MATCH (n:Gene) RETURN n LIMIT 50" },
-        "T047": { "description": "List all pathways", "cypher": "MATCH (n:Pathway) RETURN n LIMIT 50" },
-        "T048": { "description": "List all compounds", "cypher": "MATCH (n:Compound) RETURN n LIMIT 50" },
-        "T049": { "description": "List all enzymes", "cypher": "MATCH (n:EC) RETURN n LIMIT 50" },
-        "T050": { "description": "List all reactions", "cypher": "MATCH (n:Reaction) RETURN n LIMIT 50" },
-        "T051": { "description": "List all orthologs", "cypher": "MATCH (n:Ortholog) RETURN n LIMIT 50" },
-
-        # --- [T052-T055] Edge Cases ---
-        "T052": { "description": "Find reactions with NO products", "cypher": "MATCH (r:Reaction) WHERE NOT (r)-[:PRODUCES]-() RETURN r" },
-        "T053": { "description": "Find reactions with NO substrates", "cypher": "MATCH (r:Reaction) WHERE NOT (r)-[:SUBSTRATE_OF]-() RETURN r" },
-        "T054": { "description": "Find orphan pathways (empty)", "cypher": "MATCH (p:Pathway) WHERE NOT (p)-[:CONTAINS]-() RETURN p" },
-        "T055": { "description": "Find enzymes not catalyzing any reaction", "cypher": "MATCH (e:EC) WHERE NOT (e)-[:CATALYZES]-() RETURN e" },
-
-        # --- [T056-T059] Gap Fillers (Deep Inference) ---
-        "T056": { "description": "Pathways involving Gene (via Enzyme)", "cypher": "MATCH (p:Pathway)-[:CONTAINS]-(r:Reaction)-[:CATALYZES]-(e:EC)-[:ENCODES]-(g:Gene {id: '{GENE_ID}'}) RETURN DISTINCT p" },
-        "T057": { "description": "Pathways involving Gene (via Ortholog)", "cypher": "MATCH (p:Pathway)-[:CONTAINS]-(r:Reaction)-[:CATALYZES]-(o:Ortholog)-[:BELONGS_TO]-(g:Gene {id: '{GENE_ID}'}) RETURN DISTINCT p" },
-        "T058": { "description": "Compounds produced by Gene (via Enzyme)", "cypher": "MATCH (g:Gene {id: '{GENE_ID}'})-[:ENCODES]-(e:EC)-[:CATALYZES]-(r:Reaction)-[:PRODUCES]-(c:Compound) RETURN DISTINCT c" },
-        "T059": { "description": "Genes producing Compound", "cypher": "MATCH (c:Compound {id: '{COMPOUND_ID}'})<-[:PRODUCES]-(r:Reaction)<-[:CATALYZES]-(e:EC)<-[:ENCODES]-(g:Gene) RETURN DISTINCT g" },
-        
-        # [V17 NEW] Compounds via Ortholog (Targeting the specific failure)
-        "T057b": { "description": "Compounds produced by Gene (via Ortholog)", "cypher": "MATCH (g:Gene {id: '{GENE_ID}'})-[:BELONGS_TO]-(o:Ortholog)-[:CATALYZES]-(r:Reaction)-[:PRODUCES]-(c:Compound) RETURN DISTINCT c" },
-
-        # --- [T060-T069] Advanced Filters ---
-        "T060": { "description": "Pathways with > N reactions", "cypher": "MATCH (p:Pathway)-[r:CONTAINS]-(rxn:Reaction) WITH p, count(r) as cnt WHERE cnt > 10 RETURN p" },
-        "T061": { "description": "Genes starting with prefix", "cypher": "MATCH (n:Gene) WHERE n.id STARTS WITH '{PREFIX}' RETURN n LIMIT 20" },
-        "T062": { "description": "Pathways starting with prefix", "cypher": "MATCH (n:Pathway) WHERE n.id STARTS WITH '{PREFIX}' RETURN n LIMIT 20" },
-        "T063": { "description": "Compounds starting with prefix", "cypher": "MATCH (n:Compound) WHERE n.id STARTS WITH '{PREFIX}' RETURN n LIMIT 20" },
-        "T064": { "description": "Enzymes starting with prefix", "cypher": "MATCH (n:EC) WHERE n.id STARTS WITH '{PREFIX}' RETURN n LIMIT 20" },
-        "T065": { "description": "Reactions starting with prefix", "cypher": "MATCH (n:Reaction) WHERE n.id STARTS WITH '{PREFIX}' RETURN n LIMIT 20" },
-        "T066": { "description": "Orthologs starting with prefix", "cypher": "MATCH (n:Ortholog) WHERE n.id STARTS WITH '{PREFIX}' RETURN n LIMIT 20" },
-        "T067": { "description": "Functional Units starting with prefix", "cypher": "MATCH (n:FunctionalUnit) WHERE n.id STARTS WITH '{PREFIX}' RETURN n LIMIT 20" },
-        "T068": { "description": "Reactions with > 2 Substrates", "cypher": "MATCH (r:Reaction)-[rel:SUBSTRATE_OF]->(c:Compound) WITH r, count(rel) as input_cnt WHERE input_cnt > 2 RETURN r" },
-        "T069": { "description": "Reactions with > 2 Products", "cypher": "MATCH (r:Reaction)-[rel:PRODUCES]->(c:Compound) WITH r, count(rel) as output_cnt WHERE output_cnt > 2 RETURN r" },
-
-        # --- [T070-T076] Pathfinding & Complex (V17 Updated) ---
-        "T070": { "description": "Shortest path Compound to Compound", "cypher": "MATCH p=shortestPath((c1:Compound {id: '{COMPOUND_ID_1}'})-[*]-(c2:Compound {id: '{COMPOUND_ID_2}'})) RETURN p" },
-        "T071": { "description": "Shortest path Gene to Pathway", "cypher": "MATCH p=shortestPath((g:Gene {id: '{GENE_ID}'})-[*]-(path:Pathway {id: '{PATHWAY_ID}'})) RETURN p" },
-        "T072": { "description": "Shortest path Reaction to Reaction", "cypher": "MATCH p=shortestPath((r1:Reaction {id: '{REACTION_ID_1}'})-[*]-(r2:Reaction {id: '{REACTION_ID_2}'})) RETURN p" },
-        "T073": { "description": "Shortest path Gene to Gene", "cypher": "MATCH p=shortestPath((g1:Gene {id: '{GENE_ID_1}'})-[*]-(g2:Gene {id: '{GENE_ID_2}'})) RETURN p" },
-        "T074": { "description": "Shortest path Pathway to Pathway", "cypher": "MATCH p=shortestPath((p1:Pathway {id: '{PATHWAY_ID_1}'})-[*]-(p2:Pathway {id: '{PATHWAY_ID_2}'})) RETURN p" },
-        "T075": { "description": "Other genes encoding same enzyme (Siblings)", "cypher": "MATCH (g1:Gene {id: '{GENE_ID}'})-[:ENCODES]->(e:EC)<-[:ENCODES]-(g2:Gene) RETURN g2" },
-        # [V17 NEW] Metabolite Exchange
-        "T076": { "description": "Inter-pathway Metabolite Exchange", "cypher": "MATCH (p1:Pathway {id: '{PATHWAY_ID}'})-[:CONTAINS]->(:Reaction)-[:PRODUCES]->(c:Compound)<-[:SUBSTRATE_OF]-(:Reaction)<-[:CONTAINS]-(p2:Pathway) WHERE p1 <> p2 RETURN DISTINCT c" }
-    }
+    # Loaded from cypher.llm_cypher_templates on first access
+    CYPHER_TEMPLATES = _LazyClassAttr(lambda cls: _template_tables().CYPHER_TEMPLATES)
+    TEMPLATE_METADATA = _LazyClassAttr(lambda cls: _template_tables().TEMPLATE_METADATA)
 
-    TEMPLATE_METADATA = {
-        "T001": {"source": "GENE", "target": "GENE"}, "T002": {"source": "PATHWAY", "target": "PATHWAY"}, "T003": {"source": "COMPOUND", "target": "COMPOUND"}, "T004": {"source": "EC", "target": "EC"}, "T005": {"source": "REACTION", "target": "REACTION"},
-        "T006": {"source": "GENE", "target": "GENE"}, "T007": {"source": "PATHWAY", "target": "PATHWAY"}, "T008": {"source": "COMPOUND", "target": "COMPOUND"}, "T009": {"source": "EC", "target": "EC"}, "T010": {"source": "REACTION", "target": "REACTION"},
-        "T011": {"source": "GENE", "target": "EC"}, "T012": {"source": "GENE", "target": "ORTHOLOG"}, "T013": {"source": "GENE", "target": "FUNCTIONALUNIT"},
-        "T014": {"source": "COMPOUND", "target": "REACTION"}, "T015": {"source": "COMPOUND", "target": "REACTION"},
-        "T016": {"source": "EC", "target": "REACTION"}, "T017": {"source": "ORTHOLOG", "target": "REACTION"}, "T018": {"source": "ORTHOLOG", "target": "EC"},
-        "T019": {"source": "EC", "target": "GENE"}, "T020": {"source": "ORTHOLOG", "target": "GENE"},
-        "T021": {"source": "REACTION", "target": "COMPOUND"}, "T022": {"source": "REACTION", "target": "COMPOUND"}, "T023": {"source": "REACTION", "target": "EC"},
-        "T024": {"source": "PATHWAY", "target": "REACTION"}, "T025": {"source": "PATHWAY", "target": "FUNCTIONALUNIT"},
-        "T026": {"source": "REACTION", "target": "PATHWAY"}, "T027": {"source": "GENE", "target": "REACTION"}, "T028": {"source": "GENE", "target": "REACTION"}, "T029": {"source": "GENE", "target": "COMPOUND"},
-        "T030": {"source": "COMPOUND", "target": "COMPOUND"}, "T031": {"source": "COMPOUND", "target": "COMPOUND"},
-        "T032": {"source": "REACTION", "target": "REACTION"}, "T033": {"source": "PATHWAY", "target": "COMPOUND"}, "T034": {"source": "PATHWAY", "target": "COMPOUND"}, "T035": {"source": "FUNCTIONALUNIT", "target": "EC"},
-        "T036": {"source": "GENE", "target": "EC"}, "T037": {"source": "PATHWAY", "target": "REACTION"}, "T038": {"source": "ORTHOLOG", "target": "GENE"}, "T040": {"source": "PATHWAY", "target": "REACTION"},
-        "T046": {"source": "GENE", "target": "GENE"}, "T047": {"source": "PATHWAY", "target": "PATHWAY"}, "T048": {"source": "COMPOUND", "target": "COMPOUND"}, "T049": {"source": "EC", "target": "EC"}, "T050": {"source": "REACTION", "target": "REACTION"},
-        "T056": {"source": "GENE", "target": "PATHWAY"}, "T057": {"source": "GENE", "target": "PATHWAY"}, 
-        "T058": {"source": "GENE", "target": "COMPOUND"}, "T059": {"source": "COMPOUND", "target": "GENE"},
-        "T057b": {"source": "GENE", "target": "COMPOUND"}, # New V17 mapping
-        "T060": {"source": "PATHWAY", "target": "PATHWAY"}, "T061": {"source": "GENE", "target": "GENE"}, "T062": {"source": "PATHWAY", "target": "PATHWAY"}, "T063": {"source": "COMPOUND", "target": "COMPOUND"}, "T064": {"source": "EC", "target": "EC"},
-        "T065": {"source": "REACTION", "target": "REACTION"}, "T066": {"source": "ORTHOLOG", "target": "ORTHOLOG"}, "T067": {"source": "FUNCTIONALUNIT", "target": "FUNCTIONALUNIT"},
-        "T068": {"source": "REACTION", "target": "REACTION"}, "T069": {"source": "REACTION", "target": "REACTION"},
-        "T070": {"source": "COMPOUND", "target": "PATH"}, "T071": {"source": "GENE", "target": "PATH"}, "T072": {"source": "REACTION", "target": "PATH"}, "T073": {"source": "GENE", "target": "PATH"}, "T074": {"source": "PATHWAY", "target": "PATH"}, "T075": {"source": "GENE", "target": "GENE"},
-        "T076": {"source": "PATHWAY", "target": "COMPOUND"} # New V17 mapping
-    }
+    # Bump when templates, routing or the schema change: cached queries keyed on
+    # an older version are never looked up again and age out of the LRU
+    QUERY_CACHE_VERSION = 2
+
+    # Per-template regex fillers, built once at class load
+    _FILLERS = _LazyClassAttr(lambda cls: {tid: _compile_template_filler(data["params"]) for tid, data in cls.CYPHER_TEMPLATES.items()})
+
+    # Router candidate group -> (template IDs, prompt listing), built once
+    _CANDIDATES = _LazyClassAttr(lambda cls: _build_candidate_groups(cls.CYPHER_TEMPLATES))
 
-    def __init__(self, llm: Optional[Any] = None, provider: str = "gemini", model_name: Optional[str] = None, api_key: Optional[str] = None, host: Optional[str] = None, temperature: float = 0.0, schema: Optional[str] = None):
+    # Router candidate group -> (single, batch) constrained-decoding schemas
+    _ROUTER_SCHEMAS = _LazyClassAttr(lambda cls: _build_router_schemas(cls._CANDIDATES))
+
+    # (source, target) -> template IDs, so path lookups don't scan the metadata
+    _PATH_INDEX = _LazyClassAttr(lambda cls: _build_path_index(cls.TEMPLATE_METADATA))
+
+    def __init__(self, llm: Optional[Any] = None, provider: str = "gemini", model_name: Optional[str] = None, api_key: Optional[str] = None, host: Optional[str] = None, temperature: float = 0.0, schema: Optional[str] = None, batch_window: float = 0.02, max_batch_size: int = 16, query_cache_size: int = 1024):
         if llm: self.llm = llm
         else: pass 
         self.schema = schema or self.DETAILED_SCHEMA
 
-    def generate_query(self, question: str, intent: Optional[Any] = None, entities: List[Dict] = []) -> Tuple[str, str]:
+        # Template-selection batching: concurrent callers arriving within
+        # `batch_window` seconds share a single router LLM call.
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self._batch_lock = threading.Lock()
+        self._batch_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Optional[asyncio.Queue] = None
+        self._inflight = set()  # dispatch tasks: the loop only holds weak references
+
+        # (question, entities) -> (cypher, source, params) LRU; repeats skip the router and fallback LLM calls
+        self.query_cache_size = query_cache_size
+        self._query_cache: "OrderedDict[tuple, Tuple[str, str, Dict[str, str]]]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+
+    def generate_query(self, question: str, intent: Optional[Any] = None, entities: List[Dict] = []) -> Tuple[str, str, Dict[str, str]]:
+        cache_key = self._query_cache_key(question, intent, entities)
+        cached = self._query_cache_get(cache_key)
+        if cached is not None: return cached
+
         # 1. Selection
         template_id = self._select_template(question)
         
@@ -171,13 +346,15 @@ class LLMCypherQueryGenerator:
         template_id = self._route_to_correct_template(template_id, question)
 
         final_cypher = ""
+        params: Dict[str, str] = {}
         gen_type = "Fallback"
 
-        if template_id and template_id in self.CYPHER_TEMPLATES:
+        template_data = self.CYPHER_TEMPLATES.get(template_id) if template_id else None
+        if template_data is not None:
             # Use Multi-ID Logic here
-            filled_cypher = self._fill_template_smart(template_id, question, entities)
-            if filled_cypher:
-                final_cypher = filled_cypher
+            filled = self._fill_template_smart(template_id, question, entities, template_data)
+            if filled:
+                final_cypher, params = filled
                 gen_type = "Template"
         
         if not final_cypher:
@@ -187,77 +364,144 @@ class LLMCypherQueryGenerator:
         # [V16 Final Safety Net] Post-process to ensure IDs have prefixes
         final_cypher = self._post_process_prefixes(final_cypher)
         
-        return final_cypher, gen_type
+        return self._query_cache_put(cache_key, (final_cypher, gen_type, params))
+
+    async def agenerate_query(self, question: str, intent: Optional[Any] = None, entities: List[Dict] = []) -> Tuple[str, str, Dict[str, str]]:
+        """Async `generate_query`: every LLM step is awaited instead of blocking the caller's loop."""
+        cache_key = self._query_cache_key(question, intent, entities)
+        cached = self._query_cache_get(cache_key)
+        if cached is not None: return cached
+
+        template_id = await self._aselect_template(question)
+        template_id = self._route_to_correct_template(template_id, question)
+
+        final_cypher = ""
+        params: Dict[str, str] = {}
+        gen_type = "Fallback"
+
+        template_data = self.CYPHER_TEMPLATES.get(template_id) if template_id else None
+        if template_data is not None:
+            filled = self._fill_template_smart(template_id, question, entities, template_data)
+            if filled:
+                final_cypher, params = filled
+                gen_type = "Template"
+
+        if not final_cypher:
+            final_cypher = await self._agenerate_raw_query(question, intent, entities)
+            gen_type = "Fallback"
+
+        final_cypher = self._post_process_prefixes(final_cypher)
+
+        return self._query_cache_put(cache_key, (final_cypher, gen_type, params))
+
+    def generate_queries_batch(self, questions: List[str], entities_list: Optional[List[List[Dict]]] = None) -> List[Tuple[str, str, Dict[str, str]]]:
+        """
+        `generate_query` for many questions at once. Their router requests land in
+        the same batching window, so they share one router prompt per candidate
+        group (up to `max_batch_size`), and the fill/fallback calls run concurrently.
+        """
+        if len(questions) == 1:
+            return [self.generate_query(questions[0], entities=(entities_list or [[]])[0])]
+        return asyncio.run(self.agenerate_queries_batch(questions, entities_list))
+
+    async def agenerate_queries_batch(self, questions: List[str], entities_list: Optional[List[List[Dict]]] = None) -> List[Tuple[str, str, Dict[str, str]]]:
+        if entities_list is None: entities_list = [[] for _ in questions]
+        return list(await asyncio.gather(*(
+            self.agenerate_query(q, entities=entities) for q, entities in zip(questions, entities_list)
+        )))
+
+    def _query_cache_key(self, question: str, intent: Optional[Any], entities: List[Dict]) -> tuple:
+        ents = tuple(sorted((str(e.get('db', '')), str(e.get('id', ''))) for e in entities))
+        # Whitespace only: case is not folded because IDs (C00162, ath:AT1G...) are case-sensitive
+        return (self.QUERY_CACHE_VERSION, " ".join(question.split()), ents, str(intent))
+
+    def _query_cache_get(self, key: tuple) -> Optional[Tuple[str, str, Dict[str, str]]]:
+        with self._query_cache_lock:
+            hit = self._query_cache.get(key)
+            if hit is None: return None
+            self._query_cache.move_to_end(key)
+        cypher, source, params = hit
+        return cypher, source, dict(params)  # callers may mutate params
+
+    def _query_cache_put(self, key: tuple, result: Tuple[str, str, Dict[str, str]]) -> Tuple[str, str, Dict[str, str]]:
+        if result[0]:  # an empty fallback is worth retrying
+            with self._query_cache_lock:
+                self._query_cache[key] = (result[0], result[1], dict(result[2]))
+                self._query_cache.move_to_end(key)
+                if len(self._query_cache) > self.query_cache_size:
+                    self._query_cache.popitem(last=False)
+        return result
 
     def _route_to_correct_template(self, template_id: Optional[str], question: str) -> Optional[str]:
         if not template_id: return template_id
         
-        q_lower = question.lower()
+        hits = _keyword_bits(question.lower())
         actual_source = self._detect_strict_id_type(question)
 
+        def has(kw: str) -> bool:
+            return bool(hits & _KW[kw])
+
         # 1. Pathfinding / Route
-        if "shortest" in q_lower or "route" in q_lower or "path from" in q_lower:
-            if "compound" in q_lower: return "T070"
-            if "gene" in q_lower and "pathway" in q_lower: return "T071"
-            if "reaction" in q_lower: return "T072"
+        if hits & _MASK_PATHFINDING:
+            if has("compound"): return "T070"
+            if has("gene") and has("pathway"): return "T071"
+            if has("reaction"): return "T072"
 
         # 2. Shared / Common
-        if "share" in q_lower or "common" in q_lower or "both" in q_lower:
-            if "pathway" in q_lower: return "T040"
-            if "gene" in q_lower and "enzyme" in q_lower: return "T075"
+        if hits & _MASK_SHARED:
+            if has("pathway"): return "T040"
+            if has("gene") and has("enzyme"): return "T075"
 
         # 3. Ortholog specific paths (Priority Fix V17)
-        if "ortholog" in q_lower:
+        if has("ortholog"):
             # If asking for PRODUCTS (compounds) via ortholog -> T057b
-            if "product" in q_lower or "compound" in q_lower: return "T057b"
+            if has("product") or has("compound"): return "T057b"
             # If asking for PATHWAYS via ortholog -> T057
-            if "pathway" in q_lower and "gene" in q_lower: return "T057"
+            if has("pathway") and has("gene"): return "T057"
         
         # 4. Deep Inference (Gene <-> Compound)
-        if "produce" in q_lower or "product" in q_lower:
-             if actual_source == "GENE" and "compound" in q_lower: return "T058"
-             if actual_source == "COMPOUND" and "gene" in q_lower: return "T059"
+        if hits & _MASK_PRODUCE:
+             if actual_source == "GENE" and has("compound"): return "T058"
+             if actual_source == "COMPOUND" and has("gene"): return "T059"
              
         # 5. Metabolite Exchange (V17)
-        if "exchange" in q_lower or "inter-pathway" in q_lower:
-            if "pathway" in q_lower: return "T076"
+        if hits & _MASK_EXCHANGE:
+            if has("pathway"): return "T076"
 
         # 6. Functional Unit Activities (V17)
-        if "functional unit" in q_lower and "enzyme" in q_lower:
+        if has("functional unit") and has("enzyme"):
             return "T035" # Ensure this maps to T035
 
         # 7. Filter / Starts with
-        if "start" in q_lower or "begin" in q_lower:
-            if "gene" in q_lower or actual_source == "GENE": return "T061"
-            if "pathway" in q_lower or actual_source == "PATHWAY": return "T062"
-            if "compound" in q_lower or actual_source == "COMPOUND": return "T063"
-            if "enzyme" in q_lower or actual_source == "EC": return "T064"
-            if "reaction" in q_lower or actual_source == "REACTION": return "T065" 
-            if "ortholog" in q_lower or actual_source == "ORTHOLOG": return "T066"
-            if "unit" in q_lower or actual_source == "FUNCTIONALUNIT": return "T067"
+        if hits & _MASK_STARTS_WITH:
+            if has("gene") or actual_source == "GENE": return "T061"
+            if has("pathway") or actual_source == "PATHWAY": return "T062"
+            if has("compound") or actual_source == "COMPOUND": return "T063"
+            if has("enzyme") or actual_source == "EC": return "T064"
+            if has("reaction") or actual_source == "REACTION": return "T065" 
+            if has("ortholog") or actual_source == "ORTHOLOG": return "T066"
+            if has("unit") or actual_source == "FUNCTIONALUNIT": return "T067"
 
         # 8. Complex Filter (> N)
-        if "more than" in q_lower:
-             if "pathway" in q_lower: return "T060"
-             if "reaction" in q_lower and "substrate" in q_lower: return "T068"
-             if "reaction" in q_lower and "product" in q_lower: return "T069"
+        if has("more than"):
+             if has("pathway"): return "T060"
+             if has("reaction") and has("substrate"): return "T068"
+             if has("reaction") and has("product"): return "T069"
             
         # 9. Count Logic Check
-        if template_id in ["T041", "T042", "T043", "T044", "T045"] and actual_source:
-            target_map = { "T041": "GENE", "T042": "PATHWAY", "T043": "COMPOUND", "T044": "EC", "T045": "REACTION" }
-            target_intent = target_map.get(template_id, "REACTION")
+        if template_id in _COUNT_TARGETS and actual_source:
+            target_intent = _COUNT_TARGETS[template_id]
             new_template = self._find_template_by_path(source=actual_source, target=target_intent, question=question)
             if new_template: return new_template
         
         # 10. List All check
-        if template_id in ["T046", "T047", "T048", "T049", "T050", "T051"] and actual_source:
-             target_map = {"T046": "GENE", "T047": "PATHWAY", "T048": "COMPOUND", "T050": "REACTION"}
-             target_intent = target_map.get(template_id, "GENE")
+        if template_id in _LIST_TARGETS and actual_source:
+             target_intent = _LIST_TARGETS[template_id]
              new_template = self._find_template_by_path(source=actual_source, target=target_intent, question=question)
              if new_template: return new_template
 
-        if template_id not in self.TEMPLATE_METADATA: return template_id
-        meta = self.TEMPLATE_METADATA[template_id]
+        meta = self.TEMPLATE_METADATA.get(template_id)
+        if meta is None: return template_id
         expected_source = meta["source"]
         target_intent = meta["target"]
 
@@ -269,11 +513,7 @@ class LLMCypherQueryGenerator:
         return template_id
 
     def _find_template_by_path(self, source: str, target: str, question: str = "") -> Optional[str]:
-        candidates = []
-        for tid, meta in self.TEMPLATE_METADATA.items():
-            if meta["source"] == source and meta["target"] == target:
-                candidates.append(tid)
-        
+        candidates = self._PATH_INDEX.get((source, target))
         if not candidates: return None
         
         q_lower = question.lower()
@@ -286,40 +526,112 @@ class LLMCypherQueryGenerator:
         return candidates[0]
 
     def _detect_strict_id_type(self, question: str) -> Optional[str]:
-        if re.search(r'\bM\d{5}\b', question): return "FUNCTIONALUNIT"
-        if re.search(r'\b[a-z]{2,4}:[A-Z0-9_]+\b', question):
+        # Priority order: M > namespaced ID > K > R > C > EC > pathway
+        letters = set(_RE_STRICT_KRCM_ID.findall(question))
+        if 'M' in letters: return "FUNCTIONALUNIT"
+        if _RE_STRICT_NS_ID.search(question):
             if "path:" in question: return "PATHWAY"
             return "GENE"
-        if re.search(r'\bK\d{5}\b', question): return "ORTHOLOG"
-        if re.search(r'\bR\d{5}\b', question): return "REACTION"
-        if re.search(r'\bC\d{5}\b', question): return "COMPOUND"
-        if re.search(r'\b(?:\d+\.){3}\d+\b', question) or "EC:" in question: return "EC"
-        if "path:" in question or re.search(r'\b[a-z]{2,3}\d{5}\b', question): return "PATHWAY"
+        if 'K' in letters: return "ORTHOLOG"
+        if 'R' in letters: return "REACTION"
+        if 'C' in letters: return "COMPOUND"
+        if "EC:" in question or _RE_STRICT_EC_ID.search(question): return "EC"
+        if "path:" in question or _RE_STRICT_PATHWAY_ID.search(question): return "PATHWAY"
         return None
 
     def _select_template(self, question: str) -> Optional[str]:
+        """Synchronous adapter: enqueue the question on the batching loop and wait."""
         if not hasattr(self, 'CYPHER_TEMPLATES'): return None
-        
+        fast = _fast_route(question)
+        if fast: return fast  # unambiguous pattern: no router LLM call
+        future = asyncio.run_coroutine_threadsafe(
+            self._select_template_async(question), self._ensure_batch_loop()
+        )
+        return future.result()
+
+    async def _aselect_template(self, question: str) -> Optional[str]:
+        """Async adapter for callers on their own event loop; still goes through the batching loop."""
+        if not hasattr(self, 'CYPHER_TEMPLATES'): return None
+        fast = _fast_route(question)
+        if fast: return fast
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+            self._select_template_async(question), self._ensure_batch_loop()
+        ))
+
+    def _ensure_batch_loop(self) -> asyncio.AbstractEventLoop:
+        with self._batch_lock:
+            if self._batch_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, daemon=True).start()
+                self._batch_loop = loop
+            return self._batch_loop
+
+    async def _select_template_async(self, question: str) -> Optional[str]:
+        # Runs on the batching loop only; queue and worker are bound to it.
+        if self._pending is None:
+            self._pending = asyncio.Queue()
+            self._batch_worker = asyncio.create_task(self._run_batch_worker())
+        fut = asyncio.get_running_loop().create_future()
+        await self._pending.put((question, fut))
+        return await fut
+
+    async def _run_batch_worker(self):
+        """Collect up to `max_batch_size` questions or `batch_window` seconds, then dispatch."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._pending.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0: break
+                try:
+                    batch.append(await asyncio.wait_for(self._pending.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.create_task(self._dispatch_batch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        # Questions only share a prompt when they share a candidate template set
+        groups: Dict[str, List[Tuple[str, asyncio.Future]]] = {}
+        for question, fut in batch:
+            groups.setdefault(self._candidate_group(question), []).append((question, fut))
+
+        async def run_group(group: str, items: List[Tuple[str, asyncio.Future]]):
+            try:
+                tids = await asyncio.to_thread(self._select_templates_batch, group, [q for q, _ in items])
+            except LLM_ERRORS:
+                tids = [None] * len(items)
+            except Exception as exc:
+                # Unexpected: surface it to every waiting caller rather than hang them
+                for _, fut in items:
+                    if not fut.done(): fut.set_exception(exc)
+                return
+            for (_, fut), tid in zip(items, tids):
+                if not fut.done(): fut.set_result(tid)
+
+        await asyncio.gather(*(run_group(g, items) for g, items in groups.items()))
+
+    def _candidate_group(self, question: str) -> str:
         q_lower = question.lower()
-        is_count_query = any(k in q_lower for k in ["count", "how many", "number of"])
-        is_negation = any(k in q_lower for k in ["no ", "not ", "without", "empty", "orphan"])
-
-        candidate_ids = []
-        if is_negation:
-             candidate_ids = ["T052", "T053", "T054", "T055"]
-        elif is_count_query:
-            candidate_ids = [k for k, v in self.CYPHER_TEMPLATES.items() if "count" in v['description'].lower()]
-        else:
-            candidate_ids = [k for k, v in self.CYPHER_TEMPLATES.items() 
-                             if "count" not in v['description'].lower() 
-                             and k not in ["T052", "T053", "T054", "T055"]]
-
-        candidate_summaries = [f"{tid}: {self.CYPHER_TEMPLATES[tid]['description']}" for tid in candidate_ids]
-        templates_str = "\n".join(candidate_summaries)
-        
-        prompt = f"""
+        if any(k in q_lower for k in ["no ", "not ", "without", "empty", "orphan"]): return "negation"
+        if any(k in q_lower for k in ["count", "how many", "number of"]): return "count"
+        return "default"
+
+    def _candidate_ids(self, group: str) -> List[str]:
+        return list(self._CANDIDATES[group][0])
+
+    def _select_templates_batch(self, group: str, questions: List[str]) -> List[Optional[str]]:
+        templates_str = self._CANDIDATES[group][1]
+        # The schemas confine the reply to this group's IDs; the parsing below
+        # still handles providers that answer in plain text
+        single_schema, batch_schema = self._ROUTER_SCHEMAS[group]
+
+        if len(questions) == 1:
+            prompt = f"""
         Act as a Smart Query Router.
-        [User Question] "{question}"
+        [User Question] "{questions[0]}"
         [Candidate Templates]
         {templates_str}
         [INSTRUCTIONS]
@@ -327,73 +639,79 @@ class LLMCypherQueryGenerator:
         2. Match with Template Description.
         3. If asking for "starting with...", pick the "starting with" template.
         4. If asking for "Shared" or "Path", pick the relevant template.
-        5. Return ONLY Template ID.
+        5. Return ONLY the Template ID, as {{"template_id": "<Template ID>"}}.
         """
-        try:
-            response = self.llm.generate(prompt).strip()
-            match = re.search(r'T\d{3}', response)
-            return match.group(0) if match else None
-        except: return None
-
-    def _fill_template_smart(self, template_id: str, question: str, entities: List[Dict]) -> Optional[str]:
-        template_data = self.CYPHER_TEMPLATES[template_id]
-        raw_cypher = template_data["cypher"]
-        
-        if "{PREFIX}" in raw_cypher:
-            prefix_match = re.search(r'(?:starting|starts) with ([A-Za-z0-9:]+)', question, re.IGNORECASE)
-            if prefix_match: return raw_cypher.replace("{PREFIX}", prefix_match.group(1))
-        
-        if "{" not in raw_cypher: return raw_cypher
-
-        regex_filled = self._fill_template_regex_multi(raw_cypher, entities, question)
-        if regex_filled and "{" not in regex_filled: return regex_filled
-
-        try:
-            prompt = f"Template: {raw_cypher}\nQuestion: {question}\nEntities: {entities}\nFill placeholders. Output ONLY the filled Cypher query. NO explanations. NO markdown."
-            response = self.llm.generate(prompt).strip()
-            return self._clean_query(response)
-        except: pass
-        return regex_filled
-
-    def _fill_template_regex_multi(self, cypher: str, entities: List[Dict], question: str) -> Optional[str]:
-        found_map = {
-            "PATHWAY": re.findall(r'(path:[a-z]+\d+|[a-z]{2,3}\d{5})', question),
-            "GENE": re.findall(r'([a-z]{2,4}:[A-Z0-9_]+)', question),
-            "COMPOUND": re.findall(r'(C\d{5})', question),
-            "REACTION": re.findall(r'(R\d{5})', question),
-            "EC": re.findall(r'(\d+\.\d+\.\d+\.\d+|EC:?[\d\.]+)', question)
-        }
-        
-        for k in found_map:
-            if k == "GENE": found_map[k] = [x for x in found_map[k] if "path:" not in x]
-            if k == "EC": found_map[k] = [x if x.startswith("EC:") else f"EC:{x}" for x in found_map[k]]
-            if k == "PATHWAY": found_map[k] = [x if x.startswith("path:") else f"path:{x}" for x in found_map[k]]
+            response = self.llm.generate(prompt, response_schema=single_schema).strip()
+            match = _RE_TEMPLATE_ID.search(response)
+            return [match.group(0) if match else None]
 
-        filled = cypher
-        
-        placeholders_numbered = re.findall(r'\{([A-Z]+)_ID_(\d+)\}', cypher)
-        for p_type, idx_str in placeholders_numbered:
-            idx = int(idx_str) - 1
-            if p_type in found_map and idx < len(found_map[p_type]):
-                filled = filled.replace(f"{{{p_type}_ID_{idx_str}}}", found_map[p_type][idx])
+        questions_str = "\n        ".join(f'{i}) "{q}"' for i, q in enumerate(questions, 1))
+        prompt = f"""
+        Act as a Smart Query Router.
+        [User Questions]
+        {questions_str}
+        [Candidate Templates]
+        {templates_str}
+        [INSTRUCTIONS]
+        1. For each question, identify the TARGET ENTITY (What user wants).
+        2. Match with Template Description.
+        3. If asking for "starting with...", pick the "starting with" template.
+        4. If asking for "Shared" or "Path", pick the relevant template.
+        5. Return ONLY one Template ID per question, in question order, as {{"template_ids": ["<Template ID>", ...]}}.
+        """
+        response = self.llm.generate(prompt, response_schema=batch_schema).strip()
 
-        placeholders_generic = re.findall(r'\{([A-Z]+)_ID\}', cypher)
-        for p_type in placeholders_generic:
-             if p_type in found_map and found_map[p_type]:
-                 filled = filled.replace(f"{{{p_type}_ID}}", found_map[p_type][0])
+        by_number = {int(n): tid for n, tid in _RE_NUMBERED_TEMPLATE_ID.findall(response)}
+        if by_number:
+            return [by_number.get(i) for i in range(1, len(questions) + 1)]
 
-        if re.search(r'\{[A-Z_0-9]+\}', filled): return None
-        return filled
+        # JSON list (or unnumbered text): only trust it if it lines up one-to-one
+        tids = _RE_TEMPLATE_ID.findall(response)
+        if len(tids) == len(questions):
+            return tids
+        return [None] * len(questions)
+
+    def _fill_template_smart(self, template_id: str, question: str, entities: List[Dict], template_data: Optional[Dict] = None) -> Optional[Tuple[str, Dict[str, str]]]:
+        """
+        Regex-only fill. Templates take their IDs as Cypher parameters, so the
+        query text is fixed per template and Neo4j reuses its cached plan.
+        Returns (cypher, params); None when a parameter can't be resolved, and
+        the caller falls back to raw query generation exactly once.
+        """
+        if template_data is None: template_data = self.CYPHER_TEMPLATES[template_id]
+        cypher = template_data["cypher"]
+        names = template_data["params"]
+        if not names: return cypher, {}
+
+        if "prefix" in names:
+            prefix_match = _RE_STARTS_WITH.search(question)
+            return (cypher, {"prefix": prefix_match.group(1)}) if prefix_match else None
+
+        fill = self._FILLERS.get(template_id) or _compile_template_filler(names)
+        params = fill(question)
+        if params is None and entities:
+            # IDs resolved by entity extraction but not written verbatim in the question
+            params = fill(question + " " + " ".join(str(e.get("id", "")) for e in entities))
+        return (cypher, params) if params is not None else None
 
     def _generate_raw_query(self, question, intent, entities) -> str:
-        corrected_entities = []
-        for e in entities:
-            e_type = e.get('type', '').upper()
-            e_id = e.get('id', '')
-            if e_type == 'EC' and not e_id.startswith('EC:'): e_id = f"EC:{e_id}"
-            elif e_type == 'PATHWAY' and not e_id.startswith('path:'): e_id = f"path:{e_id}"
-            corrected_entities.append(f"{e.get('type')}: {e_id}")
-        entities_str = ", ".join(corrected_entities)
+        generated = self.llm.generate(self._raw_query_prompt(question, intent, entities))
+        return self._clean_query(generated)
+
+    async def _agenerate_raw_query(self, question, intent, entities) -> str:
+        generated = await self.llm.agenerate(self._raw_query_prompt(question, intent, entities))
+        return self._clean_query(generated)
+
+    @staticmethod
+    def _prefixed_entity_id(e) -> str:
+        e_type = e.get('type', '').upper()
+        e_id = e.get('id', '')
+        if e_type == 'EC' and not e_id.startswith('EC:'): return f"EC:{e_id}"
+        if e_type == 'PATHWAY' and not e_id.startswith('path:'): return f"path:{e_id}"
+        return e_id
+
+    def _raw_query_prompt(self, question, intent, entities) -> str:
+        entities_str = ", ".join(f"{e.get('type')}: {self._prefixed_entity_id(e)}" for e in entities)
 
         prompt = f"""
         Act as a precise Neo4j Cypher Developer. 
@@ -414,25 +732,35 @@ class LLMCypherQueryGenerator:
         
         Output ONLY the Cypher query. NO explanations. NO markdown code blocks.
         """
-        generated = self.llm.generate(prompt)
-        return self._clean_query(generated)
+        return prompt
 
     def _clean_query(self, cypher_query: str) -> str:
         if not cypher_query: return ""
-        q = re.sub(r'```\w*\s*', '', cypher_query) 
-        q = q.replace('```', '')
-        q = re.sub(r'^(?:neo4j|cypher|sql|here is|answer:)\s+', '', q, flags=re.IGNORECASE)
-        lines = q.split('\n')
-        cleaned_lines = []
-        for line in lines:
-            if line.lower().startswith(('template:', 'question:', 'entities:', 'fill placeholders')): continue
-            cleaned_lines.append(line)
-        q = '\n'.join(cleaned_lines)
-        match = re.search(r'(MATCH|CALL|WITH|RETURN)\s+.*', q, re.IGNORECASE | re.DOTALL)
-        if match: q = match.group(0)
-        return q.strip()
+        # Fences can swallow newlines, so they go first; the rest is one pass over lines.
+        # Most replies carry no fence, and then neither fence pass can change anything
+        q = cypher_query
+        if '```' in q: q = _RE_FENCE.sub('', q).replace('```', '')
+        label = _RE_LEAD_LABEL.match(q)
+        if label: q = q[label.end():]
+        kept = []
+        start = None    # index in kept where the query begins
+        pending = None  # (index, offset) of a keyword ending the previous kept line
+        for line in q.split('\n'):
+            if line[:_SKIP_PREFIX_LEN].lower().startswith(_SKIP_PREFIXES): continue
+            if start is None:
+                if pending is not None:
+                    start = pending[0]
+                    kept[start] = kept[start][pending[1]:]
+                else:
+                    head = _RE_QUERY_START.search(line)
+                    if head:
+                        start = len(kept)
+                        line = line[head.start():]
+                    else:
+                        tail = _RE_QUERY_START_EOL.search(line)
+                        if tail: pending = (len(kept), tail.start())
+            kept.append(line)
+        return '\n'.join(kept[start or 0:]).strip()
 
     def _post_process_prefixes(self, query: str) -> str:
-        query = re.sub(r"id:\s*['\"](?<!EC:)(\d+\.\d+\.\d+\.\d+)['\"]", r"id: 'EC:\1'", query)
-        query = re.sub(r"id:\s*['\"](?<!path:)([a-z]{2,3}\d{5})['\"]", r"id: 'path:\1'", query)
-        return query
+        return _RE_BARE_ID.sub(_prefix_bare_id, query)
@@ -0,0 +1,136 @@
+"""
+Template tables for LLMCypherQueryGenerator.
+
+Kept in their own module so the generator can import them on first use;
+the Docker image byte-compiles this file, so loading it is a marshal read
+of pre-built constants rather than a parse of the dict literals.
+
+Templates anchored on an ID carry a `USING INDEX <var>:<Label>(id)` hint.
+Neo4j rejects a hint for a missing index, so these need the :<Label>(id)
+indexes that Neo4jClient.ensure_indexes() creates at startup. The
+shortestPath templates (T070-T074) are left unhinted.
+"""
+
+CYPHER_TEMPLATES = {
+    # --- [T001-T010] Direct Entity Lookup ---
+    "T001": { "description": "Find gene node", "cypher": "MATCH (n:Gene {id: $gene_id}) USING INDEX n:Gene(id) RETURN n LIMIT 1", "params": ["gene_id"] },
+    "T002": { "description": "Find pathway node", "cypher": "MATCH (n:Pathway {id: $pathway_id}) USING INDEX n:Pathway(id) RETURN n LIMIT 1", "params": ["pathway_id"] },
+    "T003": { "description": "Find compound node", "cypher": "MATCH (n:Compound {id: $compound_id}) USING INDEX n:Compound(id) RETURN n LIMIT 1", "params": ["compound_id"] },
+    "T004": { "description": "Find enzyme node", "cypher": "MATCH (n:EC {id: $ec_id}) USING INDEX n:EC(id) RETURN n LIMIT 1", "params": ["ec_id"] },
+    "T005": { "description": "Find reaction node", "cypher": "MATCH (n:Reaction {id: $reaction_id}) USING INDEX n:Reaction(id) RETURN n LIMIT 1", "params": ["reaction_id"] },
+    "T006": { "description": "Get gene properties (id, name, species)", "cypher": "MATCH (n:Gene {id: $gene_id}) USING INDEX n:Gene(id) RETURN n {.id, .name, .species} AS n LIMIT 1", "params": ["gene_id"] },
+    "T007": { "description": "Get pathway properties (id, title, species)", "cypher": "MATCH (n:Pathway {id: $pathway_id}) USING INDEX n:Pathway(id) RETURN n {.id, .title, .species} AS n LIMIT 1", "params": ["pathway_id"] },
+    "T008": { "description": "Get compound properties (id, name, names, formula)", "cypher": "MATCH (n:Compound {id: $compound_id}) USING INDEX n:Compound(id) RETURN n {.id, .name, .names, .formula} AS n LIMIT 1", "params": ["compound_id"] },
+    "T009": { "description": "Get enzyme properties (id, name, sysname)", "cypher": "MATCH (n:EC {id: $ec_id}) USING INDEX n:EC(id) RETURN n {.id, .name, .sysname} AS n LIMIT 1", "params": ["ec_id"] },
+    "T010": { "description": "Get reaction properties (id, name, definition, equation)", "cypher": "MATCH (n:Reaction {id: $reaction_id}) USING INDEX n:Reaction(id) RETURN n {.id, .name, .definition, .equation} AS n LIMIT 1", "params": ["reaction_id"] },
+
+    # --- [T011-T025] 1-Hop Relationships ---
+    "T011": { "description": "Find enzymes by Gene", "cypher": "MATCH (g:Gene {id: $gene_id})-[:ENCODES]-(e:EC) USING INDEX g:Gene(id) RETURN e", "params": ["gene_id"] },
+    "T012": { "description": "Find Ortholog by Gene", "cypher": "MATCH (g:Gene {id: $gene_id})-[:BELONGS_TO]-(o:Ortholog) USING INDEX g:Gene(id) RETURN o", "params": ["gene_id"] },
+    "T013": { "description": "Find Functional Units by Gene", "cypher": "MATCH (g:Gene {id: $gene_id})-[:MEMBER_OF]-(f:FunctionalUnit) USING INDEX g:Gene(id) RETURN f", "params": ["gene_id"] },
+    "T014": { "description": "Reactions using Compound", "cypher": "MATCH (c:Compound {id: $compound_id})-[:SUBSTRATE_OF]-(r:Reaction) USING INDEX c:Compound(id) RETURN r", "params": ["compound_id"] },
+    "T015": { "description": "Reactions producing Compound", "cypher": "MATCH (r:Reaction)-[:PRODUCES]-(c:Compound {id: $compound_id}) USING INDEX c:Compound(id) RETURN r", "params": ["compound_id"] },
+    "T016": { "description": "Reactions by Enzyme", "cypher": "MATCH (e:EC {id: $ec_id})-[:CATALYZES]-(r:Reaction) USING INDEX e:EC(id) RETURN r", "params": ["ec_id"] },
+    "T017": { "description": "Reactions by Ortholog", "cypher": "MATCH (o:Ortholog {id: $ortholog_id})-[:CATALYZES]-(r:Reaction) USING INDEX o:Ortholog(id) RETURN r", "params": ["ortholog_id"] },
+    "T018": { "description": "Enzymes of Ortholog", "cypher": "MATCH (o:Ortholog {id: $ortholog_id})-[:HAS_ENZYME_FUNCTION]-(e:EC) USING INDEX o:Ortholog(id) RETURN e", "params": ["ortholog_id"] },
+    "T019": { "description": "Genes encoding Enzyme", "cypher": "MATCH (g:Gene)-[:ENCODES]-(e:EC {id: $ec_id}) USING INDEX e:EC(id) RETURN g", "params": ["ec_id"] },
+    "T020": { "description": "Genes of Ortholog", "cypher": "MATCH (g:Gene)-[:BELONGS_TO]-(o:Ortholog {id: $ortholog_id}) USING INDEX o:Ortholog(id) RETURN g", "params": ["ortholog_id"] },
+    "T021": { "description": "Substrates of Reaction", "cypher": "MATCH (c:Compound)-[:SUBSTRATE_OF]-(r:Reaction {id: $reaction_id}) USING INDEX r:Reaction(id) RETURN c", "params": ["reaction_id"] },
+    "T022": { "description": "Products of Reaction", "cypher": "MATCH (r:Reaction {id: $reaction_id})-[:PRODUCES]-(c:Compound) USING INDEX r:Reaction(id) RETURN c", "params": ["reaction_id"] },
+    "T023": { "description": "Enzymes of Reaction", "cypher": "MATCH (e:EC)-[:CATALYZES]-(r:Reaction {id: $reaction_id}) USING INDEX r:Reaction(id) RETURN e", "params": ["reaction_id"] },
+    "T024": { "description": "Reactions in Pathway", "cypher": "MATCH (p:Pathway {id: $pathway_id})-[:CONTAINS]-(r:Reaction) USING INDEX p:Pathway(id) RETURN r", "params": ["pathway_id"] },
+    "T025": { "description": "Functional Units in Pathway", "cypher": "MATCH (p:Pathway {id: $pathway_id})-[:CONTAINS]-(f:FunctionalUnit) USING INDEX p:Pathway(id) RETURN f", "params": ["pathway_id"] },
+
+    # --- [T026-T035] Multi-Hop Relationships ---
+    "T026": { "description": "Pathways containing Reaction", "cypher": "MATCH (p:Pathway)-[:CONTAINS]-(r:Reaction {id: $reaction_id}) USING INDEX r:Reaction(id) RETURN p", "params": ["reaction_id"] },
+    "T027": { "description": "Reactions via Ortholog", "cypher": "MATCH (g:Gene {id: $gene_id})-[:BELONGS_TO]-(o:Ortholog)-[:CATALYZES]-(r:Reaction) USING INDEX g:Gene(id) RETURN r", "params": ["gene_id"] },
+    "T028": { "description": "Reactions via Enzyme", "cypher": "MATCH (g:Gene {id: $gene_id})-[:ENCODES]-(e:EC)-[:CATALYZES]-(r:Reaction) USING INDEX g:Gene(id) RETURN r", "params": ["gene_id"] },
+    "T029": { "description": "Compounds via Enzyme", "cypher": "MATCH (g:Gene {id: $gene_id})-[:ENCODES]-(e:EC)-[:CATALYZES]-(r:Reaction)-[:PRODUCES]-(c:Compound) USING INDEX g:Gene(id) RETURN c", "params": ["gene_id"] },
+    "T030": { "description": "Next Step Compounds", "cypher": "MATCH (c1:Compound {id: $compound_id})-[:SUBSTRATE_OF]-(r:Reaction)-[:PRODUCES]-(c2:Compound) USING INDEX c1:Compound(id) RETURN c2", "params": ["compound_id"] },
+    "T031": { "description": "Previous Step Compounds", "cypher": "MATCH (c1:Compound)-[:SUBSTRATE_OF]-(r:Reaction)-[:PRODUCES]-(c2:Compound {id: $compound_id}) USING INDEX c2:Compound(id) RETURN c1", "params": ["compound_id"] },
+    "T032": { "description": "Downstream Reactions", "cypher": "MATCH (r1:Reaction {id: $reaction_id})-[:PRODUCES]-(c:Compound)-[:SUBSTRATE_OF]-(r2:Reaction) USING INDEX r1:Reaction(id) RETURN r2", "params": ["reaction_id"] },
+    "T033": { "description": "Compounds produced in Pathway", "cypher": "MATCH (p:Pathway {id: $pathway_id})-[:CONTAINS]-(r:Reaction)-[:PRODUCES]-(c:Compound) USING INDEX p:Pathway(id) RETURN DISTINCT c", "params": ["pathway_id"] },
+    "T034": { "description": "Compounds consumed in Pathway", "cypher": "MATCH (p:Pathway {id: $pathway_id})-[:CONTAINS]-(r:Reaction)-[:SUBSTRATE_OF]-(c:Compound) USING INDEX p:Pathway(id) RETURN DISTINCT c", "params": ["pathway_id"] },
+    "T035": { "description": "Enzymes in Functional Unit", "cypher": "MATCH (f:FunctionalUnit {id: $functionalunit_id})-[:MEMBER_OF]-(n)-[:ENCODES|HAS_ENZYME_FUNCTION]-(e:EC) USING INDEX f:FunctionalUnit(id) RETURN DISTINCT e", "params": ["functionalunit_id"] },
+    
+    # --- [T036-T045] Stats & Counts ---
+    "T036": { "description": "Count enzymes of Gene", "cypher": "MATCH (g:Gene {id: $gene_id})-[r:ENCODES]-(e:EC) USING INDEX g:Gene(id) RETURN count(r) LIMIT 1", "params": ["gene_id"] },
+    "T037": { "description": "Count reactions in Pathway", "cypher": "MATCH (p:Pathway {id: $pathway_id})-[r:CONTAINS]-(rxn:Reaction) USING INDEX p:Pathway(id) RETURN count(r) LIMIT 1", "params": ["pathway_id"] },
+    "T038": { "description": "Count genes of Ortholog", "cypher": "MATCH (o:Ortholog {id: $ortholog_id})-[r:BELONGS_TO]-(g:Gene) USING INDEX o:Ortholog(id) RETURN count(r) LIMIT 1", "params": ["ortholog_id"] },
+    "T039": { "description": "Top Pathways by size", "cypher": "MATCH (p:Pathway)-[r:CONTAINS]-(rxn:Reaction) RETURN p.id, count(r) AS cnt ORDER BY cnt DESC LIMIT 10", "params": [] }, 
+    "T040": { "description": "Shared Reactions", "cypher": "MATCH (p1:Pathway {id: $pathway_id_1})-[:CONTAINS]-(r:Reaction)-[:CONTAINS]-(p2:Pathway {id: $pathway_id_2}) USING INDEX p1:Pathway(id) RETURN r", "params": ["pathway_id_1", "pathway_id_2"] },
+    "T041": { "description": "Count all genes", "cypher": "MATCH (n:Gene) RETURN count(n)", "params": [] },
+    "T042": { "description": "Count all pathways", "cypher": "MATCH (n:Pathway) RETURN count(n)", "params": [] },
+    "T043": { "description": "Count all compounds", "cypher": "MATCH (n:Compound) RETURN count(n)", "params": [] },
+    "T044": { "description": "Count all enzymes", "cypher": "MATCH (n:EC) RETURN count(n)", "params": [] },
+    "T045": { "description": "Count all reactions", "cypher": "MATCH (n:Reaction) RETURN count(n)", "params": [] },
+
+    # --- [T046-T051] Global Lists ---
+    "T046": { "description": "List all genes", "cypher": "MATCH (n:Gene) RETURN n LIMIT 50", "params": [] },
+    "T047": { "description": "List all pathways", "cypher": "MATCH (n:Pathway) RETURN n LIMIT 50", "params": [] },
+    "T048": { "description": "List all compounds", "cypher": "MATCH (n:Compound) RETURN n LIMIT 50", "params": [] },
+    "T049": { "description": "List all enzymes", "cypher": "MATCH (n:EC) RETURN n LIMIT 50", "params": [] },
+    "T050": { "description": "List all reactions", "cypher": "MATCH (n:Reaction) RETURN n LIMIT 50", "params": [] },
+    "T051": { "description": "List all orthologs", "cypher": "MATCH (n:Ortholog) RETURN n LIMIT 50", "params": [] },
+
+    # --- [T052-T055] Edge Cases ---
+    "T052": { "description": "Find reactions with NO products", "cypher": "MATCH (r:Reaction) WHERE NOT (r)-[:PRODUCES]-() RETURN r", "params": [] },
+    "T053": { "description": "Find reactions with NO substrates", "cypher": "MATCH (r:Reaction) WHERE NOT (r)-[:SUBSTRATE_OF]-() RETURN r", "params": [] },
+    "T054": { "description": "Find orphan pathways (empty)", "cypher": "MATCH (p:Pathway) WHERE NOT (p)-[:CONTAINS]-() RETURN p", "params": [] },
+    "T055": { "description": "Find enzymes not catalyzing any reaction", "cypher": "MATCH (e:EC) WHERE NOT (e)-[:CATALYZES]-() RETURN e", "params": [] },
+
+    # --- [T056-T059] Gap Fillers (Deep Inference) ---
+    "T056": { "description": "Pathways involving Gene (via Enzyme)", "cypher": "MATCH (p:Pathway)-[:CONTAINS]-(r:Reaction)-[:CATALYZES]-(e:EC)-[:ENCODES]-(g:Gene {id: $gene_id}) USING INDEX g:Gene(id) RETURN DISTINCT p", "params": ["gene_id"] },
+    "T057": { "description": "Pathways involving Gene (via Ortholog)", "cypher": "MATCH (p:Pathway)-[:CONTAINS]-(r:Reaction)-[:CATALYZES]-(o:Ortholog)-[:BELONGS_TO]-(g:Gene {id: $gene_id}) USING INDEX g:Gene(id) RETURN DISTINCT p", "params": ["gene_id"] },
+    "T058": { "description": "Compounds produced by Gene (via Enzyme)", "cypher": "MATCH (g:Gene {id: $gene_id})-[:ENCODES]-(e:EC)-[:CATALYZES]-(r:Reaction)-[:PRODUCES]-(c:Compound) USING INDEX g:Gene(id) RETURN DISTINCT c", "params": ["gene_id"] },
+    "T059": { "description": "Genes producing Compound", "cypher": "MATCH (c:Compound {id: $compound_id})<-[:PRODUCES]-(r:Reaction)<-[:CATALYZES]-(e:EC)<-[:ENCODES]-(g:Gene) USING INDEX c:Compound(id) RETURN DISTINCT g", "params": ["compound_id"] },
+    
+    # [V17 NEW] Compounds via Ortholog (Targeting the specific failure)
+    "T057b": { "description": "Compounds produced by Gene (via Ortholog)", "cypher": "MATCH (g:Gene {id: $gene_id})-[:BELONGS_TO]-(o:Ortholog)-[:CATALYZES]-(r:Reaction)-[:PRODUCES]-(c:Compound) USING INDEX g:Gene(id) RETURN DISTINCT c", "params": ["gene_id"] },
+
+    # --- [T060-T069] Advanced Filters ---
+    "T060": { "description": "Pathways with > N reactions", "cypher": "MATCH (p:Pathway)-[r:CONTAINS]-(rxn:Reaction) WITH p, count(r) as cnt WHERE cnt > 10 RETURN p", "params": [] },
+    "T061": { "description": "Genes starting with prefix", "cypher": "MATCH (n:Gene) WHERE n.id STARTS WITH $prefix RETURN n LIMIT 20", "params": ["prefix"] },
+    "T062": { "description": "Pathways starting with prefix", "cypher": "MATCH (n:Pathway) WHERE n.id STARTS WITH $prefix RETURN n LIMIT 20", "params": ["prefix"] },
+    "T063": { "description": "Compounds starting with prefix", "cypher": "MATCH (n:Compound) WHERE n.id STARTS WITH $prefix RETURN n LIMIT 20", "params": ["prefix"] },
+    "T064": { "description": "Enzymes starting with prefix", "cypher": "MATCH (n:EC) WHERE n.id STARTS WITH $prefix RETURN n LIMIT 20", "params": ["prefix"] },
+    "T065": { "description": "Reactions starting with prefix", "cypher": "MATCH (n:Reaction) WHERE n.id STARTS WITH $prefix RETURN n LIMIT 20", "params": ["prefix"] },
+    "T066": { "description": "Orthologs starting with prefix", "cypher": "MATCH (n:Ortholog) WHERE n.id STARTS WITH $prefix RETURN n LIMIT 20", "params": ["prefix"] },
+    "T067": { "description": "Functional Units starting with prefix", "cypher": "MATCH (n:FunctionalUnit) WHERE n.id STARTS WITH $prefix RETURN n LIMIT 20", "params": ["prefix"] },
+    "T068": { "description": "Reactions with > 2 Substrates", "cypher": "MATCH (r:Reaction)-[rel:SUBSTRATE_OF]->(c:Compound) WITH r, count(rel) as input_cnt WHERE input_cnt > 2 RETURN r", "params": [] },
+    "T069": { "description": "Reactions with > 2 Products", "cypher": "MATCH (r:Reaction)-[rel:PRODUCES]->(c:Compound) WITH r, count(rel) as output_cnt WHERE output_cnt > 2 RETURN r", "params": [] },
+
+    # --- [T070-T076] Pathfinding & Complex (V17 Updated) ---
+    "T070": { "description": "Shortest path Compound to Compound", "cypher": "MATCH p=shortestPath((c1:Compound {id: $compound_id_1})-[*]-(c2:Compound {id: $compound_id_2})) RETURN p", "params": ["compound_id_1", "compound_id_2"] },
+    "T071": { "description": "Shortest path Gene to Pathway", "cypher": "MATCH p=shortestPath((g:Gene {id: $gene_id})-[*]-(path:Pathway {id: $pathway_id})) RETURN p", "params": ["gene_id", "pathway_id"] },
+    "T072": { "description": "Shortest path Reaction to Reaction", "cypher": "MATCH p=shortestPath((r1:Reaction {id: $reaction_id_1})-[*]-(r2:Reaction {id: $reaction_id_2})) RETURN p", "params": ["reaction_id_1", "reaction_id_2"] },
+    "T073": { "description": "Shortest path Gene to Gene", "cypher": "MATCH p=shortestPath((g1:Gene {id: $gene_id_1})-[*]-(g2:Gene {id: $gene_id_2})) RETURN p", "params": ["gene_id_1", "gene_id_2"] },
+    "T074": { "description": "Shortest path Pathway to Pathway", "cypher": "MATCH p=shortestPath((p1:Pathway {id: $pathway_id_1})-[*]-(p2:Pathway {id: $pathway_id_2})) RETURN p", "params": ["pathway_id_1", "pathway_id_2"] },
+    "T075": { "description": "Other genes encoding same enzyme (Siblings)", "cypher": "MATCH (g1:Gene {id: $gene_id})-[:ENCODES]->(e:EC)<-[:ENCODES]-(g2:Gene) USING INDEX g1:Gene(id) RETURN g2", "params": ["gene_id"] },
+    # [V17 NEW] Metabolite Exchange
+    "T076": { "description": "Inter-pathway Metabolite Exchange", "cypher": "MATCH (p1:Pathway {id: $pathway_id})-[:CONTAINS]->(:Reaction)-[:PRODUCES]->(c:Compound)<-[:SUBSTRATE_OF]-(:Reaction)<-[:CONTAINS]-(p2:Pathway) USING INDEX p1:Pathway(id) WHERE p1 <> p2 RETURN DISTINCT c", "params": ["pathway_id"] }
+}
+
+TEMPLATE_METADATA = {
+    "T001": {"source": "GENE", "target": "GENE"}, "T002": {"source": "PATHWAY", "target": "PATHWAY"}, "T003": {"source": "COMPOUND", "target": "COMPOUND"}, "T004": {"source": "EC", "target": "EC"}, "T005": {"source": "REACTION", "target": "REACTION"},
+    "T006": {"source": "GENE", "target": "GENE"}, "T007": {"source": "PATHWAY", "target": "PATHWAY"}, "T008": {"source": "COMPOUND", "target": "COMPOUND"}, "T009": {"source": "EC", "target": "EC"}, "T010": {"source": "REACTION", "target": "REACTION"},
+    "T011": {"source": "GENE", "target": "EC"}, "T012": {"source": "GENE", "target": "ORTHOLOG"}, "T013": {"source": "GENE", "target": "FUNCTIONALUNIT"},
+    "T014": {"source": "COMPOUND", "target": "REACTION"}, "T015": {"source": "COMPOUND", "target": "REACTION"},
+    "T016": {"source": "EC", "target": "REACTION"}, "T017": {"source": "ORTHOLOG", "target": "REACTION"}, "T018": {"source": "ORTHOLOG", "target": "EC"},
+    "T019": {"source": "EC", "target": "GENE"}, "T020": {"source": "ORTHOLOG", "target": "GENE"},
+    "T021": {"source": "REACTION", "target": "COMPOUND"}, "T022": {"source": "REACTION", "target": "COMPOUND"}, "T023": {"source": "REACTION", "target": "EC"},
+    "T024": {"source": "PATHWAY", "target": "REACTION"}, "T025": {"source": "PATHWAY", "target": "FUNCTIONALUNIT"},
+    "T026": {"source": "REACTION", "target": "PATHWAY"}, "T027": {"source": "GENE", "target": "REACTION"}, "T028": {"source": "GENE", "target": "REACTION"}, "T029": {"source": "GENE", "target": "COMPOUND"},
+    "T030": {"source": "COMPOUND", "target": "COMPOUND"}, "T031": {"source": "COMPOUND", "target": "COMPOUND"},
+    "T032": {"source": "REACTION", "target": "REACTION"}, "T033": {"source": "PATHWAY", "target": "COMPOUND"}, "T034": {"source": "PATHWAY", "target": "COMPOUND"}, "T035": {"source": "FUNCTIONALUNIT", "target": "EC"},
+    "T036": {"source": "GENE", "target": "EC"}, "T037": {"source": "PATHWAY", "target": "REACTION"}, "T038": {"source": "ORTHOLOG", "target": "GENE"}, "T040": {"source": "PATHWAY", "target": "REACTION"},
+    "T046": {"source": "GENE", "target": "GENE"}, "T047": {"source": "PATHWAY", "target": "PATHWAY"}, "T048": {"source": "COMPOUND", "target": "COMPOUND"}, "T049": {"source": "EC", "target": "EC"}, "T050": {"source": "REACTION", "target": "REACTION"},
+    "T056": {"source": "GENE", "target": "PATHWAY"}, "T057": {"source": "GENE", "target": "PATHWAY"}, 
+    "T058": {"source": "GENE", "target": "COMPOUND"}, "T059": {"source": "COMPOUND", "target": "GENE"},
+    "T057b": {"source": "GENE", "target": "COMPOUND"}, # New V17 mapping
+    "T060": {"source": "PATHWAY", "target": "PATHWAY"}, "T061": {"source": "GENE", "target": "GENE"}, "T062": {"source": "PATHWAY", "target": "PATHWAY"}, "T063": {"source": "COMPOUND", "target": "COMPOUND"}, "T064": {"source": "EC", "target": "EC"},
+    "T065": {"source": "REACTION", "target": "REACTION"}, "T066": {"source": "ORTHOLOG", "target": "ORTHOLOG"}, "T067": {"source": "FUNCTIONALUNIT", "target": "FUNCTIONALUNIT"},
+    "T068": {"source": "REACTION", "target": "REACTION"}, "T069": {"source": "REACTION", "target": "REACTION"},
+    "T070": {"source": "COMPOUND", "target": "PATH"}, "T071": {"source": "GENE", "target": "PATH"}, "T072": {"source": "REACTION", "target": "PATH"}, "T073": {"source": "GENE", "target": "PATH"}, "T074": {"source": "PATHWAY", "target": "PATH"}, "T075": {"source": "GENE", "target": "GENE"},
+    "T076": {"source": "PATHWAY", "target": "COMPOUND"} # New V17 mapping
+}
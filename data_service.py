@@ -4,13 +4,14 @@ import re
 from typing import Any, List, Tuple
 from typing import List, Literal, Optional
 from pydantic import BaseModel
+import numpy as np
 
 class LLMProvider(Enum):
     GEMINI = "gemini"
     OLLAMA = "ollama"
     OPENROUTER = "openrouter"
 
-@dataclass
+@dataclass(slots=True)
 class EntityMention:
     text: str
     start: int
@@ -40,6 +41,22 @@ class Hit:
     text: str
     title: str
 
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first; ties keep index order (same as a stable sort)."""
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        kth = np.partition(scores, n - k)[n - k]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[: k - len(above)]
+        idx = np.concatenate([above, ties])
+    else:
+        idx = np.arange(n)
+    return idx[np.lexsort((idx, -scores[idx]))]
+
+
 class SearchRequest(BaseModel):
     query: str
     top_k: int = 5
@@ -60,3 +77,4 @@ class LipidBotRequest(BaseModel):
     per: Literal["chunk"] = "chunk"
     rrf_k: int = 60
     model_names: Optional[List[str]] = None
+    citations: Optional[bool] = None  # force citation search on/off; None lets the classifier decide
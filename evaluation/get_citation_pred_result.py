@@ -3,13 +3,16 @@ import pandas as pd
 import numpy as np
 import pickle
 import gc
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 from rank_bm25 import BM25Okapi
 from sklearn.metrics import ndcg_score
 import torch
 from citation.bm25_cache import BM25Cache
 from config import bm25_cache_file, default_model_name
-from citation.search import search
+from citation.search import search, search_batch
 
 # =========================================================
 # ⚙️ 1. Settings and Paths
@@ -17,6 +20,7 @@ from citation.search import search
 QUESTION_FILE = "../file/generated_questions_semantic_full.csv"
 K = 10
 SAVE_INTERVAL = 50  
+BATCH_SIZE = 32  # questions per encoder forward pass
 
 # [GPU]
 device = "cuda" if torch.cuda.is_available() else "cpu"
@@ -26,64 +30,145 @@ if device == 'cuda':
 
 CACHE_DIR = "citation/results_cache"
 os.makedirs(CACHE_DIR, exist_ok=True)
-CACHE_BM25 = os.path.join(CACHE_DIR, "preds_bm25.pkl")
-CACHE_BASE = os.path.join(CACHE_DIR, "preds_base.pkl")
-CACHE_LIPIDBOT = os.path.join(CACHE_DIR, "preds_lipidbot.pkl")
+# Caches hold one entry per *unique* question (see below), hence the _uniq names
+CACHE_BM25 = os.path.join(CACHE_DIR, "preds_bm25_uniq.pkl")
+CACHE_BASE = os.path.join(CACHE_DIR, "preds_base_uniq.pkl")
+CACHE_LIPIDBOT = os.path.join(CACHE_DIR, "preds_lipidbot_uniq.pkl")
 
 # Load questions and ground truth PMIDs
 df_questions = pd.read_csv(QUESTION_FILE)
 ground_truth_citation_id = df_questions['pmid'].astype(str).tolist()
 questions = df_questions['question'].tolist()
 
+# Retrieval runs once per distinct question; results are scattered back by position
+unique_questions = list(dict.fromkeys(questions))
+_unique_pos = {q: i for i, q in enumerate(unique_questions)}
+question_to_unique = [_unique_pos[q] for q in questions]
+print(f"Questions: {len(questions)} ({len(unique_questions)} unique)")
+
+def scatter(unique_results):
+    return [unique_results[j] for j in question_to_unique]
+
+def load_records(part_path):
+    """Read appended pickle records; truncate a torn tail left by an interrupted run."""
+    records = []
+    if not os.path.exists(part_path):
+        return records
+    with open(part_path, 'r+b') as f:
+        good = 0
+        while True:
+            try:
+                records.append(pickle.load(f))
+                good = f.tell()
+            except EOFError:
+                break
+            except Exception:
+                print(f"   ⚠️ Torn record in {part_path}, truncating at byte {good}")
+                break
+        f.truncate(good)
+    return records
+
+
+class CheckpointWriter:
+    """Append each result to `<cache>.part` from a daemon thread so saves never stall the GPU loop."""
+
+    def __init__(self, part_path):
+        self._q = queue.Queue()
+        self._f = open(part_path, 'ab')
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def put(self, record):
+        self._q.put(record)
+
+    def _run(self):
+        while True:
+            item = self._q.get()
+            # drain whatever is queued, then flush once
+            batch = [item]
+            while True:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            for rec in batch:
+                if rec is None:
+                    self._f.flush()
+                    return
+                pickle.dump(rec, self._f)
+            self._f.flush()
+
+    def close(self):
+        self._q.put(None)
+        self._thread.join()
+        self._f.close()
+
+
 def run_gpu_optimized(model_name, cache_path, is_hybrid):
     """GPU 최적화 + 이어하기 기능 실행 함수"""
     results = []
+    part_path = cache_path + ".part"
     
-    # 1. 기존 캐시가 있으면 로딩 (이어하기)
+    # 1. 기존 캐시가 있으면 로딩 (이어하기): 완료/이전 형식 리스트 + 추가 레코드
     if os.path.exists(cache_path):
         try:
             with open(cache_path, 'rb') as f:
                 results = pickle.load(f)
-            print(f"   ⏩ Resuming {model_name} from index {len(results)}...")
         except:
             print(f"   ⚠️ Cache broken, restarting {model_name}...")
             results = []
+            if os.path.exists(part_path):
+                os.remove(part_path)
+    results.extend(load_records(part_path))
+    if results:
+        print(f"   ⏩ Resuming {model_name} from index {len(results)}...")
 
     # 2. 이미 다 했으면 패스
     start_idx = len(results)
-    if start_idx >= len(questions):
+    if start_idx >= len(unique_questions):
         print(f"   ✅ {model_name} already completed!")
         return results
 
-    print(f"   ⚡ Processing {model_name} on GPU (Auto-saving every {SAVE_INTERVAL})...")
+    print(f"   ⚡ Processing {model_name} on GPU (checkpointing to {os.path.basename(part_path)})...")
     
-    # 3. 남은 부분 계산
-    for i in tqdm(range(start_idx, len(questions)), desc=model_name):
-        q = questions[i]
+    model_names = default_model_name if is_hybrid else [default_model_name[0]]
+    writer = CheckpointWriter(part_path)
+
+    # 3. 남은 부분 계산 (BATCH_SIZE 단위로 배치 인코딩)
+    for start in tqdm(range(start_idx, len(unique_questions), BATCH_SIZE), desc=model_name):
+        batch = unique_questions[start:start + BATCH_SIZE]
         try:
-            # search 함수 호출 (모델 캐싱됨)
-            if is_hybrid:
-                res = search(q, default_model_name, 10, "rrf", "chunk", 60, True)
-            else:
-                res = search(q, [default_model_name[0]], 10, "rrf", "chunk", 60, False)
-            results.append(res)
+            # search_batch 호출 (모델 캐싱됨)
+            res_batch = search_batch(batch, model_names, 10, "rrf", "chunk", 60, is_hybrid)
         except Exception as e:
-            print(f"Error on question {i}: {e}")
-            results.append([]) 
-
-        # 4. 중간 저장 및 메모리 청소
-        if len(results) % SAVE_INTERVAL == 0:
-            with open(cache_path, 'wb') as f:
-                pickle.dump(results, f)
-            
+            # 배치 실패 시 질문별로 재시도하여 실패 질문만 비워둠
+            print(f"Error on batch starting at {start}: {e}")
+            res_batch = []
+            for i, q in enumerate(batch, start=start):
+                try:
+                    res_batch.append(search(q, model_names, 10, "rrf", "chunk", 60, is_hybrid))
+                except Exception as e:
+                    print(f"Error on question {i}: {e}")
+                    res_batch.append([])
+
+        prev_len = len(results)
+        results.extend(res_batch)
+        for res in res_batch:
+            writer.put(res)
+
+        # 4. 메모리 청소 (저장은 백그라운드 스레드가 레코드 단위로 처리)
+        if len(results) // SAVE_INTERVAL > prev_len // SAVE_INTERVAL:
             # GPU 메모리 정리
             if torch.cuda.is_available():
                 torch.cuda.empty_cache()
             gc.collect()
 
-    # 5. 최종 저장
+    writer.close()
+
+    # 5. 최종 저장 (통합 리스트 한 번만 기록 후 레코드 파일 삭제)
     with open(cache_path, 'wb') as f:
         pickle.dump(results, f)
+    os.remove(part_path)
     
     return results
 
@@ -98,20 +183,24 @@ if os.path.exists(CACHE_BM25):
 else:
     cache = BM25Cache()
     cache.load(bm25_cache_file)
-    bm25_preds_k = [cache.search(q, top_k=10) for q in questions]
+    # BM25 scoring is numpy-bound and releases the GIL; ex.map keeps question order
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as ex:
+        bm25_preds_k = list(tqdm(ex.map(lambda q: cache.search(q, top_k=K), unique_questions),
+                                 total=len(unique_questions), desc="BM25"))
     with open(CACHE_BM25, 'wb') as f: pickle.dump(bm25_preds_k, f)
+bm25_preds_k = scatter(bm25_preds_k)
 
 # =========================================================
 # [B] PubmedBERT Base (GPU)
 # =========================================================
 print("\n[Model 2] pubmedbert base")
-base = run_gpu_optimized("pubmedbert_base", CACHE_BASE, is_hybrid=False)
+base = scatter(run_gpu_optimized("pubmedbert_base", CACHE_BASE, is_hybrid=False))
 
 # =========================================================
 # [C] LipidBot Hybrid (GPU)
 # =========================================================
 print("\n[Model 3] Running LipidBot")
-lipidbot = run_gpu_optimized("LipidBot", CACHE_LIPIDBOT, is_hybrid=True)
+lipidbot = scatter(run_gpu_optimized("LipidBot", CACHE_LIPIDBOT, is_hybrid=True))
 
 
 try:
@@ -1,3 +1,4 @@
+import csv
 import os
 from pathlib import Path
 import pandas as pd
@@ -23,6 +24,36 @@ from langchain_ollama import ChatOllama
 from langchain_neo4j import Neo4jGraph
 
 
+OUTPUT_FIELDS = ["phase", "category", "question", "cypher_executable", "generated_cypher", "answer"]
+
+
+def run_chain(chain, question):
+    try:
+        response = chain.invoke({"query": question})
+
+        generated_cypher = response["intermediate_steps"][0]["query"]
+        db_context = response["intermediate_steps"][1].get("context", [])
+
+        entity_ids = []
+        if isinstance(db_context, list):
+                for item in db_context:
+                    if isinstance(item, dict):
+                        node_values = list(item.values())[0]
+                        if isinstance(node_values, dict):
+                            eid = node_values.get("id")
+                            if eid:
+                                entity_ids.append(eid)
+
+        
+        final_answer = entity_ids if entity_ids else response["result"]
+
+    except Exception as e:
+        final_answer = f"Exception: {type(e).__name__}"
+        generated_cypher = "None"
+
+    return generated_cypher, final_answer
+
+
 async def langchain_cypher_generator(file_path):
 
     graph = Neo4jGraph(
@@ -42,58 +73,49 @@ async def langchain_cypher_generator(file_path):
         allow_dangerous_requests=True,
     )
 
-    results = []
     output_file = "file/QAChain_cypher_results.csv"
     df = pd.read_csv(file_path)
-    for _, row in df.iloc[169:].iterrows():
-
-        question = row["question"]
-
-        try:
-            response = chain.invoke({"query": question})
-
-            generated_cypher = response["intermediate_steps"][0]["query"]
-            db_context = response["intermediate_steps"][1].get("context", [])
-
-            entity_ids = []
-            if isinstance(db_context, list):
-                    for item in db_context:
-                        if isinstance(item, dict):
-                            node_values = list(item.values())[0]
-                            if isinstance(node_values, dict):
-                                eid = node_values.get("id")
-                                if eid:
-                                    entity_ids.append(eid)
-
-            
-            final_answer = entity_ids if entity_ids else response["result"]
-            print(f'{_}, {question}, {generated_cypher}, {final_answer}')
-
-        except Exception as e:
-            final_answer = f"Exception: {type(e).__name__}"
-            generated_cypher = "None"
-
-        results.append(
-            {
-                "phase": row["phase"],
-                "category": row["category"],
-                "question": question,
-                "cypher_executable": row["cypher_executable"],
-                "generated_cypher": generated_cypher,
-                "answer": final_answer,
-            }
-        )
-
-        if (_ + 1) % 10 == 0:
-            checkpoint_df = pd.DataFrame(results)
-            header = not os.path.exists(output_file)
-            checkpoint_df.to_csv(output_file, mode="a", index=False, header=header)
-            results = []
-
-    if results:
-        pd.DataFrame(results).to_csv(
-            output_file, mode="a", index=False, header=not os.path.exists(output_file)
-        )
+
+    # question -> (generated_cypher, answer); seeded from earlier runs so restarts
+    # and repeated template questions don't re-issue the LLM/graph call
+    answer_cache = {}
+    if os.path.exists(output_file):
+        done = pd.read_csv(output_file, usecols=["question", "generated_cypher", "answer"], dtype=str)
+        for question, generated_cypher, answer in zip(done["question"], done["generated_cypher"], done["answer"]):
+            if not str(answer).startswith("Exception:"):
+                answer_cache[question] = (generated_cypher, answer)
+
+    # Append rows straight to the CSV; no per-checkpoint DataFrame
+    with open(output_file, "a", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=OUTPUT_FIELDS)
+        if fh.tell() == 0:
+            writer.writeheader()
+
+        for _, row in df.iloc[169:].iterrows():
+
+            question = row["question"]
+
+            if question in answer_cache:
+                generated_cypher, final_answer = answer_cache[question]
+            else:
+                generated_cypher, final_answer = run_chain(chain, question)
+                print(f'{_}, {question}, {generated_cypher}, {final_answer}')
+                if not str(final_answer).startswith("Exception:"):
+                    answer_cache[question] = (generated_cypher, final_answer)
+
+            writer.writerow(
+                {
+                    "phase": row["phase"],
+                    "category": row["category"],
+                    "question": question,
+                    "cypher_executable": row["cypher_executable"],
+                    "generated_cypher": generated_cypher,
+                    "answer": final_answer,
+                }
+            )
+
+            if (_ + 1) % 10 == 0:
+                fh.flush()
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
 import ast
+import csv
 import os
 from pathlib import Path
 import pandas as pd
@@ -30,6 +31,26 @@ gpt_oss_llm = LLMFactory.create_llm(
 )
 
 
+NEO4J_BATCH_SIZE = 32  # queries in flight at once; well under the driver's default pool of 100
+LLM_CONCURRENCY = 8  # concurrent Cypher generation requests
+OUTPUT_FIELDS = [
+    "phase", "category", "question", "cypher_executable", "template_id", "generated_cypher", "answer",
+]
+
+
+def extract_entity_ids(records):
+    entity_ids = []
+    if isinstance(records, list):
+        for item in records:
+            if isinstance(item, dict):
+                node_values = list(item.values())[0]
+                if isinstance(node_values, dict):
+                    eid = node_values.get("id")
+                    if eid:
+                        entity_ids.append(eid)
+    return entity_ids
+
+
 async def main(file_path):
 
     neo4j = Neo4jClient(uri=NEO4J_URI, user=NEO4J_USER, password=NEO4J_PASSWORD)
@@ -41,65 +62,66 @@ async def main(file_path):
     # df =pd.read_csv("file/pathway_evaluation_complete_with_result.csv")
     df = pd.read_csv(file_path)
     cypher_generator = SimpleCypherGenerator(llm=gpt_oss_llm)
-    row_list = []
-    results = []
-    for _, row in df.iloc[0:].iterrows():
-
-        question = row["question"]
-
-        generated_cypher, metadata = cypher_generator.generate_query(question=question)
-
-        print(f'{_}, {question}, {metadata["template_id"]}, {generated_cypher}')
-        try:
-            final_answer = await neo4j.run_query(cypher=generated_cypher)
-            entity_ids = []
-            if isinstance(final_answer, list):
-                for item in final_answer:
-                    if isinstance(item, dict):
-                        node_values = list(item.values())[0]
-                        if isinstance(node_values, dict):
-                            eid = node_values.get("id")
-                            if eid:
-                                entity_ids.append(eid)
-
-            final_answer = entity_ids if entity_ids else final_answer
-
-        except Exception as e:
-            final_answer = []
-            print(e)
-      
-        results.append(
-            {
-                "phase": row["phase"],
-                "category": row["category"],
-                "question": question,
-                "cypher_executable": row["cypher_executable"],
-                "template_id": metadata["template_id"],
-                "generated_cypher": generated_cypher,
-                "answer": entity_ids,
-            }
-        )
-
-        if (_ + 1) % 10 == 0:
-            checkpoint_df = pd.DataFrame(results)
-            header = not os.path.exists(output_file)
-            checkpoint_df.to_csv(output_file, mode="a", index=False, header=header)
-            results = []
-
-    if results:
-        pd.DataFrame(results).to_csv(
-            output_file, mode="a", index=False, header=not os.path.exists(output_file)
-        )
-
-    
+    rows = df.iloc[0:].to_dict("records")
+
+    llm_sem = asyncio.Semaphore(LLM_CONCURRENCY)
+
+    async def gen_one(question):
+        async with llm_sem:
+            return await cypher_generator.agenerate_query(question=question)
+
+    # Append rows straight to the CSV; no per-checkpoint DataFrame
+    with open(output_file, "a", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=OUTPUT_FIELDS)
+        if fh.tell() == 0:
+            writer.writeheader()
+
+        for batch_start in range(0, len(rows), NEO4J_BATCH_SIZE):
+            batch = rows[batch_start:batch_start + NEO4J_BATCH_SIZE]
+
+            # Generate the batch's Cypher concurrently; the semaphore bounds requests to Ollama
+            generated = await asyncio.gather(*(gen_one(row["question"]) for row in batch))
+            for i, (row, (generated_cypher, metadata)) in enumerate(zip(batch, generated), batch_start):
+                print(f'{i}, {row["question"]}, {metadata.get("template_id")}, {generated_cypher}')
+
+            # Overlap the Neo4j round-trips of the whole batch instead of awaiting them one by one
+            answers = await asyncio.gather(
+                *(neo4j.run_query(cypher=cypher) for cypher, _ in generated),
+                return_exceptions=True,
+            )
+
+            for row, (generated_cypher, metadata), final_answer in zip(batch, generated, answers):
+                if isinstance(final_answer, Exception):
+                    print(final_answer)
+                    entity_ids = []
+                else:
+                    entity_ids = extract_entity_ids(final_answer)
+
+                writer.writerow(
+                    {
+                        "phase": row["phase"],
+                        "category": row["category"],
+                        "question": row["question"],
+                        "cypher_executable": row["cypher_executable"],
+                        "template_id": metadata.get("template_id"),
+                        "generated_cypher": generated_cypher,
+                        "answer": entity_ids,
+                    }
+                )
+
+            fh.flush()  # checkpoint once per batch
+
+    await neo4j.close()
+
+
+def mark_for_review(src_path, dst_path, max_answer_len=None):
+    # Truncate answers while parsing (no astype(str) copy of the column) and tag in one pass
+    converters = {"answer": lambda a: a[:max_answer_len]} if max_answer_len else None
+    pd.read_csv(src_path, converters=converters).assign(if_correct="1").to_csv(dst_path, index=False)
+
+
 # if __name__ == "__main__":
 #     file_path = "file/pathway_evaluation_complete_with_result.csv"
 #     # asyncio.run(main(file_path))
-#     df = pd.read_csv("file/lipidbot_cypher_results.csv")
-#     df["answer"] = df["answer"].astype(str).str[:1000]
-#     df["if_correct"] = "1"
-#     df.to_csv("lipidbot_cypher_results.csv", index=False)
-
-#     df = pd.read_csv("file/QAChain_cypher_results.csv")
-#     df["if_correct"] = "1"
-#     df.to_csv("QAChain_cypher_results.csv", index=False)
+#     mark_for_review("file/lipidbot_cypher_results.csv", "lipidbot_cypher_results.csv", max_answer_len=1000)
+#     mark_for_review("file/QAChain_cypher_results.csv", "QAChain_cypher_results.csv")
@@ -1,39 +1,38 @@
-import math
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
 
+def _prediction_matrix(pred_lists, width):
+    # Pad ragged prediction lists with None so no slot can equal a ground-truth string
+    mat = np.full((len(pred_lists), width), None, dtype=object)
+    for i, preds in enumerate(pred_lists):
+        mat[i, :len(preds)] = preds[:width]
+    return mat
+
+
+def _first_hit_ranks(df, pred_lists, width):
+    """Per row: whether ground_truth_pmid appears in its predictions, and its 1-based rank."""
+    gts = df['ground_truth_pmid'].astype(str).str.strip().to_numpy(dtype=object)
+    hits = _prediction_matrix(pred_lists, width) == gts[:, None]
+    # argmax picks the first True; rank is only meaningful where has_hit
+    return hits.any(axis=1), hits.argmax(axis=1) + 1
+
+
 def calculate_all_metrics(model_name, df, pred_column, K=10):
-    mrr_sum = hit_sum = precision_sum = ndcg_sum = 0
     n = len(df)
-    
-    for _, row in df.iterrows():
-        gt = str(row['ground_truth_pmid']).strip()
-        # Clean and deduplicate the prediction list
-        raw_preds = str(row[pred_column]).split(',')
-        pred_ids = []
-        for p in raw_preds:
-            p_clean = p.strip()
-            if p_clean not in pred_ids:
-                pred_ids.append(p_clean)
-        
-        # Limit to Top K
-        pred_ids = pred_ids[:K]
-        
-        if gt in pred_ids:
-            # It's a Hit!
-            hit_sum += 1
-            rank = pred_ids.index(gt) + 1
-            
-            # MRR
-            mrr_sum += 1 / rank
-            
-            # Precision@K (1 correct answer / K total slots)
-            precision_sum += 1 / K
-            
-            # nDCG (Simplified for single ground truth)
-            ndcg_sum += 1 / math.log2(rank + 1)
+    # Clean, deduplicate (order-preserving) and limit each prediction list to Top K
+    pred_lists = df[pred_column].astype(str).str.split(',').map(
+        lambda xs: list(dict.fromkeys(map(str.strip, xs)))[:K]
+    )
+
+    has_hit, rank = _first_hit_ranks(df, pred_lists.tolist(), K)
+
+    hit_sum = has_hit.sum()
+    mrr_sum = (has_hit / rank).sum()
+    precision_sum = hit_sum / K  # 1 correct answer / K total slots
+    ndcg_sum = (has_hit / np.log2(rank + 1)).sum()  # single ground truth
             
     return {
         "Model": model_name, 
@@ -45,23 +44,30 @@ def calculate_all_metrics(model_name, df, pred_column, K=10):
     }
 
 
+MODEL_COLUMNS = ['bm25_predictions', 'pubmedbert_base_predictions', 'lipidbot_predictions']
+# Only these columns are used downstream; a callable usecols skips the rest while
+# parsing and tolerates whichever file a column actually lives in
+SOURCE_COLUMNS = {'pmid', 'question', 'category_id', 'category_name', 'ground_truth_pmid'}
+PREDICTION_COLUMNS = {'ground_truth_pmid', *MODEL_COLUMNS}
+
+
 def random_select_top_per_category(source_path, file_path, n_per_cat=50):
-    df_source = pd.read_csv(source_path)
-    df = pd.read_csv(file_path)
+    df_source = pd.read_csv(source_path, usecols=lambda c: c in SOURCE_COLUMNS)
+    df = pd.read_csv(
+        file_path,
+        usecols=lambda c: c in PREDICTION_COLUMNS,
+        dtype={c: str for c in MODEL_COLUMNS},
+    )
     
     combined_df = pd.concat([df_source, df], axis=1)
     print("Available columns:", combined_df.columns.tolist())
 
-    def calculate_lipidbot_score(row):
-        gt = str(row['ground_truth_pmid']).strip()
-        preds = [p.strip() for p in str(row['lipidbot_predictions']).split(',')]
-        try:
-            rank = preds.index(gt)
-            return 1.0 / (rank + 1)
-        except (ValueError, AttributeError):
-            return 0.0
-
-    combined_df['lipidbot_score'] = combined_df.apply(calculate_lipidbot_score, axis=1)
+    # Reciprocal rank of the ground truth in the full (un-truncated) LipidBot list
+    pred_lists = combined_df['lipidbot_predictions'].astype(str).str.split(',').map(
+        lambda xs: list(map(str.strip, xs))
+    ).tolist()
+    has_hit, rank = _first_hit_ranks(combined_df, pred_lists, max(map(len, pred_lists), default=1))
+    combined_df['lipidbot_score'] = np.where(has_hit, 1.0 / rank, 0.0)
     df_shuffled = combined_df.sample(frac=1, random_state=42).reset_index(drop=True)
     # df_sorted = df_shuffled.sort_values(by=['category_id', 'lipidbot_score'], ascending=[True, False])
 
@@ -71,7 +77,7 @@ def random_select_top_per_category(source_path, file_path, n_per_cat=50):
 
     results = []
 
-    for model_col in ['bm25_predictions', 'pubmedbert_base_predictions', 'lipidbot_predictions']:
+    for model_col in MODEL_COLUMNS:
         metrics = calculate_all_metrics(model_col, final_df, model_col)
         results.append(metrics)
 
@@ -1,10 +1,69 @@
+import asyncio
 import json
+import orjson
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel
+from pydantic.json_schema import SkipJsonSchema
+from cypher.cypher_generator import SimpleCypherGenerator
+from cypher.llm_entity_extractor import _slice_json_object
 
 class SimpleClassification(BaseModel):
     is_relevant: bool
     needs_graph: bool
 
+
+class FrontDoorResult(BaseModel):
+    """Classification, entity mentions and template choice from one fused LLM call."""
+    is_relevant: bool
+    needs_graph: bool
+    mentions: List[Dict[str, Any]] = []
+    template_id: Optional[str] = None
+    # Set locally (rule fast path), never asked of the LLM: identifier lookups
+    # are answered from the graph, so literature search can be skipped
+    needs_citations: SkipJsonSchema[bool] = True
+
+    @property
+    def classification(self) -> SimpleClassification:
+        return SimpleClassification(is_relevant=self.is_relevant, needs_graph=self.needs_graph)
+
+
+class FrontDoorBatchResult(BaseModel):
+    """One FrontDoorResult per query of a coalesced front-door call, in order."""
+    results: List[FrontDoorResult]
+
+class _Mention(BaseModel):
+    text: str
+    start: int
+    end: int
+
+
+class _FrontDoorReply(FrontDoorResult):
+    # Schema only: typed mentions give the decoder (and Gemini, which rejects
+    # free-form objects) a full shape; replies still parse as FrontDoorResult
+    mentions: List[_Mention] = []
+
+
+class _FrontDoorBatchReply(BaseModel):
+    results: List[_FrontDoorReply]
+
+
+# Passed as response_schema so providers constrain decoding to parseable JSON
+CLASSIFICATION_SCHEMA = SimpleClassification.model_json_schema()
+FRONT_DOOR_SCHEMA = _FrontDoorReply.model_json_schema()
+FRONT_DOOR_BATCH_SCHEMA = _FrontDoorBatchReply.model_json_schema()
+
+# Token caps for those replies (a batch reply gets FRONT_DOOR_MAX_TOKENS per
+# query): a valid reply is a few dozen tokens, and a constrained decoder that
+# drifts into whitespace would otherwise run to the model's num_predict. Left
+# generous because a reasoning model's thinking counts against the same cap
+CLASSIFY_MAX_TOKENS = int(os.getenv("CLASSIFY_MAX_TOKENS", "256"))
+FRONT_DOOR_MAX_TOKENS = int(os.getenv("FRONT_DOOR_MAX_TOKENS", "512"))
+
 SIMPLE_CLASSIFICATION_PROMPT = """You are analyzing queries for a lipid biochemistry knowledge graph database.
 
 **OUR KNOWLEDGE GRAPH CONTAINS:**
@@ -18,9 +77,7 @@ SIMPLE_CLASSIFICATION_PROMPT = """You are analyzing queries for a lipid biochemi
 - Pathway→Reaction (what reactions are in pathway X?)
 - Gene→Ortholog→EC (gene families and their functions)
 
-**USER QUERY:** "{query}"
-
-**ANSWER TWO QUESTIONS:**
+**ANSWER TWO QUESTIONS ABOUT THE USER QUERY BELOW:**
 
 1. **Is this relevant to lipid biology, fatty acids, metabolic pathways, or biochemistry?**
    - YES: lipids, fatty acids, genes, enzymes, metabolic reactions, biochemical pathways
@@ -60,6 +117,8 @@ Query: "What pathways contain COX-2?"
 Query: "What is the chemical formula of EPA?"
 → is_relevant: true, needs_graph: false (property lookup, literature is better)
 
+**USER QUERY:** "{query}"
+
 Respond in JSON:
 {{
     "is_relevant": true/false,
@@ -67,6 +126,226 @@ Respond in JSON:
 }}
 """
 
+# Classification + entity extraction + template routing in one prompt; the
+# three separate prompts stay in use as the fallback path
+FRONT_DOOR_PROMPT = """You are the front door of a lipid biochemistry knowledge graph assistant.
+
+**OUR KNOWLEDGE GRAPH CONTAINS:**
+Nodes: Gene, Compound, Reaction, Pathway, EC (enzymes), Ortholog
+Relationships: Gene→EC, Compound→Reaction, EC→Reaction, Pathway→Reaction, Gene→Ortholog→EC
+
+**ANSWER FOUR THINGS ABOUT THE USER QUERY AT THE END:**
+
+1. is_relevant: is this about lipid biology, fatty acids, genes, enzymes, metabolic reactions or biochemical pathways?
+   (false for weather, sports, politics, general knowledge unrelated to biology)
+
+2. needs_graph: does answering require our knowledge graph?
+   - true for relationships between entities ("What reactions produce X?", "What enzyme does gene Y encode?") and pathway structure
+   - false for mechanisms ("How does X work?"), health effects, and properties better answered from literature
+
+3. mentions: every entity name in the query (genes, proteins, compounds, enzymes, reactions, pathways, orthologs)
+   with exact character positions (0-indexed, start inclusive, end exclusive), in order, not overlapping; [] if none
+
+4. template_id: if needs_graph, the ID of the best-matching query template below; otherwise null
+
+**QUERY TEMPLATES:**
+{templates}
+
+**EXAMPLES:**
+Query: "What reactions produce linoleic acid?"
+→ {{"is_relevant": true, "needs_graph": true, "mentions": [{{"text": "linoleic acid", "start": 23, "end": 36}}], "template_id": "T015"}}
+Query: "How does DHA reduce inflammation?"
+→ {{"is_relevant": true, "needs_graph": false, "mentions": [{{"text": "DHA", "start": 9, "end": 12}}], "template_id": null}}
+Query: "What's the weather in Paris?"
+→ {{"is_relevant": false, "needs_graph": false, "mentions": [], "template_id": null}}
+
+**USER QUERY:** "{query}"
+
+Respond with ONLY the JSON object:
+{{
+    "is_relevant": true/false,
+    "needs_graph": true/false,
+    "mentions": [{{"text": "entity name", "start": 0, "end": 0}}],
+    "template_id": "T000" or null
+}}
+"""
+
+# Several queries in one call: the same instructions, then the queries as a JSON list
+FRONT_DOOR_BATCH_PROMPT = """{instructions}**USER QUERIES** (JSON list, each with an "id"):
+{queries}
+
+Answer the four things for each query on its own; mention positions are within that query.
+Respond with ONLY a JSON object holding one result per query, in the same order as the ids:
+{{"results": [{{"is_relevant": true/false, "needs_graph": true/false, "mentions": [...], "template_id": "T000" or null}}, ...]}}
+"""
+
+# Descriptions only: the Cypher bodies stay in the generator's own prompt
+FRONT_DOOR_TEMPLATES = "\n".join(
+    f"{tid}: {data['description']}" for tid, data in SimpleCypherGenerator.CYPHER_TEMPLATES.items()
+)
+_MENTION_KEYS = frozenset(("text", "start", "end"))
+
+# Prompts rendered once around a sentinel and split, so a call is a concatenation
+# rather than a str.format of the whole template (braces are already unescaped).
+# The query sits at the end so the static text is a prefix providers can cache.
+_PROMPT_SLOT = "\0"
+_CLASSIFY_PRE, _CLASSIFY_POST = SIMPLE_CLASSIFICATION_PROMPT.format(query=_PROMPT_SLOT).split(_PROMPT_SLOT)
+_FRONT_DOOR_PRE, _FRONT_DOOR_POST = FRONT_DOOR_PROMPT.format(
+    query=_PROMPT_SLOT, templates=FRONT_DOOR_TEMPLATES
+).split(_PROMPT_SLOT)
+_FRONT_DOOR_BATCH_PRE, _FRONT_DOOR_BATCH_POST = FRONT_DOOR_BATCH_PROMPT.format(
+    instructions=_FRONT_DOOR_PRE.removesuffix('**USER QUERY:** "'), queries=_PROMPT_SLOT
+).split(_PROMPT_SLOT)
+
+# Answer synthesis. Static instructions first and the question and sources
+# last, so concurrent requests share a prompt prefix: the Ollama server reuses
+# its cached prefill for that part instead of recomputing it per request
+SYNTHESIS_PROMPT = """You are a lipid biology expert assistant.
+
+**CITATION PROTOCOL - READ CAREFULLY:**
+
+Before adding ANY citation [N]:
+1. Check: Is this fact explicitly stated in source [N]?
+2. If YES → Add citation [N]
+3. If NO → Either:
+   - Find the correct source that states it
+   - Or mention it without citation and note it's from general knowledge
+
+**FORBIDDEN:**
+❌ Citing sources based on relevance/topic match
+❌ Adding citations to sound more authoritative
+❌ Guessing which source might support a claim
+❌ Citing [1] just because it's the first source
+
+**REQUIRED:**
+✓ Only cite when you can point to the exact sentence in that source
+✓ Use phrases like "According to [1]..." when directly referencing
+✓ Say "General lipid biology knowledge suggests..." for non-cited claims
+
+**Instructions:**
+1. Answer the user's question directly and comprehensively
+2. **For each fact you state, mentally check: "Is this from a numbered source below? Which one exactly?"**
+3. Only add [N] if you can trace the fact to that specific source
+4. Be specific with enzyme names, gene IDs, and quantitative data
+5. Acknowledge gaps honestly
+
+**User Question:** "{query}"
+
+**Available Information:**
+{context}
+
+**Your Response:**"""
+_SYNTHESIS_PRE, _SYNTHESIS_MID, _SYNTHESIS_POST = SYNTHESIS_PROMPT.format(
+    query=_PROMPT_SLOT, context=_PROMPT_SLOT
+).split(_PROMPT_SLOT)
+
+# Sources given to synthesis: at most SYNTHESIS_MAX_SOURCES, and no more text
+# than SYNTHESIS_CONTEXT_CHARS (~4 chars per token). Ollama drops the start of
+# a prompt that overflows num_ctx, and the start is where the instructions are
+SYNTHESIS_MAX_SOURCES = 10
+SYNTHESIS_CONTEXT_CHARS = int(os.getenv("SYNTHESIS_CONTEXT_CHARS", "12000"))
+
+
+def build_synthesis_prompt(query: str, context: str) -> str:
+    return f"{_SYNTHESIS_PRE}{query}{_SYNTHESIS_MID}{context}{_SYNTHESIS_POST}"
+
+
+def context_hits(hits: List[Any]) -> List[Any]:
+    """Leading hits that fit the synthesis context budget; always at least one."""
+    budget = SYNTHESIS_CONTEXT_CHARS
+    kept = hits[:SYNTHESIS_MAX_SOURCES]
+    for n, hit in enumerate(kept):
+        budget -= len(hit.text) + len(hit.title or "")
+        if budget < 0 and n:
+            return kept[:n]
+    return kept
+
+# ============================================================================
+# CLASSIFICATION CACHE
+# ============================================================================
+
+CLASSIFY_CACHE_SIZE = 1024
+CLASSIFY_CACHE_TTL = 3600  # seconds
+
+# Greetings / chit-chat are never relevant; answer them without an LLM call
+SMALL_TALK = frozenset({
+    "hi", "hello", "hey", "thanks", "thank you", "thx", "bye", "goodbye",
+    "good morning", "good afternoon", "good evening", "ok", "okay",
+})
+
+# Rule fast path: a query naming a KEGG/EC identifier and asking for linked
+# entities is a graph lookup by construction, so it skips the classifier call.
+# Mechanism / health wording keeps the LLM in the loop.
+_RE_KG_ID = re.compile(
+    r'\b[CKR]\d{5}\b'
+    r'|\bpath:[a-z]{2,4}\d{5}\b'
+    r'|\b(?:(?i:EC)[:\s])?\d+\.\d+\.\d+\.(?:\d+|-)(?![\w.])'
+)
+_RE_GRAPH_ASK = re.compile(
+    r'\b(?:what|which|list|show|find|how many)\b.*\b(?:reactions?|pathways?|genes?|enzymes?'
+    r'|compounds?|orthologs?|substrates?|products?|encodes?|catalyz\w*)\b',
+    re.IGNORECASE,
+)
+_RE_LITERATURE_ASK = re.compile(
+    r'\b(?:why|how (?:does|do|is|are)|mechanism\w*|benefits?|health|effects?|regulat\w*)\b',
+    re.IGNORECASE,
+)
+
+# hit / miss / small_talk / rule counts, for observability
+CLASSIFY_STATS = Counter()
+
+_classify_cache: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (stored_at, SimpleClassification | FrontDoorResult)
+_classify_lock = threading.Lock()  # called from worker threads (asyncio.to_thread)
+
+
+def _normalize_query(query: str) -> str:
+    # Case, spacing and trailing punctuation don't change the classification,
+    # so "What is FAD2?" and "what is fad2" share a cache entry
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+
+def classify_cache_stats() -> Dict[str, Any]:
+    """CLASSIFY_STATS plus the cache size and the share of lookups answered without an LLM call."""
+    with _classify_lock:
+        entries = len(_classify_cache)
+    stats = dict(CLASSIFY_STATS)
+    served = stats.get("hit", 0) + stats.get("small_talk", 0) + stats.get("rule", 0)
+    total = served + stats.get("miss", 0)
+    return {**stats, "entries": entries, "hit_rate": served / total if total else 0.0}
+
+
+def _rule_mentions(query: str) -> Optional[List[Dict[str, Any]]]:
+    """The identifier mentions when the rule fast path applies, else None."""
+    ids = [
+        {"text": m.group(), "start": m.start(), "end": m.end()}
+        for m in _RE_KG_ID.finditer(query)
+    ]
+    if not ids or not _RE_GRAPH_ASK.search(query) or _RE_LITERATURE_ASK.search(query):
+        return None
+    return ids
+
+
+def _cache_get(key):
+    with _classify_lock:
+        entry = _classify_cache.get(key)
+        if entry is None:
+            return None
+        stored_at, result = entry
+        if time.monotonic() - stored_at > CLASSIFY_CACHE_TTL:
+            del _classify_cache[key]
+            return None
+        _classify_cache.move_to_end(key)
+        return result
+
+
+def _cache_put(key, result: BaseModel):
+    with _classify_lock:
+        _classify_cache[key] = (time.monotonic(), result)
+        _classify_cache.move_to_end(key)
+        if len(_classify_cache) > CLASSIFY_CACHE_SIZE:
+            _classify_cache.popitem(last=False)
+
+
 # ============================================================================
 # CLASSIFICATION FUNCTION
 # ============================================================================
@@ -79,22 +358,57 @@ def classify_query_simple(
     Simple two-question classification:
     1. Is it relevant to our domain?
     2. Does it need graph traversal?
+
+    Repeated queries (after lowercasing and whitespace collapsing) are served
+    from an LRU cache with a TTL; greetings and identifier lookups matched by
+    the rule fast path skip the LLM entirely.
     """
-    prompt = SIMPLE_CLASSIFICATION_PROMPT.format(query=query)
-    
-    response = llm.generate(prompt=prompt)
-    
+    cache_key, result = _classify_lookup(query, llm)
+    if result is not None:
+        return result
+
+    prompt = f"{_CLASSIFY_PRE}{query}{_CLASSIFY_POST}"
+    response = llm.generate(prompt=prompt, response_schema=CLASSIFICATION_SCHEMA, max_tokens=CLASSIFY_MAX_TOKENS)
+    return _classify_parse(cache_key, response)
+
+
+async def aclassify_query_simple(query: str, llm) -> SimpleClassification:
+    """Async `classify_query_simple`: awaits llm.agenerate instead of blocking a thread."""
+    cache_key, result = _classify_lookup(query, llm)
+    if result is not None:
+        return result
+
+    prompt = f"{_CLASSIFY_PRE}{query}{_CLASSIFY_POST}"
+    response = await llm.agenerate(prompt=prompt, response_schema=CLASSIFICATION_SCHEMA, max_tokens=CLASSIFY_MAX_TOKENS)
+    return _classify_parse(cache_key, response)
+
+
+def _classify_lookup(query: str, llm):
+    """(cache_key, result): result is set when no LLM call is needed."""
+    normalized = _normalize_query(query)
+    if normalized.strip("!.?") in SMALL_TALK:
+        CLASSIFY_STATS["small_talk"] += 1
+        return None, SimpleClassification(is_relevant=False, needs_graph=False)
+    if _rule_mentions(query) is not None:
+        CLASSIFY_STATS["rule"] += 1
+        return None, SimpleClassification(is_relevant=True, needs_graph=True)
+
+    cache_key = (getattr(llm, "model_name", None), normalized)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        CLASSIFY_STATS["hit"] += 1
+        return cache_key, cached
+    CLASSIFY_STATS["miss"] += 1
+    return cache_key, None
+
+
+def _classify_parse(cache_key: tuple, response: str) -> SimpleClassification:
     try:
-        cleaned = response.strip()
-        if cleaned.startswith("```"):
-            cleaned = cleaned.split("```")[1]
-            if cleaned.startswith("json"):
-                cleaned = cleaned[4:]
+        result = _validate_llm_json(SimpleClassification, response)
+        _cache_put(cache_key, result)  # parse failures below are not cached
+        return result
         
-        parsed = json.loads(cleaned.strip())
-        return SimpleClassification(**parsed)
-        
-    except (json.JSONDecodeError, ValueError) as e:
+    except (json.JSONDecodeError, ValueError, TypeError) as e:
         
         return SimpleClassification(
             is_relevant=False,
@@ -102,6 +416,213 @@ def classify_query_simple(
         )
 
 
+class FrontDoorClassifier:
+    """
+    One LLM call that stands in for classify_query_simple, the LLM entity
+    extractor and the template router. `aclassify` returns None when the reply
+    can't be parsed, so the caller can fall back to the separate calls.
+    """
+
+    def __init__(self, llm):
+        self.llm = llm
+
+    async def aclassify(self, query: str) -> Optional[FrontDoorResult]:
+        cache_key, result = self.lookup(query)
+        if result is not None:
+            return result
+        return await self.aresolve(query, cache_key)
+
+    def lookup(self, query: str):
+        """
+        (cache_key, result): result is set when no LLM call is needed (small
+        talk, rule fast path, cache hit). Otherwise pass cache_key to `aresolve`.
+        """
+        normalized = _normalize_query(query)
+        if normalized.strip("!.?") in SMALL_TALK:
+            CLASSIFY_STATS["small_talk"] += 1
+            return None, FrontDoorResult(is_relevant=False, needs_graph=False)
+        mentions = _rule_mentions(query)
+        if mentions is not None:
+            # The identifiers are the mentions; the generator picks the template
+            CLASSIFY_STATS["rule"] += 1
+            return None, FrontDoorResult(is_relevant=True, needs_graph=True, mentions=mentions, needs_citations=False)
+
+        cache_key = ("front_door", getattr(self.llm, "model_name", None), normalized)
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            CLASSIFY_STATS["hit"] += 1
+            return cache_key, cached
+        CLASSIFY_STATS["miss"] += 1
+        return cache_key, None
+
+    async def aresolve(self, query: str, cache_key: tuple) -> Optional[FrontDoorResult]:
+        """The LLM part of `aclassify`, for a query `lookup` couldn't answer."""
+        return await self._classify_one(query, cache_key)
+
+    async def _classify_one(self, query: str, cache_key: tuple) -> Optional[FrontDoorResult]:
+        prompt = f"{_FRONT_DOOR_PRE}{query}{_FRONT_DOOR_POST}"
+        response = await self.llm.agenerate(prompt=prompt, response_schema=FRONT_DOOR_SCHEMA, max_tokens=FRONT_DOOR_MAX_TOKENS)
+
+        try:
+            parsed = _validate_llm_json(FrontDoorResult, response)
+        except (json.JSONDecodeError, ValueError, TypeError):
+            CLASSIFY_STATS["front_door_fallback"] += 1
+            return None
+        return self._accept(cache_key, query, parsed)
+
+    def _accept(self, cache_key: tuple, query: str, parsed: FrontDoorResult) -> Optional[FrontDoorResult]:
+        """Drop mentions outside the query and unknown template IDs, then cache."""
+        try:
+            result = FrontDoorResult(
+                is_relevant=parsed.is_relevant,
+                needs_graph=parsed.needs_graph,
+                mentions=self._valid_mentions(parsed.mentions, query),
+                template_id=parsed.template_id if parsed.template_id in SimpleCypherGenerator.CYPHER_TEMPLATES else None,
+            )
+        except (ValueError, KeyError, TypeError, AttributeError):
+            CLASSIFY_STATS["front_door_fallback"] += 1
+            return None
+
+        _cache_put(cache_key, result)
+        return result
+
+    @staticmethod
+    def _valid_mentions(mentions, query: str) -> List[Dict[str, Any]]:
+        # Same checks as LLMBioEntityExtractor: required keys, span inside the query
+        n = len(query)
+        return [
+            {"text": m["text"], "start": m["start"], "end": m["end"]}
+            for m in mentions or []
+            if isinstance(m, dict) and m.keys() >= _MENTION_KEYS
+            and isinstance(m["start"], int) and isinstance(m["end"], int) and 0 <= m["start"] < m["end"] <= n
+        ]
+
+
+class BatchingFrontDoorClassifier(FrontDoorClassifier):
+    """
+    FrontDoorClassifier whose LLM calls are coalesced: queries arriving within
+    `batch_window` seconds (up to `max_batch_size`) share one prompt. Cache
+    hits and small talk never wait. A batch whose reply doesn't parse or line
+    up one-to-one falls back to one call per query.
+    """
+
+    def __init__(self, llm, batch_window: float = 0.02, max_batch_size: int = 8):
+        super().__init__(llm)
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self._pending: Optional[asyncio.Queue] = None  # bound to the serving loop on first use
+        self._inflight = set()
+
+    async def aresolve(self, query: str, cache_key: tuple) -> Optional[FrontDoorResult]:
+        if self._pending is None:
+            self._pending = asyncio.Queue()
+            self._batch_worker = asyncio.create_task(self._run_batch_worker())
+        fut = asyncio.get_running_loop().create_future()
+        await self._pending.put((query, cache_key, fut))
+        return await fut
+
+    async def _run_batch_worker(self):
+        """Collect up to `max_batch_size` queries or `batch_window` seconds, then dispatch."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._pending.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._pending.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.create_task(self._dispatch_batch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch_batch(self, batch: List[tuple]):
+        try:
+            if len(batch) == 1:
+                query, cache_key, _ = batch[0]
+                results = [await self._classify_one(query, cache_key)]
+            else:
+                results = await self._classify_batch(batch)
+        except Exception as exc:
+            # Surface the LLM error to every waiting caller rather than hang them
+            for _, _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(exc)
+            return
+        for (_, _, fut), result in zip(batch, results):
+            if not fut.done():
+                fut.set_result(result)
+
+    async def _classify_batch(self, batch: List[tuple]) -> List[Optional[FrontDoorResult]]:
+        payload = [{"id": i, "query": query} for i, (query, _, _) in enumerate(batch)]
+        prompt = f"{_FRONT_DOOR_BATCH_PRE}{json.dumps(payload, ensure_ascii=False)}{_FRONT_DOOR_BATCH_POST}"
+        response = await self.llm.agenerate(
+            prompt=prompt, response_schema=FRONT_DOOR_BATCH_SCHEMA, max_tokens=FRONT_DOOR_MAX_TOKENS * len(batch)
+        )
+
+        try:
+            replies = _validate_llm_json(FrontDoorBatchResult, response).results
+        except (json.JSONDecodeError, ValueError, TypeError):
+            replies = None
+        if replies is None or len(replies) != len(batch):
+            CLASSIFY_STATS["front_door_batch_split"] += 1
+            return list(await asyncio.gather(*(
+                self._classify_one(query, cache_key) for query, cache_key, _ in batch
+            )))
+        return [
+            self._accept(cache_key, query, reply)
+            for (query, cache_key, _), reply in zip(batch, replies)
+        ]
+
+
+def anchor_mentions(mentions: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
+    """
+    Front-door `mentions` re-anchored onto `query`. A cached or shared result's
+    spans index the query that produced it, which may differ in spacing, case
+    or trailing punctuation: a span that no longer covers its text moves to
+    the text's first (case-insensitive) occurrence in `query`, and a mention
+    whose text isn't there is dropped.
+    """
+    fold = str.lower if len(query.lower()) == len(query) else str  # offsets must survive folding
+    folded = fold(query)
+    anchored = []
+    for m in mentions:
+        text, start, end = m["text"], m["start"], m["end"]
+        if query[start:end] != text:
+            start = folded.find(fold(text)) if text else -1
+            if start < 0:
+                continue
+            end = start + len(text)
+            text = query[start:end]
+        anchored.append({"text": text, "start": start, "end": end})
+    return anchored
+
+
+def _validate_llm_json(model, response: str):
+    # Schema-constrained replies are bare JSON: validate straight from the string.
+    # Providers that ignored the schema still get the fence-stripping path.
+    try:
+        return model.model_validate_json(response)
+    except ValueError:
+        return model.model_validate(_parse_llm_json(response))
+
+
+def _parse_llm_json(response: str) -> Dict:
+    # Bare or fenced reply parses directly; otherwise take the first balanced
+    # {...} (one linear scan) so prose around the object doesn't fail the parse
+    cleaned = response.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+    try:
+        return json.loads(cleaned)
+    except json.JSONDecodeError:
+        obj = _slice_json_object(cleaned)
+        if obj is None:
+            raise
+        return json.loads(obj)
+
+
 def openai_chunk(content: str, stream_id: str, finish=False):
     payload = {
         "id": stream_id,
@@ -112,7 +633,8 @@ def openai_chunk(content: str, stream_id: str, finish=False):
             "finish_reason": "stop" if finish else None
         }]
     }
-    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    # Called once per streamed token; orjson writes UTF-8 as-is, like ensure_ascii=False
+    return f"data: {orjson.dumps(payload).decode()}\n\n"
 
 
 def flatten_nested_dict(prefix, obj, out):
@@ -0,0 +1,218 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+
+REDIS_TIMEOUT = 0.5  # seconds; a slow Redis degrades to a cache miss
+_REDIS_PREFIX = "lipidbot:llm:"
+
+logger = logging.getLogger("uvicorn.error")
+
+# sqlite / Redis I/O for aget / aput, kept off the event loop and apart from
+# asyncio's default executor (and the LLM and search pools)
+_STORE_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="llm-cache")
+
+
+def prompt_key(*parts) -> str:
+    """Stable key for a prompt plus whatever else shapes the answer (model, temperature, ...)."""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Prompt-keyed LLM response cache: an in-process LRU, optionally backed
+    by a sqlite file so re-runs skip calls already answered, and/or by Redis
+    so entries survive restarts and are shared across uvicorn workers.
+    Entries can carry a TTL (seconds), honoured by every tier. Thread-safe;
+    on the event loop use `aget` / `aput`, which keep the sqlite and Redis
+    I/O off the loop.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        maxsize: int = 4096,
+        redis_url: Optional[str] = None,
+        default_ttl: Optional[int] = None,
+    ):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self._mem: "OrderedDict[str, Tuple[str, Optional[float]]]" = OrderedDict()  # key -> (response, expires_at)
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL)"
+            )
+            # Files written before entries had a TTL lack the column
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(responses)")}
+            if "expires_at" not in columns:
+                self._db.execute("ALTER TABLE responses ADD COLUMN expires_at REAL")
+            self._db.commit()
+        self._redis = None
+        if redis_url:
+            import redis  # only needed when a Redis tier is configured
+
+            self._redis = redis.Redis.from_url(
+                redis_url, decode_responses=True, socket_timeout=REDIS_TIMEOUT
+            )
+            self._redis_errors = (redis.RedisError, OSError)
+
+    def get(self, key: str) -> Optional[str]:
+        response = self._get_local(key)
+        if response is not None:
+            return response
+        return self._get_stored(key)
+
+    def put(self, key: str, response: str, ttl: Optional[int] = None) -> None:
+        """Store `response`; `ttl` (seconds) overrides `default_ttl`, and 0 skips storing."""
+        if ttl is None:
+            ttl = self.default_ttl
+        if ttl == 0:
+            return
+        with self._lock:
+            self._remember(key, response, ttl)
+        self._put_stored(key, response, ttl)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """`get` for the event loop: memory hits return inline, the sqlite / Redis lookup runs in a worker thread."""
+        response = self._get_local(key)
+        if response is not None or (self._db is None and self._redis is None):
+            return response
+        return await asyncio.get_running_loop().run_in_executor(_STORE_POOL, self._get_stored, key)
+
+    async def aput(self, key: str, response: str, ttl: Optional[int] = None) -> None:
+        """`put` for the event loop: the memory tier is updated now, sqlite / Redis written behind in a worker thread."""
+        if ttl is None:
+            ttl = self.default_ttl
+        if ttl == 0:
+            return
+        with self._lock:
+            self._remember(key, response, ttl)
+        if self._db is not None or self._redis is not None:
+            _STORE_POOL.submit(self._put_stored, key, response, ttl).add_done_callback(_log_store_failure)
+
+    def _get_local(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is None:
+                return None
+            response, expires_at = entry
+            if expires_at is None or expires_at > time.monotonic():
+                self._mem.move_to_end(key)
+                return response
+            del self._mem[key]
+            return None
+
+    def _get_stored(self, key: str) -> Optional[str]:
+        """The sqlite, then Redis, tier; a hit is copied into memory for its remaining lifetime."""
+        if self._db is not None:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT response, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    response, expires_at = row
+                    remaining = None if expires_at is None else expires_at - time.time()
+                    if remaining is None or remaining > 0:
+                        self._remember(key, response, remaining)
+                        return response
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+
+        if self._redis is None:
+            return None
+        # Outside the lock: a network round trip must not serialize local hits
+        try:
+            # One round trip; the remaining TTL bounds the local copy too
+            response, ttl = (
+                self._redis.pipeline(transaction=False)
+                .get(_REDIS_PREFIX + key)
+                .ttl(_REDIS_PREFIX + key)
+                .execute()
+            )
+        except self._redis_errors as e:
+            logger.warning(f"LLM cache: Redis get failed: {e}")
+            return None
+        if response is None:
+            return None
+        with self._lock:
+            self._remember(key, response, ttl if ttl > 0 else None)
+        return response
+
+    def _put_stored(self, key: str, response: str, ttl: Optional[int]) -> None:
+        if self._db is not None:
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, expires_at) VALUES (?, ?, ?)",
+                    (key, response, time.time() + ttl if ttl else None),
+                )
+                self._db.commit()
+        if self._redis is not None:
+            try:
+                self._redis.set(_REDIS_PREFIX + key, response, ex=ttl)
+            except self._redis_errors as e:
+                logger.warning(f"LLM cache: Redis set failed: {e}")
+
+    def get_or_generate(
+        self,
+        key: str,
+        generate: Callable[[], str],
+        accept: Callable[[str], bool] = bool,
+        ttl: Optional[int] = None,
+    ) -> str:
+        """Return the cached response, else call `generate`; only responses passing `accept` are stored."""
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        response = generate()
+        if accept(response):
+            self.put(key, response, ttl)
+        return response
+
+    def _remember(self, key: str, response: str, ttl: Optional[float]) -> None:
+        self._mem[key] = (response, time.monotonic() + ttl if ttl else None)
+        self._mem.move_to_end(key)
+        if len(self._mem) > self.maxsize:
+            self._mem.popitem(last=False)
+
+
+def _log_store_failure(fut: Future) -> None:
+    # Written behind by aput: nobody awaits the write, so report it here
+    exc = fut.exception()
+    if exc is not None:
+        logger.warning(f"LLM cache: write-behind failed: {exc!r}")
+
+
+_SHARED_CACHE: Optional[LLMResponseCache] = None
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_cache() -> LLMResponseCache:
+    """
+    Process-wide cache: persisted to $LLM_CACHE_PATH and/or shared through
+    $LLM_CACHE_REDIS_URL when set, memory-only otherwise. $LLM_CACHE_TTL
+    (seconds) is the default entry lifetime.
+    """
+    global _SHARED_CACHE
+    if _SHARED_CACHE is None:
+        with _SHARED_LOCK:
+            if _SHARED_CACHE is None:
+                ttl = os.getenv("LLM_CACHE_TTL")
+                _SHARED_CACHE = LLMResponseCache(
+                    os.getenv("LLM_CACHE_PATH"),
+                    redis_url=os.getenv("LLM_CACHE_REDIS_URL"),
+                    default_ttl=int(ttl) if ttl else None,
+                )
+    return _SHARED_CACHE
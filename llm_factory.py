@@ -1,24 +1,168 @@
+import asyncio
 import json
 import os
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional, Any, Union
 from enum import Enum
 from dataclasses import dataclass
 from abc import ABC, abstractmethod
 from data_service import LLMProvider
+from llm_cache import LLMResponseCache, prompt_key, shared_cache
 import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
+import httpx
 import ollama
 from ollama import AsyncClient
 import requests
+from requests.adapters import HTTPAdapter
 import json
 
+# Errors a provider call can raise on a failed generation (transport, API,
+# malformed response). Callers that degrade gracefully catch these rather
+# than everything.
+LLM_ERRORS = (
+    ollama.ResponseError,
+    httpx.HTTPError,
+    requests.RequestException,
+    RuntimeError,
+    ConnectionError,
+    TimeoutError,
+    ValueError,
+    KeyError,
+)
+
+# Responses are memoized only for (near-)deterministic sampling; above this a
+# repeated prompt is expected to produce a different answer
+CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.2"))
+
+
+def _default_cache(temperature: float) -> Optional[LLMResponseCache]:
+    return shared_cache() if temperature <= CACHE_MAX_TEMPERATURE else None
+
+
+# Worker threads for the blocking fallbacks (a provider without native async
+# generate / stream). Kept apart from asyncio's default executor, which the
+# retrieval and preload offloads share; threads start on demand
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL", "32"))
+LLM_POOL = ThreadPoolExecutor(max_workers=LLM_POOL_SIZE, thread_name_prefix="llm")
+
+
+# In-flight requests per Ollama model; keep at or below the server's
+# OLLAMA_NUM_PARALLEL or the extra requests just queue server-side
+OLLAMA_PARALLEL = int(os.getenv("OLLAMA_PARALLEL", "4"))
+
+# How long the Ollama server keeps a model loaded after a request (server
+# default 5m). Reloading the weights costs seconds, so keep it resident
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+# Keep-alive pool for the Ollama transport. httpx drops idle connections after
+# 5 s by default, so requests spaced further apart than that each paid a new
+# TCP (and, behind a TLS proxy, TLS) handshake; Ollama itself never closes
+# idle connections
+OLLAMA_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_HTTP_KEEPALIVE_EXPIRY", "300"))
+_OLLAMA_LIMITS = httpx.Limits(
+    max_connections=None,
+    max_keepalive_connections=max(20, 2 * OLLAMA_PARALLEL),
+    keepalive_expiry=OLLAMA_HTTP_KEEPALIVE_EXPIRY,
+)
+
+# host -> client, shared by every OllamaLLM on that host so they reuse one
+# connection pool
+_OLLAMA_CLIENTS: Dict[Optional[str], ollama.Client] = {}
+_OLLAMA_ASYNC_CLIENTS: Dict[Optional[str], AsyncClient] = {}
+_OLLAMA_CLIENTS_LOCK = threading.Lock()
+
+# One connection pool to openrouter.ai for every OpenRouterLLM, so calls reuse
+# warm TLS connections instead of handshaking per request (the sync path
+# opened a fresh connection for every call). The async client speaks HTTP/2:
+# concurrent generations multiplex over a few connections
+_OPENROUTER_LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=100)
+_OPENROUTER_ASYNC_CLIENT: Optional[httpx.AsyncClient] = None  # created inside the serving loop
+_OPENROUTER_SESSION = requests.Session()
+_OPENROUTER_SESSION.mount("https://", HTTPAdapter(pool_maxsize=LLM_POOL_SIZE))
+
+
+def _openrouter_client() -> httpx.AsyncClient:
+    global _OPENROUTER_ASYNC_CLIENT
+    if _OPENROUTER_ASYNC_CLIENT is None:
+        _OPENROUTER_ASYNC_CLIENT = httpx.AsyncClient(http2=True, timeout=60, limits=_OPENROUTER_LIMITS)
+    return _OPENROUTER_ASYNC_CLIENT
+
+
+async def aclose_clients() -> None:
+    """Close the shared async HTTP clients (Ollama, OpenRouter); call at shutdown."""
+    global _OPENROUTER_ASYNC_CLIENT
+    closers = [client.close for client in _OLLAMA_ASYNC_CLIENTS.values()]
+    _OLLAMA_ASYNC_CLIENTS.clear()
+    if _OPENROUTER_ASYNC_CLIENT is not None:
+        closers.append(_OPENROUTER_ASYNC_CLIENT.aclose)
+        _OPENROUTER_ASYNC_CLIENT = None
+    for close in closers:
+        await close()
+    _OPENROUTER_SESSION.close()
+
+# genai.configure is process-global; only re-run it when the key changes
+_GEMINI_CONFIGURED_KEY: Optional[str] = None
+
+def _gemini_schema(schema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Pydantic JSON schema -> the OpenAPI subset Gemini's response_schema takes:
+    $refs inlined, title/default dropped, Optional[X] as nullable. None when
+    the schema needs something that subset can't express (a free-form object).
+    """
+    defs = schema.get("$defs", {})
+
+    def convert(node: Dict[str, Any]) -> Dict[str, Any]:
+        if "$ref" in node:
+            return convert(defs[node["$ref"].rsplit("/", 1)[-1]])
+        if "anyOf" in node:
+            options = [o for o in node["anyOf"] if o.get("type") != "null"]
+            if len(options) != 1:
+                raise ValueError("union")
+            out = convert(options[0])
+            out["nullable"] = True
+            return out
+        kind = node.get("type")
+        if kind == "object":
+            if not node.get("properties"):
+                raise ValueError("free-form object")
+            out = {"type": "OBJECT", "properties": {k: convert(v) for k, v in node["properties"].items()}}
+            if node.get("required"):
+                out["required"] = list(node["required"])
+            return out
+        if kind == "array":
+            return {"type": "ARRAY", "items": convert(node.get("items", {}))}
+        if kind in ("string", "integer", "number", "boolean"):
+            out = {"type": kind.upper()}
+            if "enum" in node:
+                out["enum"] = list(node["enum"])
+            return out
+        raise ValueError(f"unsupported schema node: {node}")
+
+    try:
+        return convert(schema)
+    except (ValueError, KeyError):
+        return None
+
+
 class BaseLLM(ABC):
     """Abstract base class for LLM implementations"""
 
+    cache: Optional[LLMResponseCache] = None
+    cache_ttl: Optional[int] = None  # seconds; None = the cache's default
+    temperature: float = 0.0
+    _inflight: Optional[Dict[str, asyncio.Future]] = None  # cache key -> pending call
+
     @abstractmethod
-    def generate(self, prompt: str) -> str:
-        """Generate response from prompt"""
+    def generate(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None) -> str:
+        """
+        Generate response from prompt. `response_schema` (a JSON schema, e.g.
+        Model.model_json_schema()) asks the provider for structured output so
+        the reply is valid JSON. `max_tokens` caps this reply below the
+        model's configured limit.
+        """
         pass
 
     @abstractmethod
@@ -30,6 +174,119 @@ class BaseLLM(ABC):
         """Stream response tokens. Default: yield entire response at once."""
         yield self.generate(prompt)
 
+    async def agenerate(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None) -> str:
+        """Async generate. Default: run the blocking generate() on the LLM pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(LLM_POOL, self.generate, prompt, response_schema, max_tokens)
+
+    async def agenerate_stream(self, prompt: str):
+        """
+        Async token stream. Default: drive generate_stream() on the LLM pool.
+        Closing this generator early (e.g. the client disconnected) stops the
+        worker at the next token instead of letting it run to the end.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        stop = threading.Event()
+
+        def run():
+            stream = self.generate_stream(prompt)
+            try:
+                for token in stream:
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, token)
+            except Exception as exc:
+                loop.call_soon_threadsafe(queue.put_nowait, exc)
+            finally:
+                stream.close()
+                if not stop.is_set():
+                    loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        LLM_POOL.submit(run)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+
+    async def awarmup(self) -> None:
+        """Set up the provider connection before the first request. Default: a one-token generation."""
+        await self.agenerate("ping", max_tokens=1)
+
+    def _cache_key(self, prompt: str, response_schema: Optional[Dict[str, Any]], max_tokens: Optional[int] = None) -> Optional[str]:
+        if self.cache is None:
+            return None
+        schema = json.dumps(response_schema, sort_keys=True) if response_schema else ""
+        if max_tokens is not None:
+            schema += f"|max_tokens={max_tokens}"
+        return prompt_key(self.get_provider_name(), self.model_name, self.temperature, schema, prompt)
+
+    def _cached(self, key: Optional[str]) -> Optional[str]:
+        return self.cache.get(key) if key is not None else None
+
+    def _remember(self, key: Optional[str], text: str) -> str:
+        # Empty replies (Gemini's error path) are never stored
+        if key is not None and text:
+            self.cache.put(key, text, self.cache_ttl)
+        return text
+
+    # Async counterparts for agenerate: the cache's sqlite / Redis tiers do
+    # blocking I/O, which must not stall the event loop
+    async def _acached(self, key: Optional[str]) -> Optional[str]:
+        return await self.cache.aget(key) if key is not None else None
+
+    async def _aremember(self, key: Optional[str], text: str) -> str:
+        if key is not None and text:
+            await self.cache.aput(key, text, self.cache_ttl)
+        return text
+
+    async def _single_flight(self, key: Optional[str], call):
+        """
+        Await `call()` once per cache key at a time: identical cacheable prompts
+        arriving while one is in flight share its result instead of each
+        calling the provider. A caller whose leader was cancelled takes over.
+        """
+        if key is None:
+            return await call()
+        if self._inflight is None:
+            self._inflight = {}
+        loop = asyncio.get_running_loop()
+
+        while True:
+            fut = self._inflight.get(key)
+            if fut is None or fut.get_loop() is not loop:
+                break
+            try:
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if not fut.cancelled() or asyncio.current_task().cancelling():
+                    raise  # this caller was cancelled, not (only) the leader
+
+        fut = loop.create_future()
+        self._inflight[key] = fut
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as exc:
+            fut.set_exception(exc)
+            fut.exception()  # retrieved: no "never retrieved" warning when nobody waited
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
 
 class GeminiLLM(BaseLLM):
     """Google Gemini LLM implementation"""
@@ -41,7 +298,9 @@ class GeminiLLM(BaseLLM):
         temperature: float = 0.1,
         top_p: float = 0.95,
         top_k: int = 40,
-        max_tokens: int = 8192 
+        max_tokens: int = 8192,
+        cache: Optional[LLMResponseCache] = None,
+        cache_ttl: Optional[int] = None
     ):
         """
         Initialize Gemini LLM
@@ -53,17 +312,25 @@ class GeminiLLM(BaseLLM):
         if not self.api_key:
             raise ValueError("Gemini API Key is missing! Please check config_sean.py")
 
-        genai.configure(api_key=self.api_key)
+        global _GEMINI_CONFIGURED_KEY
+        if self.api_key != _GEMINI_CONFIGURED_KEY:
+            genai.configure(api_key=self.api_key)
+            _GEMINI_CONFIGURED_KEY = self.api_key
         
         self.model_name = model_name
         self.model = genai.GenerativeModel(model_name)
+        self.temperature = temperature
+        self.cache = cache if cache is not None else _default_cache(temperature)
+        self.cache_ttl = cache_ttl
         
-        self.generation_config = genai.types.GenerationConfig(
+        self._sampling = dict(
             temperature=temperature,
             top_p=top_p,
             top_k=top_k,
             max_output_tokens=max_tokens,
         )
+        self.generation_config = genai.types.GenerationConfig(**self._sampling)
+        self._schema_configs: Dict[tuple, Any] = {}  # (json.dumps(schema), max_tokens) -> GenerationConfig
 
         self.safety_settings = {
             HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
@@ -72,19 +339,75 @@ class GeminiLLM(BaseLLM):
             HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
         }
     
-    def generate(self, prompt: str) -> str:
-        """Generate response using Gemini"""
+    def generate(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None) -> str:
+        """Generate response using Gemini; identical prompts are served from the response cache"""
+        key = self._cache_key(prompt, response_schema, max_tokens)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
         try:
             response = self.model.generate_content(
                 prompt,
-                generation_config=self.generation_config,
+                generation_config=self._config_for(response_schema, max_tokens),
                 safety_settings=self.safety_settings
             )
-            return response.text.strip()
+            return self._remember(key, response.text.strip())
         except Exception as e:
             print(f"Gemini Generation Error: {e}")
             return ""
 
+    async def agenerate(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None) -> str:
+        """Native async call: no worker thread per request"""
+        key = self._cache_key(prompt, response_schema, max_tokens)
+        cached = await self._acached(key)
+        if cached is not None:
+            return cached
+
+        async def call() -> str:
+            try:
+                response = await self.model.generate_content_async(
+                    prompt,
+                    generation_config=self._config_for(response_schema, max_tokens),
+                    safety_settings=self.safety_settings
+                )
+                text = response.text.strip()
+            except Exception as e:
+                print(f"Gemini Generation Error: {e}")
+                return ""
+            return await self._aremember(key, text)
+
+        return await self._single_flight(key, call)
+
+    async def awarmup(self) -> None:
+        """One-token call: auth, channel setup and routing happen now rather than on the first request."""
+        try:
+            await self.model.generate_content_async(
+                "ping",
+                generation_config=genai.types.GenerationConfig(max_output_tokens=1),
+                safety_settings=self.safety_settings
+            )
+        except Exception as e:
+            print(f"Gemini warm-up error: {e}")
+
+    def _config_for(self, response_schema: Optional[Dict[str, Any]], max_tokens: Optional[int] = None):
+        """Plain config, or a structured-output / capped one built once per (schema, cap)."""
+        if not response_schema and max_tokens is None:
+            return self.generation_config
+        key = (json.dumps(response_schema, sort_keys=True) if response_schema else "", max_tokens)
+        config = self._schema_configs.get(key)
+        if config is None:
+            sampling = dict(self._sampling)
+            if max_tokens is not None:
+                sampling["max_output_tokens"] = max_tokens
+            if response_schema:
+                # JSON mode, plus the schema itself when Gemini's subset can express it
+                sampling["response_mime_type"] = "application/json"
+                gemini_schema = _gemini_schema(response_schema)
+                if gemini_schema is not None:
+                    sampling["response_schema"] = gemini_schema
+            config = self._schema_configs[key] = genai.types.GenerationConfig(**sampling)
+        return config
+
     def generate_stream(self, prompt: str):
         try:
             response = self.model.generate_content(
@@ -100,6 +423,21 @@ class GeminiLLM(BaseLLM):
             print(f"Gemini Streaming Error: {e}")
             yield self.generate(prompt)
 
+    async def agenerate_stream(self, prompt: str):
+        try:
+            response = await self.model.generate_content_async(
+                prompt,
+                generation_config=self.generation_config,
+                safety_settings=self.safety_settings,
+                stream=True,
+            )
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            print(f"Gemini Streaming Error: {e}")
+            yield await self.agenerate(prompt)
+
     def get_provider_name(self) -> str:
         return "gemini"
 
@@ -115,11 +453,16 @@ class OllamaLLM(BaseLLM):
         top_p: float = 0.95,
         top_k: int = 40,
         num_ctx: int = 4096,
-        num_predict: int = 2048
+        num_predict: int = 2048,
+        cache: Optional[LLMResponseCache] = None,
+        cache_ttl: Optional[int] = None,
+        keep_alive: Optional[str] = OLLAMA_KEEP_ALIVE
     ):
-        
+        # num_ctx is deliberately one value per model: Ollama restarts the model
+        # runner whenever a request asks for a different context size
         self.model_name = model_name
         self.host = host
+        self.keep_alive = keep_alive
         self.options = {
             "temperature": temperature,
             "top_p": top_p,
@@ -127,32 +470,93 @@ class OllamaLLM(BaseLLM):
             "num_ctx": num_ctx,
             "num_predict": num_predict
         }
+        self.temperature = temperature
+        self.cache = cache if cache is not None else _default_cache(temperature)
+        self.cache_ttl = cache_ttl
         
-        if host:
-            self.client = ollama.Client(host=host)
-            self.async_client = AsyncClient(host=host)
-        else:
-            self.client = ollama.Client()
+        with _OLLAMA_CLIENTS_LOCK:
+            self.client = _OLLAMA_CLIENTS.get(host)
+            if self.client is None:
+                self.client = _OLLAMA_CLIENTS[host] = ollama.Client(host=host or None, limits=_OLLAMA_LIMITS)
+        self._sem = asyncio.Semaphore(OLLAMA_PARALLEL)
     
-    def generate(self, prompt: str) -> str:
+    def generate(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None) -> str:
+        key = self._cache_key(prompt, response_schema, max_tokens)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+
         response = self.client.generate(
             model=self.model_name,
             prompt=prompt,
-            options=self.options
+            format=response_schema,  # grammar-constrained decoding when given
+            options=self._options_for(max_tokens),
+            keep_alive=self.keep_alive
         )
-        return response['response'].strip()
+        return self._remember(key, response['response'].strip())
+
+    async def agenerate(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None) -> str:
+        key = self._cache_key(prompt, response_schema, max_tokens)
+        cached = await self._acached(key)
+        if cached is not None:
+            return cached
+
+        async def call() -> str:
+            # Concurrent requests let the Ollama server batch them on the GPU; the
+            # semaphore keeps them within what the server runs in parallel
+            async with self._sem:
+                response = await self.async_client.generate(
+                    model=self.model_name,
+                    prompt=prompt,
+                    format=response_schema,
+                    options=self._options_for(max_tokens),
+                    keep_alive=self.keep_alive
+                )
+            return await self._aremember(key, response['response'].strip())
+
+        return await self._single_flight(key, call)
+
+    def _options_for(self, max_tokens: Optional[int]) -> Dict[str, Any]:
+        return self.options if max_tokens is None else {**self.options, "num_predict": max_tokens}
+
+    @property
+    def async_client(self) -> AsyncClient:
+        client = _OLLAMA_ASYNC_CLIENTS.get(self.host)
+        if client is None:
+            client = _OLLAMA_ASYNC_CLIENTS[self.host] = AsyncClient(host=self.host or None, limits=_OLLAMA_LIMITS)
+        return client
+
+    async def awarmup(self) -> None:
+        """Load the model on the server (an empty prompt only loads it) so the first request doesn't pay for it."""
+        await self.async_client.generate(model=self.model_name, prompt="", keep_alive=self.keep_alive)
 
     def generate_stream(self, prompt: str):
         for chunk in self.client.generate(
             model=self.model_name,
             prompt=prompt,
             options=self.options,
+            keep_alive=self.keep_alive,
             stream=True,
         ):
             content = chunk.get('response') if isinstance(chunk, dict) else getattr(chunk, 'response', None)
             if content:
                 yield content
 
+    async def agenerate_stream(self, prompt: str):
+        # Tokens arrive on the event loop directly; the request holds a slot
+        # for as long as it streams
+        async with self._sem:
+            async for chunk in await self.async_client.generate(
+                model=self.model_name,
+                prompt=prompt,
+                options=self.options,
+                keep_alive=self.keep_alive,
+                stream=True,
+            ):
+                content = chunk.get('response') if isinstance(chunk, dict) else getattr(chunk, 'response', None)
+                if content:
+                    yield content
+
     def get_provider_name(self) -> str:
         return "ollama"
     
@@ -173,12 +577,13 @@ class OpenRouterLLM(BaseLLM):
         self.system_prompt = system_prompt
         self.base_url = "https://openrouter.ai/api/v1/chat/completions"
 
-    def generate(self, prompt: str) -> str:
-        headers = {
+    def _headers(self) -> Dict[str, str]:
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
 
+    def _payload(self, prompt: str, response_schema: Optional[Dict[str, Any]], max_tokens: Optional[int] = None) -> Dict[str, Any]:
         messages = []
 
         if self.system_prompt:
@@ -201,11 +606,23 @@ class OpenRouterLLM(BaseLLM):
         if self.enable_reasoning:
             payload["reasoning"] = {"enabled": True}
 
+        if max_tokens is not None:
+            payload["max_tokens"] = max_tokens
+
+        if response_schema:
+            payload["response_format"] = {
+                "type": "json_schema",
+                # Not strict: pydantic schemas leave defaulted fields out of "required"
+                "json_schema": {"name": response_schema.get("title", "response"), "strict": False, "schema": response_schema},
+            }
+        return payload
+
+    def generate(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None) -> str:
         try:
-            response = requests.post(
+            response = _OPENROUTER_SESSION.post(
                 url=self.base_url,
-                headers=headers,
-                data=json.dumps(payload),
+                headers=self._headers(),
+                data=json.dumps(self._payload(prompt, response_schema, max_tokens)),
                 timeout=60
             )
 
@@ -220,29 +637,33 @@ class OpenRouterLLM(BaseLLM):
         except KeyError:
             raise RuntimeError(f"Unexpected API response format: {data}")
 
-    def generate_stream(self, prompt: str):
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
-        messages = []
-        if self.system_prompt:
-            messages.append({"role": "system", "content": self.system_prompt})
-        messages.append({"role": "user", "content": prompt})
+    async def agenerate(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None) -> str:
+        try:
+            response = await _openrouter_client().post(
+                self.base_url,
+                headers=self._headers(),
+                content=json.dumps(self._payload(prompt, response_schema, max_tokens)),
+            )
 
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "temperature": self.temperature,
-            "stream": True,
-        }
-        if self.enable_reasoning:
-            payload["reasoning"] = {"enabled": True}
+            response.raise_for_status()
+            data = response.json()
+
+            return data["choices"][0]["message"]["content"]
+
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"OpenRouter API request failed: {e}")
+
+        except KeyError:
+            raise RuntimeError(f"Unexpected API response format: {data}")
+
+    def generate_stream(self, prompt: str):
+        payload = self._payload(prompt, None)
+        payload["stream"] = True
 
         try:
-            with requests.post(
+            with _OPENROUTER_SESSION.post(
                 url=self.base_url,
-                headers=headers,
+                headers=self._headers(),
                 data=json.dumps(payload),
                 stream=True,
                 timeout=120,
@@ -272,7 +693,11 @@ class OpenRouterLLM(BaseLLM):
 
 class LLMFactory:
     """Factory for creating LLM instances"""
-    
+
+    # Identical create_llm calls return the same instance (and its clients)
+    _instances: Dict[tuple, BaseLLM] = {}
+    _instances_lock = threading.Lock()
+
     @staticmethod
     def create_llm(
         provider: Union[str, LLMProvider],
@@ -282,7 +707,28 @@ class LLMFactory:
         temperature: float = 0.1,
         **kwargs
     ) -> BaseLLM:
-        
+        key = (provider, model_name, api_key, host, temperature, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            # Unhashable option values: build a fresh instance, uncached
+            return LLMFactory._create_llm(provider, model_name, api_key, host, temperature, **kwargs)
+
+        with LLMFactory._instances_lock:
+            llm = LLMFactory._instances.get(key)
+            if llm is None:
+                llm = LLMFactory._instances[key] = LLMFactory._create_llm(provider, model_name, api_key, host, temperature, **kwargs)
+        return llm
+
+    @staticmethod
+    def _create_llm(
+        provider: Union[str, LLMProvider],
+        model_name: Optional[str],
+        api_key: Optional[str],
+        host: Optional[str],
+        temperature: float,
+        **kwargs
+    ) -> BaseLLM:
         if isinstance(provider, str):
             try:
                 provider = LLMProvider(provider.lower())
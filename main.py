@@ -1,20 +1,20 @@
 import os
 import asyncio
-import threading
+import functools
 from pathlib import Path
 import uuid
 from cypher.ac import load_cache
 from fastapi import FastAPI, HTTPException, Request, APIRouter
-from fastapi.responses import StreamingResponse
-from lipidbot import classify_query_simple, flatten_row,openai_chunk, safe_str
-from citation.search import search, get_cached_retrievers, get_cached_bm25
+from fastapi.responses import Response, StreamingResponse
+from lipidbot import aclassify_query_simple, anchor_mentions, BatchingFrontDoorClassifier, build_synthesis_prompt, classify_cache_stats, context_hits, flatten_row,openai_chunk, safe_str
+from citation.search import search, get_cached_retrievers, get_cached_bm25, warm_search, SEARCH_CACHE, SEARCH_POOL
 from config import GEMINI_MODEL_NAME, GEMINI_API_KEY, NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, OLLAMA_HOST, GPT_OSS_LLM_TYPE, LLAMA_LLM_TYPE, OPENROUTER_API_KEY
-from llm_factory import LLMFactory
+from llm_factory import LLMFactory, LLM_ERRORS, LLM_POOL, OLLAMA_PARALLEL, aclose_clients
 from data_service import LLMProvider
 from cypher.cypher_query import cypher_query
 from cypher.db_enginer import Neo4jClient
 import logging
-from contextlib import asynccontextmanager
+from contextlib import aclosing, asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 import time
 from data_service import LipidBotRequest
@@ -22,6 +22,40 @@ from data_service import LipidBotRequest
 # Logger
 logger = logging.getLogger("uvicorn.error")
 
+# Seconds between client-disconnect checks while a request is classified
+DISCONNECT_POLL = 0.25
+
+# LLM calls in flight per model: by default what the Ollama provider itself
+# runs at once (OLLAMA_PARALLEL), so requests queue here, where the queue is
+# visible, rather than on the provider's semaphore
+LLM_MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", str(OLLAMA_PARALLEL)))
+# Requests allowed to wait for a model's slot before new ones get a 503
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "16"))
+
+
+class LLMGate:
+    """
+    Admission control for the LLM calls: at most `limit` run at once, and
+    `waiting` counts the callers queued for a slot so the endpoint can shed
+    load while the backlog is full instead of letting latency pile up.
+    """
+
+    def __init__(self, limit: int):
+        self._sem = asyncio.Semaphore(limit)
+        self.waiting = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        self.waiting += 1
+        try:
+            await self._sem.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            yield
+        finally:
+            self._sem.release()
+
 # =========================
 # FastAPI Lifespan (startup / shutdown)
 # =========================
@@ -33,9 +67,13 @@ async def lifespan(app: FastAPI):
         user=NEO4J_USER,
         password=NEO4J_PASSWORD
     )
-    await neo4j.connect()
     app.state.neo4j = neo4j
 
+    async def setup_neo4j():
+        await neo4j.connect()
+        await neo4j.ensure_indexes()
+        await neo4j.warm_pool()
+
     # Initialize LLM
     # gemini_llm = LLMFactory.create_llm(
     #     provider=LLMProvider.GEMINI,
@@ -73,17 +111,48 @@ async def lifespan(app: FastAPI):
     app.state.llama_llm = llama_llm
     app.state.gpt_oss_llm = gpt_oss_llm
 
-    # Preload AI retrievers & BM25 caches
-    get_cached_retrievers(None)
-    get_cached_bm25()
-    load_cache(None)
+    # Front-door calls from concurrent requests are coalesced per model
+    app.state.llama_front_door = BatchingFrontDoorClassifier(llama_llm)
+    app.state.gpt_oss_front_door = BatchingFrontDoorClassifier(gpt_oss_llm)
+
+    # One gate per model, each matching that model's in-flight limit
+    app.state.llama_gate = LLMGate(LLM_MAX_INFLIGHT)
+    app.state.gpt_oss_gate = LLMGate(LLM_MAX_INFLIGHT)
+
+    # Load the models / open the provider connections now rather than on the
+    # first request. Uvicorn accepts no traffic until the lifespan yields, so
+    # the first request always finds them warm
+    async def warmup(llm):
+        try:
+            await llm.awarmup()
+        except LLM_ERRORS as e:
+            logger.warning(f"[Startup] {llm.get_provider_name()} warm-up failed for {getattr(llm, 'model_name', None) or llm.model}: {e}")
+
+    # Neo4j setup, LLM warm-ups and the blocking preloads (AI retrievers,
+    # BM25, entity AC cache) are independent: run them side by side, the
+    # loaders in worker threads, so startup takes the longest of them
+    await asyncio.gather(
+        setup_neo4j(),
+        warmup(llama_llm),
+        warmup(gpt_oss_llm),
+        # warmup(gemini_llm),
+        asyncio.to_thread(get_cached_retrievers, None),
+        asyncio.to_thread(get_cached_bm25),
+        asyncio.to_thread(load_cache, None),
+    )
+    # Once everything is loaded, one dummy search so the first real one is not the cold one
+    await asyncio.to_thread(warm_search)
     print("[Startup] Models and BM25 cache preloaded.")
+    logger.info(f"[Startup] event loop: {type(asyncio.get_running_loop()).__module__}")
 
     yield
 
     # Shutdown
     await neo4j.close()
     print("[Shutdown] Neo4j connection closed.")
+    await aclose_clients()
+    LLM_POOL.shutdown(wait=False, cancel_futures=True)
+    SEARCH_POOL.shutdown(wait=False, cancel_futures=True)
 
 # =========================
 # FastAPI App
@@ -103,6 +172,61 @@ _RATE_LIMIT = 100
 _RATE_WINDOW = 86400  # seconds in 24 hours
 _rate_store: dict = {}  # ip -> [count, reset_at]
 
+# The citation search starts alongside classification; a client whose queries
+# keep coming back out of domain (search wasted) gets its searches deferred
+# until after the classifier instead, for the rest of the window
+_SPECULATIVE_WASTE_LIMIT = 5
+_SPECULATIVE_WINDOW = 3600
+_speculative_waste: dict = {}  # ip -> [count, reset_at]
+
+
+# Single-flight: identical concurrent requests share one classification, one
+# citation search and one Cypher run; followers await the leader's task
+_INFLIGHT: dict = {}  # key -> [future, waiters]
+
+
+async def _single_flight(key, make):
+    while True:
+        entry = _INFLIGHT.get(key)
+        if entry is None:
+            entry = _INFLIGHT[key] = [asyncio.ensure_future(make()), 0]
+            # Only drop our own entry: a cancelled one may already be replaced
+            entry[0].add_done_callback(
+                lambda _, entry=entry: _INFLIGHT.pop(key) if _INFLIGHT.get(key) is entry else None
+            )
+        fut = entry[0]
+        entry[1] += 1
+        try:
+            # shield: a caller that disconnects or times out doesn't cancel the
+            # work the others are waiting on...
+            return await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            if not fut.cancelled() or asyncio.current_task().cancelling():
+                raise  # this caller was cancelled, not the shared work
+            # Shared work was abandoned as this caller joined: lead a new run
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not fut.done():
+                # ...but once the last one is gone nobody needs the result.
+                # Unlisted in the same step, so a new identical request starts
+                # fresh instead of joining the dying task
+                if _INFLIGHT.get(key) is entry:
+                    del _INFLIGHT[key]
+                fut.cancel()
+
+
+def _may_speculate(ip: str, now: float) -> bool:
+    entry = _speculative_waste.get(ip)
+    return entry is None or now >= entry[1] or entry[0] < _SPECULATIVE_WASTE_LIMIT
+
+
+def _record_wasted_search(ip: str, now: float) -> None:
+    entry = _speculative_waste.get(ip)
+    if entry is None or now >= entry[1]:
+        _speculative_waste[ip] = [1, now + _SPECULATIVE_WINDOW]
+    else:
+        entry[0] += 1
+
 
 # FastAPI app and router
 router = APIRouter()
@@ -115,6 +239,10 @@ app.include_router(router)
 def health():
     return {"ok": True}
 
+@app.get("/cache_stats")
+def cache_stats():
+    return {"search": SEARCH_CACHE.snapshot(), "classify": classify_cache_stats()}
+
 # =========================
 # Cypher Query Endpoint
 # =========================
@@ -132,6 +260,19 @@ async def run_cypher_query(query: str, request: Request):
 async def lipidbot_stream(req: LipidBotRequest, request: Request):
     """Same as /lipidbot but streams the synthesis response token by token via SSE."""
 
+    # ===== ADMISSION =====
+    llm_gate: LLMGate = (
+        request.app.state.llama_gate
+        if req.llm_type == "llama"
+        else request.app.state.gpt_oss_gate
+    )
+    if llm_gate.waiting >= LLM_MAX_QUEUE:
+        raise HTTPException(
+            status_code=503,
+            detail="Server overloaded, please retry shortly.",
+            headers={"Retry-After": "1"},
+        )
+
     # ===== RATE LIMIT =====
     ip = req.client_ip or "unknown"
     now = time.time()
@@ -148,8 +289,25 @@ async def lipidbot_stream(req: LipidBotRequest, request: Request):
                 headers={"Retry-After": str(reset_in)},
             )
 
+    # Until the response starts, nothing notices a client that hangs up: poll
+    # for it and cancel this request's classification / search when it does.
+    # Once streaming, Starlette closes stream_synthesis on disconnect
+    endpoint_task = asyncio.current_task()
+    disconnected = False
+
+    async def watch_disconnect():
+        nonlocal disconnected
+        while not await request.is_disconnected():
+            await asyncio.sleep(DISCONNECT_POLL)
+        disconnected = True
+        endpoint_task.cancel()
+
+    watcher = asyncio.create_task(watch_disconnect())
+    search_task = None
     try:
         t0 = time.perf_counter()
+        # The [Timing] lines are formatted only when they'd be emitted
+        log_timing = logger.isEnabledFor(logging.INFO)
 
         # ===== INIT =====
         default_llm = (
@@ -157,14 +315,34 @@ async def lipidbot_stream(req: LipidBotRequest, request: Request):
             if req.llm_type == "llama"
             else request.app.state.gpt_oss_llm
         )
+        front_door_classifier = (
+            request.app.state.llama_front_door
+            if req.llm_type == "llama"
+            else request.app.state.gpt_oss_front_door
+        )
 
         neo4j_client = request.app.state.neo4j
+        # Single-flight key text: whitespace collapsed, case kept, since KEGG /
+        # gene / EC identifiers are case-sensitive
+        query_key = " ".join(req.query.split())
 
         # ===== CLASSIFICATION + CITATIONS (parallel) =====
+        # One fused LLM call classifies, extracts mentions and picks a template;
+        # if its reply doesn't parse, fall back to the separate calls
         t_parallel = time.perf_counter()
-        classification, hits = await asyncio.gather(
-            asyncio.to_thread(classify_query_simple, req.query, default_llm),
-            asyncio.to_thread(
+        cache_key, front_door = front_door_classifier.lookup(req.query)
+
+        # Known before any LLM call (small talk, identifier lookup, cache hit):
+        # skip the literature search when it can't be used. req.citations overrides
+        needs_citations = req.citations
+        if needs_citations is None:
+            needs_citations = front_door is None or (front_door.is_relevant and front_door.needs_citations)
+
+        async def run_citation_search():
+            if not needs_citations:
+                return []
+            key = ("search", query_key, req.top_k, req.fuse, req.per, req.rrf_k, tuple(req.model_names or ()))
+            run_search = functools.partial(
                 search,
                 query=req.query,
                 top_k_per_model=req.top_k,
@@ -174,12 +352,47 @@ async def lipidbot_stream(req: LipidBotRequest, request: Request):
                 model_names=req.model_names,
                 add_bm25=True
             )
+            loop = asyncio.get_running_loop()
+            return await _single_flight(key, lambda: loop.run_in_executor(SEARCH_POOL, run_search))
+
+        # Search while the classifier runs; it is only wasted on the rare
+        # out-of-domain query, and is then abandoned without being awaited
+        speculative = front_door is None and needs_citations and _may_speculate(ip, now)
+        search_task = (
+            asyncio.create_task(run_citation_search())
+            if front_door is not None or speculative else None
         )
-        logger.info(
-            f"[Timing] parallel(classification+citations)={time.perf_counter()-t_parallel:.3f}s"
-            f"  relevant={classification.is_relevant} needs_graph={classification.needs_graph}"
-            f"  hits={len(hits) if hits else 0}"
-        )
+
+        if front_door is not None:
+            classification = front_door.classification
+        else:
+            async with llm_gate.slot():
+                front_door = await _single_flight(
+                    cache_key, lambda: front_door_classifier.aresolve(req.query, cache_key)
+                )
+                if front_door is not None:
+                    classification = front_door.classification
+                else:
+                    classification = await aclassify_query_simple(req.query, default_llm)
+
+        if not classification.is_relevant:
+            if search_task is not None:
+                # The worker thread finishes on its own; only the wait is dropped
+                search_task.cancel()
+                if speculative:
+                    _record_wasted_search(ip, now)
+        elif search_task is not None:
+            hits = await search_task
+        else:
+            if req.citations is None:
+                needs_citations = front_door is None or front_door.needs_citations
+            hits = await run_citation_search()
+        if log_timing:
+            logger.info(
+                f"[Timing] classification+citations={time.perf_counter()-t_parallel:.3f}s"
+                f"  relevant={classification.is_relevant} needs_graph={classification.needs_graph}"
+                f"  hits={len(hits) if classification.is_relevant else 0}"
+            )
 
         if not classification.is_relevant:
             _sid = f"chatcmpl-{uuid.uuid4().hex}"
@@ -197,8 +410,15 @@ async def lipidbot_stream(req: LipidBotRequest, request: Request):
         async def run_cypher(needs_graph: bool):
             if not needs_graph:
                 return [], ""
+            # Same query on the same model: same front door, so the same Cypher
+            key = ("cypher", getattr(default_llm, "model_name", None), query_key)
             result, cypher = await asyncio.wait_for(
-                cypher_query(req.query, default_llm, neo4j_client),
+                _single_flight(key, lambda: cypher_query(
+                    req.query, default_llm, neo4j_client,
+                    # Cached / shared results carry spans into another wording of the query
+                    llm_mentions=anchor_mentions(front_door.mentions, req.query) if front_door else None,
+                    template_hint=front_door.template_id if front_door else None,
+                )),
                 timeout=40.0
             )
             return result, cypher
@@ -211,26 +431,21 @@ async def lipidbot_stream(req: LipidBotRequest, request: Request):
         formatted_citations = ""
         citation_list = []
         if hits:
-            citation_parts = []
-            for i, hit in enumerate(hits[:10], 1):
-                id_key = (
-                    f"OpenAlex:{hit.citation_id}"
-                    if hit.citation_id.lower().startswith("w")
-                    else f"PubMed:{hit.citation_id}"
-                )
-                citation_parts.append(
-                    f"[{i}]\n"
-                    f"SOURCE_ID: {id_key}\n"
-                    f"TITLE: {hit.title}\n"
-                    f"CONTENT:\n{hit.text}\n"
-                )
-                citation_list.append({
+            top_hits = context_hits(hits)
+            # OpenAlex work IDs start with W; everything else is a PMID
+            citation_list = [
+                {
                     'number': i,
-                    'id': id_key,
+                    'id': f"{'OpenAlex:' if hit.citation_id.startswith(('W', 'w')) else 'PubMed:'}{hit.citation_id}",
                     'title': hit.title,
                     'citation_id': hit.citation_id,
-                })
-            formatted_citations = "\n---\n".join(citation_parts)
+                }
+                for i, hit in enumerate(top_hits, 1)
+            ]
+            formatted_citations = "\n---\n".join(
+                f"[{cite['number']}]\nSOURCE_ID: {cite['id']}\nTITLE: {hit.title}\nCONTENT:\n{hit.text}\n"
+                for cite, hit in zip(citation_list, top_hits)
+            )
 
         # ===== BUILD PROMPT =====
         context_parts = []
@@ -242,103 +457,62 @@ async def lipidbot_stream(req: LipidBotRequest, request: Request):
             )
         context = "\n\n".join(context_parts) if context_parts else "No data retrieved."
 
-        synthesis_prompt = f"""You are a lipid biology expert assistant.
-
-**User Question:** "{req.query}"
-
-**Available Information:**
-{context}
-
-**CITATION PROTOCOL - READ CAREFULLY:**
-
-Before adding ANY citation [N]:
-1. Check: Is this fact explicitly stated in source [N]?
-2. If YES → Add citation [N]
-3. If NO → Either:
-   - Find the correct source that states it
-   - Or mention it without citation and note it's from general knowledge
-
-**FORBIDDEN:**
-❌ Citing sources based on relevance/topic match
-❌ Adding citations to sound more authoritative
-❌ Guessing which source might support a claim
-❌ Citing [1] just because it's the first source
-
-**REQUIRED:**
-✓ Only cite when you can point to the exact sentence in that source
-✓ Use phrases like "According to [1]..." when directly referencing
-✓ Say "General lipid biology knowledge suggests..." for non-cited claims
-
-**Instructions:**
-1. Answer the user's question directly and comprehensively
-2. **For each fact you state, mentally check: "Is this from a numbered source above? Which one exactly?"**
-3. Only add [N] if you can trace the fact to that specific source
-4. Be specific with enzyme names, gene IDs, and quantitative data
-5. Acknowledge gaps honestly
-
-**Your Response:**"""
+        synthesis_prompt = build_synthesis_prompt(req.query, context)
 
         # ===== BUILD REFERENCES TEXT =====
         references_text = ""
         if citation_list:
-            refs = "\n\n**Relevant references:**\n\n"
-            for cite in citation_list:
-                if cite['id'].startswith('PubMed:'):
-                    pmid = cite['id'].replace('PubMed:', '')
-                    link = f"[{cite['id']}](https://pubmed.ncbi.nlm.nih.gov/{pmid}/)"
-                elif cite['id'].startswith('OpenAlex:'):
-                    oa_id = cite['id'].replace('OpenAlex:', '')
-                    link = f"[{cite['id']}](https://openalex.org/{oa_id})"
-                else:
-                    link = cite['id']
-                refs += f"[{cite['number']}] {cite['title']} {link}\n\n"
-            references_text = refs
+            references_text = "\n\n**Relevant references:**\n\n" + "".join(
+                f"[{cite['number']}] {cite['title']} [{cite['id']}]("
+                + (f"https://pubmed.ncbi.nlm.nih.gov/{cite['citation_id']}/" if cite['id'].startswith('PubMed:')
+                   else f"https://openalex.org/{cite['citation_id']}")
+                + ")\n\n"
+                for cite in citation_list
+            )
 
+    except asyncio.CancelledError:
+        if search_task is not None:
+            search_task.cancel()
+        if not disconnected:
+            raise
+        logger.info("[Stream] client disconnected before streaming; request dropped")
+        return Response(status_code=499)
     except Exception as e:
         logger.error(f"[Stream] Pre-processing error: {e}", exc_info=True)
         raise HTTPException(500, str(e))
+    finally:
+        watcher.cancel()
 
     # ===== STREAMING GENERATOR =====
     # Streams plain text tokens via SSE.  Client reads each "data: " line
     # and concatenates the values; references are appended as text at the end.
     # Special sentinel:  data: [DONE]  signals end of stream.
-    # Async generator: LLM streams in a thread via queue while cypher_task
-    # runs concurrently in the event loop. Cypher result is appended after
+    # Async generator: LLM tokens are awaited on the event loop while
+    # cypher_task runs concurrently. Cypher result is appended after
     # LLM finishes — no extra wait time for the user.
     async def stream_synthesis():
         stream_id = f"chatcmpl-{uuid.uuid4().hex}"
         try:
-            # Bridge sync generate_stream → async via queue + thread
-            loop = asyncio.get_running_loop()
-            queue: asyncio.Queue = asyncio.Queue()
-
-            def run_llm():
-                try:
-                    for token in default_llm.generate_stream(prompt=synthesis_prompt):
-                        asyncio.run_coroutine_threadsafe(queue.put(token), loop).result()
-                except Exception as exc:
-                    asyncio.run_coroutine_threadsafe(queue.put(exc), loop).result()
-                finally:
-                    asyncio.run_coroutine_threadsafe(queue.put(None), loop).result()
-
             t_llm_start = time.perf_counter()
-            threading.Thread(target=run_llm, daemon=True).start()
 
             # ---- stream LLM tokens while cypher runs in the background ----
             first_token = True
-            while True:
-                item = await queue.get()
-                if item is None:        # sentinel — LLM done
-                    logger.info(f"[Timing] llm_stream={time.perf_counter()-t_llm_start:.3f}s  total={time.perf_counter()-t0:.3f}s")
-                    break
-                if isinstance(item, Exception):
-                    yield f"data: [ERROR] {str(item)}\n\n"
-                    cypher_task.cancel()
-                    return
-                if first_token:
-                    logger.info(f"[Timing] ttft={time.perf_counter()-t0:.3f}s")
-                    first_token = False
-                yield openai_chunk(item, stream_id)
+            try:
+                # aclosing: if the client disconnects, the provider stream is
+                # closed right away and generation stops server-side
+                async with llm_gate.slot(), aclosing(default_llm.agenerate_stream(prompt=synthesis_prompt)) as tokens:
+                    async for token in tokens:
+                        if first_token:
+                            if log_timing:
+                                logger.info(f"[Timing] ttft={time.perf_counter()-t0:.3f}s")
+                            first_token = False
+                        yield openai_chunk(token, stream_id)
+            except Exception as exc:
+                yield f"data: [ERROR] {str(exc)}\n\n"
+                cypher_task.cancel()
+                return
+            if log_timing:
+                logger.info(f"[Timing] llm_stream={time.perf_counter()-t_llm_start:.3f}s  total={time.perf_counter()-t0:.3f}s")
 
             # ---- references block ----
             if references_text:
@@ -346,16 +520,13 @@ Before adding ANY citation [N]:
 
             # ---- cypher result (await the task that ran concurrently) ----
             cypher_result, cypher_query_text = await cypher_task
-            logger.info(f"[Timing] cypher={time.perf_counter()-t_cypher_start:.3f}s, query={cypher_query_text}")
+            if log_timing:
+                logger.info(f"[Timing] cypher={time.perf_counter()-t_cypher_start:.3f}s, query={cypher_query_text}")
             if cypher_result:
                 rows = [flatten_row(r) for r in cypher_result]
 
-                # collect union of all columns
-                all_keys = []
-                for r in rows:
-                    for k in r.keys():
-                        if k not in all_keys:
-                            all_keys.append(k)
+                # collect union of all columns, in first-seen order
+                all_keys = list(dict.fromkeys(k for r in rows for k in r))
 
                  # ---- markdown table ----
                 header = "| " + " | ".join(all_keys) + " |"
@@ -379,5 +550,8 @@ Before adding ANY citation [N]:
 
         except Exception as e:
             yield f"data: [ERROR] {str(e)}\n\n"
+        finally:
+            # Client gone before the table was sent: drop the Neo4j work too
+            cypher_task.cancel()
 
     return StreamingResponse(stream_synthesis(), media_type="text/event-stream")